@@ -1,9 +1,102 @@
 from data_processing import BASE_RATE
+from rate_book import RateBook, table_arguments
+
+#derived value -> the inputs and derived values it is computed from
+DEPENDENCIES = {
+    'deductible_index': ('deductible',),
+    'moop_index': ('moop',),
+    'coinsurance_index': ('coinsurance',),
+    'base_brf': ('deductible', 'coinsurance', 'moop'),
+    'copay_brf': ('deductible_index', 'moop_index', 'coinsurance_index', 'pcp_copay', 'spc_copay', 'er_copay'),
+    'plan_brf': ('base_brf', 'copay_brf'),
+    'total_enrollment': ('ee_enrollment', 'spouse_enrollment', 'children_enrollment', 'family_enrollment')
+}
+PLAN_INPUTS = ('deductible', 'coinsurance', 'moop', 'pcp_copay', 'spc_copay', 'er_copay',
+               'ee_enrollment', 'spouse_enrollment', 'children_enrollment', 'family_enrollment')
+
+
+def _dependents(name):
+    """
+    Returns every derived value computed (directly or not) from an input or derived value.
+    """
+    dependents = set()
+    for derived, sources in DEPENDENCIES.items():
+        if name in sources:
+            dependents.add(derived)
+            dependents |= _dependents(derived)
+    return dependents
+
+
+#an edit clears only these stages: a copay edit keeps base_brf, an enrollment edit keeps every BRF
+DEPENDENTS = {name: frozenset(_dependents(name)) for name in PLAN_INPUTS + tuple(DEPENDENCIES)}
+
+
+def _input_property(name):
+    """
+    A plan input: changing it clears the derived values computed from it.
+    """
+    def getter(self):
+        return self._inputs.get(name)
+
+    def setter(self, value):
+        if name in self._inputs and self._inputs[name] == value:
+            return
+        self._inputs[name] = value
+        self._invalidate(name)
+
+    return property(getter, setter)
+
+
+def _derived_property(name):
+    """
+    A derived value, computed on first access against the bound RateBook (None before it is
+    calculated when no RateBook is bound). Setting it clears the values computed from it;
+    setting it to None clears it as well.
+    """
+    def getter(self):
+        if name not in self._derived:
+            if self._rate_book is None and name != 'total_enrollment':
+                return None
+            self._derived[name] = getattr(self, '_compute_' + name)()
+        return self._derived[name]
+
+    def setter(self, value):
+        if value is None:
+            self._derived.pop(name, None)
+        else:
+            self._derived[name] = value
+        self._invalidate(name)
+
+    return property(getter, setter)
+
 
 class Plan:
+    #inputs and lazily derived values (see DEPENDENCIES)
+    deductible = _input_property('deductible')
+    coinsurance = _input_property('coinsurance')
+    moop = _input_property('moop')
+    pcp_copay = _input_property('pcp_copay')
+    spc_copay = _input_property('spc_copay')
+    er_copay = _input_property('er_copay')
+    ee_enrollment = _input_property('ee_enrollment')
+    spouse_enrollment = _input_property('spouse_enrollment')
+    children_enrollment = _input_property('children_enrollment')
+    family_enrollment = _input_property('family_enrollment')
+    deductible_index = _derived_property('deductible_index')
+    moop_index = _derived_property('moop_index')
+    coinsurance_index = _derived_property('coinsurance_index')
+    base_brf = _derived_property('base_brf')
+    copay_brf = _derived_property('copay_brf')
+    plan_brf = _derived_property('plan_brf')
+    total_enrollment = _derived_property('total_enrollment')
+
     def __init__(self, plan_id, plan_name, deductible, coinsurance, moop, 
                  pcp_copay=None, spc_copay=None, er_copay=None,
-                 ee_enrollment=None, spouse_enrollment=None, children_enrollment=None, family_enrollment=None):
+                 ee_enrollment=None, spouse_enrollment=None, children_enrollment=None, family_enrollment=None,
+                 rate_book=None):
+        self._inputs = {}
+        self._derived = {}
+        self._rate_book = rate_book
         self.plan_id = plan_id
         self.plan_name = plan_name
         self.deductible = deductible
@@ -24,7 +117,24 @@ class Plan:
         self.spouse_enrollment = spouse_enrollment
         self.children_enrollment = children_enrollment
         self.family_enrollment = family_enrollment
-        self.total_enrollment = self._calculate_total_enrollment()
+
+    #rate book binding
+    def bind(self, rate_book):
+        """
+        Bind a RateBook: the indices and BRFs are then computed on first access (and after an
+        edit, only the stages the edit affects are recomputed). Binding clears every BRF.
+        Args:
+            rate_book: rate_book.RateBook (or None to unbind)
+        """
+        self._rate_book = rate_book
+        for name in DEPENDENCIES:
+            if name != 'total_enrollment':
+                self._derived.pop(name, None)
+
+    @property
+    def rate_book(self):
+        """Returns the bound RateBook (None if not bound)."""
+        return self._rate_book
 
     #getter methods
     def get_plan_id(self):
@@ -130,9 +240,9 @@ class Plan:
         return copay_brf
 
     #plan brf calculation methods
-    def calculate_plan_brf(self, claims_probability_distribution, deductible_threshold_data, 
-                          coinsurance_threshold_data, moop_threshold_data, 
-                          pcp_copay_data, spc_copay_data, er_copay_data):
+    def calculate_plan_brf(self, claims_probability_distribution=None, deductible_threshold_data=None, 
+                          coinsurance_threshold_data=None, moop_threshold_data=None, 
+                          pcp_copay_data=None, spc_copay_data=None, er_copay_data=None, cache=None, tables_hash=None):
         """
         Calculate the final plan BRF by automatically computing all intermediate steps.
         This method handles the complete calculation pipeline:
@@ -143,16 +253,46 @@ class Plan:
         
         Args:
             claims_probability_distribution: DataFrame with claims probability data
+                                             (or a rate_book.RateBook standing for all seven tables;
+                                             the bound RateBook if not given)
             deductible_threshold_data: Dictionary with deductible threshold ranges
             coinsurance_threshold_data: Dictionary with coinsurance threshold ranges
             moop_threshold_data: Dictionary with MOOP threshold ranges
             pcp_copay_data: 2D dictionary with PCP copay relativity data
             spc_copay_data: 2D dictionary with SPC copay relativity data
             er_copay_data: 2D dictionary with ER copay relativity data
+            cache: Optional design_cache.DesignCache consulted before any computation
+            tables_hash: Content hash of the tables (load_reference_tables()['tables_hash']), needed with a cache
+                         (defaults to the RateBook's)
         
         Returns:
             The calculated plan BRF value
         """
+        if claims_probability_distribution is None:
+            if self._rate_book is None:
+                raise ValueError("Pass the reference tables or bind a RateBook first.")
+            claims_probability_distribution = self._rate_book
+        if tables_hash is None and isinstance(claims_probability_distribution, RateBook):
+            tables_hash = claims_probability_distribution.tables_hash
+        (claims_probability_distribution, deductible_threshold_data, coinsurance_threshold_data, moop_threshold_data,
+         pcp_copay_data, spc_copay_data, er_copay_data) = table_arguments(
+            claims_probability_distribution, deductible_threshold_data, coinsurance_threshold_data,
+            moop_threshold_data, pcp_copay_data, spc_copay_data, er_copay_data)
+
+        #step 0: reuse the results of the same design priced on the same tables
+        if cache is not None:
+            if tables_hash is None:
+                raise ValueError("A tables_hash is needed to use a design cache.")
+            cached = cache.get(self._design(), tables_hash)
+            if cached is not None:
+                self.deductible_index = cached['deductible_index']
+                self.moop_index = cached['moop_index']
+                self.coinsurance_index = cached['coinsurance_index']
+                self.base_brf = cached['base_brf']
+                self.copay_brf = cached['copay_brf']
+                self.plan_brf = cached['plan_brf']
+                return self.plan_brf
+
         #step 1: calculate indices (needed for copay brf calculation)
         self.calculate_indices(deductible_threshold_data, coinsurance_threshold_data, moop_threshold_data)
         
@@ -164,9 +304,63 @@ class Plan:
         
         #step 4: calculate final plan brf
         self.plan_brf = self.base_brf * self.copay_brf
+
+        if cache is not None:
+            indices = (self.deductible_index, self.moop_index, self.coinsurance_index)
+            cache.put(self._design(), tables_hash, {
+                'deductible_index': self.deductible_index,
+                'moop_index': self.moop_index,
+                'coinsurance_index': self.coinsurance_index,
+                'base_plan_index': None if None in indices else self.get_base_plan_index(),
+                'base_brf': self.base_brf,
+                'copay_brf': self.copay_brf,
+                'plan_brf': self.plan_brf
+            })
         return self.plan_brf
 
     #private helper methods
+    def _invalidate(self, name):
+        """
+        Clear the derived values computed from an input or derived value.
+        """
+        for dependent in DEPENDENTS[name]:
+            self._derived.pop(dependent, None)
+
+    def _compute_deductible_index(self):
+        """Lazy deductible index against the bound RateBook."""
+        return self._calculate_index(self.deductible, self._rate_book.deductible_threshold_data)
+
+    def _compute_moop_index(self):
+        """Lazy MOOP index against the bound RateBook."""
+        return self._calculate_index(self.moop, self._rate_book.moop_threshold_data)
+
+    def _compute_coinsurance_index(self):
+        """Lazy coinsurance index against the bound RateBook."""
+        return self._calculate_index(self.coinsurance, self._rate_book.coinsurance_threshold_data)
+
+    def _compute_base_brf(self):
+        """Lazy base BRF from the bound RateBook's compiled distribution."""
+        return float(self._rate_book.engine.base_brf([self.deductible], [self.coinsurance], [self.moop])[0])
+
+    def _compute_copay_brf(self):
+        """Lazy copay BRF (computes the indices it needs) against the bound RateBook."""
+        rate_book = self._rate_book
+        return self.calculate_copay_brf(rate_book.pcp_copay_data, rate_book.spc_copay_data, rate_book.er_copay_data)
+
+    def _compute_plan_brf(self):
+        """Lazy plan BRF from the (lazy) base and copay BRFs."""
+        return self.base_brf * self.copay_brf
+
+    def _compute_total_enrollment(self):
+        """Lazy total enrollment."""
+        return self._calculate_total_enrollment()
+
+    def _design(self):
+        """
+        Returns the design tuple (deductible, coinsurance, moop, pcp, spc, er) used as the cache key.
+        """
+        return (self.deductible, self.coinsurance, self.moop, self.pcp_copay, self.spc_copay, self.er_copay)
+
     def _validate_indices_calculated(self):
         """
         Validates that indices have been calculated before use.
@@ -216,9 +410,7 @@ class Plan:
             self.children_enrollment = children_enrollment
         if family_enrollment is not None:
             self.family_enrollment = family_enrollment
-        
-        #recalculate total enrollment
-        self.total_enrollment = self._calculate_total_enrollment()
+        #total enrollment is recalculated on next access; the BRFs are kept
 
     def calculate_enrollment_weight(self):
         """
@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import pandas as pd
+from async_pipeline import BookPipeline
+from brf_calculation import calculate_group_brf
+from data_processing import read_plans_from_csv
+from equivalence_harness import generate_plan_designs, generate_census, write_census_files
+from pure_pricing import compile_pricing_tables
+from rate_book import RateBook
+from results_writer import BookResultsWriter
+from constants import (
+    CLAIMS_PROBABILITY_DISTRIBUTION,
+    PCP_COPAY_DATA,
+    SPC_COPAY_DATA,
+    ER_COPAY_DATA,
+    COINSURANCE_THRESHOLD_DATA,
+    DEDUCTIBLE_THRESHOLD_DATA,
+    MOOP_THRESHOLD_DATA
+)
+
+
+class SlowWriter:
+    """Writer that takes a while per group, to back up the pipeline."""
+
+    def __init__(self):
+        self.groups = []
+
+    def write_group(self, group_id, group_brf, columns=None, results=None):
+        time.sleep(0.005)
+        self.groups.append(group_id)
+
+
+class TestAsyncPipeline(unittest.TestCase):
+    """Test cases for the overlapped ingest -> price -> write pipeline."""
+
+    def setUp(self):
+        """Write 30 random census files to a temporary directory."""
+        self.tables = (CLAIMS_PROBABILITY_DISTRIBUTION, DEDUCTIBLE_THRESHOLD_DATA, COINSURANCE_THRESHOLD_DATA,
+                       MOOP_THRESHOLD_DATA, PCP_COPAY_DATA, SPC_COPAY_DATA, ER_COPAY_DATA)
+        self.pricing_tables = compile_pricing_tables(*self.tables)
+        self.temp_dir = tempfile.mkdtemp()
+        census = generate_census(generate_plan_designs(50, *self.tables, seed=42), 30, seed=42)
+        self.file_paths = write_census_files(census, self.temp_dir)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_results_match_reference(self):
+        """Test every group is priced like calculate_group_brf and written out."""
+        output_dir = os.path.join(self.temp_dir, 'results')
+        with BookResultsWriter(output_dir) as writer:
+            pipeline = BookPipeline(self.pricing_tables, writer, price_workers=3, queue_size=4)
+            results = pipeline.run(self.file_paths)
+
+        self.assertEqual(len(results), 30)
+        for file_path in self.file_paths[:5]:
+            group_id = os.path.splitext(os.path.basename(file_path))[0]
+            self.assertAlmostEqual(results[group_id], calculate_group_brf(read_plans_from_csv(file_path), *self.tables),
+                                   places=12)
+        groups = pd.read_csv(os.path.join(output_dir, 'group_results.csv'))
+        self.assertEqual(len(groups), 30)
+
+        metrics = pipeline.metrics()
+        for stage in ('read', 'price', 'write'):
+            self.assertEqual(metrics['stages'][stage]['groups'], 30)
+            self.assertGreater(metrics['stages'][stage]['groups_per_second'], 0)
+
+    def test_backpressure(self):
+        """Test a slow writer fills the bounded queue without exceeding its capacity."""
+        writer = SlowWriter()
+        pipeline = BookPipeline(self.pricing_tables, writer, queue_size=2)
+        pipeline.run(self.file_paths)
+        self.assertEqual(len(writer.groups), 30)
+        queues = pipeline.metrics()['queues']
+        self.assertEqual(queues['priced']['max_depth'], 2)
+        self.assertLessEqual(queues['parsed']['max_depth'], 2)
+
+    def test_rate_book_and_tables(self):
+        """Test a RateBook or the seven table arguments price every group like the compiled tables."""
+        expected = BookPipeline(self.pricing_tables).run(self.file_paths)
+        for tables in (RateBook.from_constants(), self.tables):
+            pipeline = BookPipeline(tables)
+            self.assertEqual(pipeline.run(self.file_paths), expected)
+            self.assertEqual(pipeline.failed, {})
+
+    def test_failed_file(self):
+        """Test a census file that cannot be read is reported and the rest are priced."""
+        with open(self.file_paths[0], 'w') as f:
+            f.write('Plan ID,Plan Name\n1,Broken\n')
+        pipeline = BookPipeline(self.pricing_tables)
+        results = pipeline.run(self.file_paths)
+        self.assertEqual(len(results), 29)
+        self.assertEqual(list(pipeline.failed), ['group_0'])
+        self.assertEqual(pipeline.metrics()['failed'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import numpy as np
+from audit_log import AuditLog, hash_plan_inputs, read_audit_log
+from batch_job import run_batch_job
+from batch_pricing import plans_to_columns, price_plan_columns
+from brf_calculation import calculate_group_brf
+from columnar_ingest import price_columnar_census, read_plan_columns
+from data_processing import load_reference_tables, read_plans_from_csv
+from constants import (
+    CLAIMS_PROBABILITY_DISTRIBUTION,
+    PCP_COPAY_DATA,
+    SPC_COPAY_DATA,
+    ER_COPAY_DATA,
+    COINSURANCE_THRESHOLD_DATA,
+    DEDUCTIBLE_THRESHOLD_DATA,
+    MOOP_THRESHOLD_DATA
+)
+
+
+class TestAuditLog(unittest.TestCase):
+    """Test cases for the audit trail of priced groups."""
+
+    def setUp(self):
+        """Set up the reference tables and a temporary log directory."""
+        self.tables = (CLAIMS_PROBABILITY_DISTRIBUTION, DEDUCTIBLE_THRESHOLD_DATA, COINSURANCE_THRESHOLD_DATA,
+                       MOOP_THRESHOLD_DATA, PCP_COPAY_DATA, SPC_COPAY_DATA, ER_COPAY_DATA)
+        self.temp_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.temp_dir, 'audit', 'pricing_audit.jsonl')
+        self.table_versions = {'deductible_threshold_data': '1.2', 'pcp_copay_data': '1.0'}
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_records_plan_and_batch_groups(self):
+        """Test Plan and batch groups are recorded with the same input hash, indices and BRFs."""
+        plans = read_plans_from_csv('data_files/tests/test_1.csv')
+        group_brf = calculate_group_brf(plans, *self.tables)
+        columns = read_plan_columns('data_files/tests/test_1.csv')
+        results = price_plan_columns(columns, *self.tables)
+
+        with AuditLog(self.log_path, tables_hash='abc', table_versions=self.table_versions) as audit_log:
+            audit_log.record_plans('group_1', plans, group_brf, quote_id=7)
+            audit_log.record_group('group_1', columns, results, group_brf, tables_hash='def')
+        plan_record, batch_record = read_audit_log(self.log_path)
+
+        self.assertEqual(plan_record['input_hash'], batch_record['input_hash'])
+        self.assertEqual(plan_record['input_hash'], hash_plan_inputs(plans_to_columns(plans)))
+        self.assertEqual((plan_record['tables_hash'], batch_record['tables_hash']), ('abc', 'def'))
+        self.assertEqual(plan_record['table_versions'], self.table_versions)
+        self.assertEqual(plan_record['quote_id'], 7)
+        self.assertEqual(plan_record['n_plans'], len(plans))
+        self.assertAlmostEqual(plan_record['group_brf'], group_brf, places=12)
+        for field in ('deductible_index', 'moop_index', 'coinsurance_index', 'base_plan_index'):
+            self.assertEqual(plan_record['plans'][field], batch_record['plans'][field])
+        np.testing.assert_allclose(plan_record['plans']['plan_brf'], [plan.plan_brf for plan in plans])
+        np.testing.assert_allclose(batch_record['plans']['plan_brf'], results['plan_brf'])
+
+        #a different census hashes differently
+        other = plans_to_columns(read_plans_from_csv('data_files/tests/test_2.csv'))
+        self.assertNotEqual(hash_plan_inputs(other), plan_record['input_hash'])
+
+    def test_recording_is_a_snapshot(self):
+        """Test arrays changed after recording do not change the record."""
+        columns = read_plan_columns('data_files/tests/test_2.csv')
+        results = price_plan_columns(columns, *self.tables)
+        expected_brf = results['plan_brf'].tolist()
+        with AuditLog(self.log_path, flush_interval=10) as audit_log:
+            audit_log.record_group('group_2', columns, results, 1.0)
+            results['plan_brf'][:] = 0.0
+            columns['deductible'][:] = 0.0
+        record = read_audit_log(self.log_path)[0]
+        np.testing.assert_allclose(record['plans']['plan_brf'], expected_brf)
+        self.assertEqual(record['input_hash'], hash_plan_inputs(read_plan_columns('data_files/tests/test_2.csv')))
+
+    def test_rotation_keeps_every_record(self):
+        """Test the log rotates at max_bytes into new files without losing or rewriting records."""
+        columns = read_plan_columns('data_files/tests/test_3.csv')
+        results = price_plan_columns(columns, *self.tables)
+        with AuditLog(self.log_path, max_bytes=2000, buffer_records=2) as audit_log:
+            for group in range(20):
+                audit_log.record_group(f"group_{group}", columns, results, 1.0)
+            audit_log.flush()
+            self.assertEqual(audit_log.records_written, 20)
+            rotated_files = list(audit_log.rotated_files)
+        self.assertGreater(len(rotated_files), 1)
+        for path in rotated_files:
+            self.assertTrue(os.path.exists(path))
+        records = read_audit_log(self.log_path)
+        self.assertEqual([record['group_id'] for record in records], [f"group_{group}" for group in range(20)])
+        self.assertEqual(len(read_audit_log(self.log_path, include_rotated=False)), 20 - sum(
+            len(read_audit_log(path, include_rotated=False)) for path in rotated_files))
+
+    def test_recording_does_not_wait_for_the_disk(self):
+        """Test recording returns while the writer thread is blocked, and flush waits for it."""
+        columns = read_plan_columns('data_files/tests/test_1.csv')
+        results = price_plan_columns(columns, *self.tables)
+        audit_log = AuditLog(self.log_path, buffer_records=1)
+        release = threading.Event()
+        original_write = audit_log._write
+
+        def slow_write(lines):
+            release.wait()
+            original_write(lines)
+
+        audit_log._write = slow_write
+        start = time.perf_counter()
+        for group in range(50):
+            audit_log.record_group(f"group_{group}", columns, results, 1.0)
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertEqual(audit_log.records_written, 0)
+        release.set()
+        audit_log.close()
+        self.assertEqual(audit_log.records_written, 50)
+        with self.assertRaises(ValueError):
+            audit_log.record_group('late', columns, results, 1.0)
+
+    def test_batch_job_and_columnar_ingest_record_groups(self):
+        """Test batch jobs and columnar pricing record each priced group with its census file."""
+        census_dir = os.path.join(self.temp_dir, 'census')
+        os.makedirs(census_dir)
+        file_paths = []
+        for test_number in (1, 2):
+            file_paths.append(os.path.join(census_dir, f"group_{test_number}.csv"))
+            shutil.copyfile(f'data_files/tests/test_{test_number}.csv', file_paths[-1])
+        tables = load_reference_tables('data_files')
+
+        with AuditLog(self.log_path) as audit_log:
+            report = run_batch_job(file_paths, os.path.join(self.temp_dir, 'journal.jsonl'), tables=tables,
+                                   fsync=False, audit_log=audit_log)
+            priced = price_columnar_census(file_paths[0], *self.tables, audit_log=audit_log)
+        records = read_audit_log(self.log_path)
+
+        self.assertEqual([record['group_id'] for record in records], ['group_1', 'group_2', 'group_1'])
+        self.assertEqual(records[0]['tables_hash'], tables['tables_hash'])
+        self.assertEqual(records[0]['file'], file_paths[0])
+        self.assertIn('file_sha256', records[0])
+        self.assertAlmostEqual(records[1]['group_brf'], report['results']['group_2'], places=12)
+        self.assertAlmostEqual(records[2]['group_brf'], priced['group_brf'], places=12)
+        self.assertEqual(records[0]['input_hash'], records[2]['input_hash'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import unittest
+from batch_job import BatchJournal, run_batch_job
+from brf_calculation import calculate_group_brf
+from data_processing import read_plans_from_csv, load_reference_tables, REFERENCE_TABLE_FILES
+
+
+class TestBatchJob(unittest.TestCase):
+    """Test cases for checkpointed, resumable batch pricing."""
+
+    def setUp(self):
+        """Copy the three test groups into a temporary census directory."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.census_dir = os.path.join(self.temp_dir, 'census')
+        os.makedirs(self.census_dir)
+        self.file_paths = []
+        for test_number in (1, 2, 3):
+            target = os.path.join(self.census_dir, f"group_{test_number}.csv")
+            shutil.copyfile(f'data_files/tests/test_{test_number}.csv', target)
+            self.file_paths.append(target)
+        self.journal_path = os.path.join(self.temp_dir, 'journal.jsonl')
+        self.tables = load_reference_tables('data_files')
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def run_job(self, **kwargs):
+        """Run the job on the temporary census without fsync."""
+        return run_batch_job(self.file_paths, self.journal_path, tables=self.tables, fsync=False, **kwargs)
+
+    def test_results_match_reference(self):
+        """Test the job prices every group like calculate_group_brf."""
+        report = self.run_job()
+        self.assertEqual(report['priced'], ['group_1', 'group_2', 'group_3'])
+        table_arguments = tuple(self.tables[name] for name in REFERENCE_TABLE_FILES)
+        for file_path in self.file_paths:
+            group_id = os.path.splitext(os.path.basename(file_path))[0]
+            self.assertAlmostEqual(report['results'][group_id],
+                                   calculate_group_brf(read_plans_from_csv(file_path), *table_arguments), places=12)
+
+    def test_resume_after_crash(self):
+        """Test a run that dies after the first group resumes with the remaining groups only."""
+        def crash(group_id, group_brf):
+            raise RuntimeError("killed")
+
+        with self.assertRaises(RuntimeError):
+            self.run_job(on_result=crash)
+        report = self.run_job()
+        self.assertEqual(report['skipped'], ['group_1'])
+        self.assertEqual(report['priced'], ['group_2', 'group_3'])
+        self.assertEqual(len(report['results']), 3)
+
+        report = self.run_job()
+        self.assertEqual(report['priced'], [])
+        self.assertEqual(len(report['skipped']), 3)
+
+    def test_changed_input_is_repriced(self):
+        """Test an edited census file invalidates only that group's journal entry."""
+        self.run_job()
+        with open(self.file_paths[1], 'a') as f:
+            f.write('\n')
+        report = self.run_job()
+        self.assertEqual(report['priced'], ['group_2'])
+        self.assertEqual(report['invalidated'], ['group_2'])
+
+    def test_changed_tables_are_repriced(self):
+        """Test a change to the reference tables invalidates every journal entry."""
+        self.run_job()
+        self.tables = dict(self.tables, tables_hash='edited tables')
+        report = self.run_job()
+        self.assertEqual(len(report['priced']), 3)
+        self.assertEqual(len(report['invalidated']), 3)
+
+    def test_partial_last_line(self):
+        """Test a partial last line left by a crash is ignored and the journal stays readable."""
+        self.run_job()
+        with open(self.journal_path, 'a') as f:
+            f.write('{"group_id": "group_3", "sta')
+        with BatchJournal(self.journal_path, fsync=False) as journal:
+            self.assertEqual(len(journal.entries), 3)
+            journal.append({'group_id': 'group_4', 'status': 'failed', 'error': 'test'})
+        with BatchJournal(self.journal_path, fsync=False) as journal:
+            self.assertEqual(journal.entries['group_4']['status'], 'failed')
+
+    def test_failed_group_is_retried(self):
+        """Test a census file that cannot be priced is journaled as failed and retried on the next run."""
+        with open(self.file_paths[2], 'w') as f:
+            f.write('Plan ID,Plan Name\n1,Broken\n')
+        report = self.run_job()
+        self.assertIn('group_3', report['failed'])
+        shutil.copyfile('data_files/tests/test_3.csv', self.file_paths[2])
+        report = self.run_job()
+        self.assertEqual(report['priced'], ['group_3'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import unittest
+import numpy as np
+from Plan import Plan
+from data_processing import read_plans_from_csv
+from brf_calculation import calculate_group_brf
+from batch_pricing import (calculate_indices_array, combine_base_plan_index, price_plan_columns,
+                           plans_to_columns, calculate_group_brf_batch, lookup_copay_relativity,
+                           CompiledCopayTable, MISSING_INDEX, aggregate_group_brfs, weighted_group_brf)
+from constants import (
+    CLAIMS_PROBABILITY_DISTRIBUTION,
+    PCP_COPAY_DATA,
+    SPC_COPAY_DATA,
+    ER_COPAY_DATA,
+    COINSURANCE_THRESHOLD_DATA,
+    DEDUCTIBLE_THRESHOLD_DATA,
+    MOOP_THRESHOLD_DATA
+)
+
+
+class TestBatchPricing(unittest.TestCase):
+    """Test cases for vectorized plan pricing."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.tables = (CLAIMS_PROBABILITY_DISTRIBUTION, DEDUCTIBLE_THRESHOLD_DATA, COINSURANCE_THRESHOLD_DATA,
+                       MOOP_THRESHOLD_DATA, PCP_COPAY_DATA, SPC_COPAY_DATA, ER_COPAY_DATA)
+
+    def test_indices_match_plan(self):
+        """Test vectorized index lookup, including band edges and values outside every band."""
+        values = [0, 999.99, 1000, 2500, 7499, 7500, 10000]
+        plan = Plan(1, "Test", 0, 0, 0)
+        expected = [plan._calculate_index(value, DEDUCTIBLE_THRESHOLD_DATA) for value in values]
+        expected = [MISSING_INDEX if index is None else index for index in expected]
+        np.testing.assert_array_equal(calculate_indices_array(values, DEDUCTIBLE_THRESHOLD_DATA), expected)
+
+    def test_combine_base_plan_index(self):
+        """Test the three indices are joined like get_base_plan_index()."""
+        np.testing.assert_array_equal(combine_base_plan_index([2, 1, 12], [1, 3, 1], [3, 1, 10]), [213, 131, 12110])
+
+    def test_plan_values_match_reference(self):
+        """Test every intermediate value against Plan.calculate_plan_brf() for the test files."""
+        for test_number in (1, 2, 3):
+            plans = read_plans_from_csv(f'data_files/tests/test_{test_number}.csv')
+            results = price_plan_columns(plans_to_columns(plans), *self.tables)
+            for i, plan in enumerate(plans):
+                plan.calculate_plan_brf(*self.tables)
+                self.assertEqual(results['base_plan_index'][i], plan.get_base_plan_index())
+                self.assertAlmostEqual(results['base_brf'][i], plan.base_brf, places=12)
+                self.assertAlmostEqual(results['copay_brf'][i], plan.copay_brf, places=12)
+                self.assertAlmostEqual(results['plan_brf'][i], plan.plan_brf, places=12)
+
+    def test_copay_not_in_table(self):
+        """Test a copay amount missing from the copay table gives a relativity of 1.0."""
+        plan = Plan(1, "Test", 1500, 0.2, 4500, pcp_copay=33)
+        results = price_plan_columns(plans_to_columns([plan]), *self.tables)
+        self.assertEqual(results['copay_brf'][0], 1.0)
+
+    def test_compiled_copay_table(self):
+        """Test the compiled copay table gives the dictionary value for every pair, and 1.0 for unknown pairs."""
+        base_indices = [base_index for base_index in PCP_COPAY_DATA for _ in PCP_COPAY_DATA[base_index]] + [999, 111, 111]
+        amounts = [amount for base_index in PCP_COPAY_DATA for amount in PCP_COPAY_DATA[base_index]] + [30, 33, np.nan]
+        expected = [PCP_COPAY_DATA[base_index][amount] for base_index in PCP_COPAY_DATA
+                    for amount in PCP_COPAY_DATA[base_index]] + [1.0, 1.0, 1.0]
+        table = CompiledCopayTable(PCP_COPAY_DATA)
+        np.testing.assert_array_equal(lookup_copay_relativity(table, base_indices, amounts), expected)
+        np.testing.assert_array_equal(lookup_copay_relativity(PCP_COPAY_DATA, base_indices, amounts), expected)
+
+    def test_value_outside_bands(self):
+        """Test out-of-band designs are priced like the reference without copays and raise with copays."""
+        plans = [Plan(1, "Test", 100000, 0.2, 4500, ee_enrollment=1), Plan(2, "Test", 1500, 1.0, 4500, ee_enrollment=1)]
+        results = price_plan_columns(plans_to_columns(plans), *self.tables)
+        self.assertEqual(results['base_plan_index'].tolist(), [MISSING_INDEX, MISSING_INDEX])
+        self.assertAlmostEqual(calculate_group_brf_batch(plans, *self.tables),
+                               calculate_group_brf(plans, *self.tables), places=12)
+
+        plan = Plan(1, "Test", 100000, 0.2, 4500, pcp_copay=30)
+        with self.assertRaises(ValueError):
+            plan.calculate_plan_brf(*self.tables)
+        with self.assertRaises(ValueError):
+            price_plan_columns(plans_to_columns([plan]), *self.tables)
+
+    def test_group_brf_matches_reference(self):
+        """Test calculate_group_brf_batch() against calculate_group_brf()."""
+        plans = read_plans_from_csv('data_files/tests/test_3.csv')
+        expected = calculate_group_brf(read_plans_from_csv('data_files/tests/test_3.csv'), *self.tables)
+        self.assertAlmostEqual(calculate_group_brf_batch(plans, *self.tables), expected, places=12)
+        self.assertIsNone(plans[0].plan_brf)
+
+    def test_aggregate_group_brfs_matches_per_group(self):
+        """Test the segmented reduction against calculate_group_brf() for every group of a book."""
+        book = {group_id: read_plans_from_csv(f'data_files/tests/{group_id}.csv')
+                for group_id in ('test_1', 'test_2', 'test_3')}
+        plans = [plan for group_plans in book.values() for plan in group_plans]
+        group_keys = [group_id for group_id, group_plans in book.items() for _ in group_plans]
+        #interleave the groups, the reduction does not need them sorted
+        order = np.random.default_rng(43).permutation(len(plans))
+        columns = plans_to_columns([plans[row] for row in order])
+        results = price_plan_columns(columns, *self.tables)
+        aggregated = aggregate_group_brfs(np.array(group_keys)[order], results['plan_brf'],
+                                          columns['total_enrollment'])
+        self.assertEqual(sorted(aggregated['group_key'].tolist()), sorted(book))
+        for group_id, n_plans, group_brf in zip(aggregated['group_key'], aggregated['n_plans'],
+                                                aggregated['group_brf']):
+            self.assertEqual(n_plans, len(book[group_id]))
+            self.assertAlmostEqual(group_brf, calculate_group_brf(book[group_id], *self.tables), places=12)
+
+    def test_zero_enrollment_groups(self):
+        """Test groups with zero total enrollment follow the zero_enrollment policy."""
+        group_keys = ['a', 'a', 'b', 'b']
+        plan_brf = [0.8, 0.6, 0.9, 0.7]
+        enrollment = [1, 3, 0, 0]
+        aggregated = aggregate_group_brfs(group_keys, plan_brf, enrollment)
+        self.assertAlmostEqual(aggregated['group_brf'][0], 0.65)
+        self.assertTrue(np.isnan(aggregated['group_brf'][1]))
+        self.assertEqual(aggregated['zero_enrollment'].tolist(), [False, True])
+
+        aggregated = aggregate_group_brfs(group_keys, plan_brf, enrollment, zero_enrollment='unweighted')
+        self.assertAlmostEqual(aggregated['group_brf'][1], 0.8)
+        with self.assertRaises(ValueError):
+            aggregate_group_brfs(group_keys, plan_brf, enrollment, zero_enrollment='raise')
+        with self.assertRaises(ValueError):
+            aggregate_group_brfs(group_keys, plan_brf, enrollment, zero_enrollment='skip')
+        with self.assertRaises(ValueError):
+            aggregate_group_brfs(['a', None, 'b', 'b'], plan_brf, enrollment)
+
+        with self.assertRaises(ValueError):
+            weighted_group_brf([0.9, 0.7], [0, 0])
+        self.assertAlmostEqual(weighted_group_brf([0.9, 0.7], [0, 0], zero_enrollment='unweighted'), 0.8)
+
+        plans = [Plan('1', 'Plan 1', 1000, 0.2, 5000, ee_enrollment=0, spouse_enrollment=0,
+                      children_enrollment=0, family_enrollment=0)]
+        with self.assertRaises(ValueError):
+            calculate_group_brf_batch(plans, *self.tables)
+        with self.assertRaises(ValueError):
+            calculate_group_brf(plans, *self.tables)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from batch_pricing import price_plan_columns
+from brf_surface import BRFSurface, build_surface, load_or_build_surface
+from data_processing import load_reference_tables, REFERENCE_TABLE_FILES
+from equivalence_harness import generate_plan_designs
+
+
+class TestBrfSurface(unittest.TestCase):
+    """Test cases for the materialized BRF surface."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Build one surface on a small grid for every test."""
+        cls.tables = load_reference_tables('data_files')
+        cls.table_arguments = tuple(cls.tables[name] for name in REFERENCE_TABLE_FILES)
+        cls.grid = {'deductibles': np.arange(0, 10001, 500), 'coinsurances': [0, 0.1, 0.2, 0.3, 0.5, 0.8, 1.0],
+                    'moops': np.arange(0, 15001, 500)}
+        cls.surface = build_surface(cls.tables, **cls.grid)
+
+    def setUp(self):
+        """Create random in-band designs and a temporary directory."""
+        self.designs = generate_plan_designs(3000, *self.table_arguments, seed=40)
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_within_error_bound(self):
+        """Test surface pricing stays within the error bound of exact pricing, with exact indices."""
+        expected = price_plan_columns(self.designs, *self.table_arguments)
+        results, report = self.surface.price_plan_columns(self.designs)
+        self.assertEqual(sum(report.values()), len(self.designs))
+        self.assertGreater(report['interpolated'], 0)
+        np.testing.assert_array_equal(results['base_plan_index'], expected['base_plan_index'])
+        self.assertLess(np.abs(results['base_brf'] - expected['base_brf']).max(), self.surface.error_bound)
+
+    def test_grid_hits_are_exact(self):
+        """Test designs on grid points are served from the surface with the exact base BRF."""
+        designs = {'deductible': [500, 1000, 2500], 'coinsurance': [0.2, 0.0, 0.3], 'moop': [3000, 5000, 7500],
+                   'pcp': [25, np.nan, 10], 'spc': [np.nan, 50, np.nan], 'er': [250, np.nan, np.nan]}
+        expected = price_plan_columns(designs, *self.table_arguments)
+        results, report = self.surface.price_plan_columns(designs)
+        self.assertEqual(report['grid'], 3)
+        np.testing.assert_allclose(results['plan_brf'], expected['plan_brf'], rtol=0, atol=1e-12)
+
+        lookup = self.surface.lookup(500, 0.2, 3000, pcp=25, er=250)
+        self.assertEqual(lookup['source'], 'grid')
+        self.assertAlmostEqual(lookup['plan_brf'], expected['plan_brf'][0], places=12)
+
+    def test_zero_error_bound_falls_back(self):
+        """Test an error bound of 0 never interpolates, so every result is exact."""
+        surface = build_surface(self.tables, error_bound=0, **self.grid)
+        expected = price_plan_columns(self.designs, *self.table_arguments)
+        results, report = surface.price_plan_columns(self.designs)
+        self.assertEqual(report['interpolated'], 0)
+        np.testing.assert_allclose(results['plan_brf'], expected['plan_brf'], rtol=0, atol=1e-12)
+        self.assertEqual(surface.lookup(1234.5, 0.23, 6789.1)['source'], 'computed')
+
+    def test_lookup_matches_columns(self):
+        """Test the scalar lookup gives the same answers as the vectorized path."""
+        results, _ = self.surface.price_plan_columns(self.designs)
+        for row in range(0, len(self.designs), 97):
+            design = self.designs.iloc[row]
+            lookup = self.surface.lookup(design['deductible'], design['coinsurance'], design['moop'],
+                                         design['pcp'], design['spc'], design['er'])
+            self.assertAlmostEqual(lookup['plan_brf'], results['plan_brf'][row], places=12)
+
+    def test_out_of_band_with_copay(self):
+        """Test an out-of-band design with a copay raises a ValueError, as in the reference path."""
+        with self.assertRaises(ValueError):
+            self.surface.lookup(-10, 0.2, 3000, pcp=25)
+
+    def test_save_and_load(self):
+        """Test a saved surface gives the same results and is tied to its tables."""
+        file_path = os.path.join(self.temp_dir, 'surface.npz')
+        self.surface.save(file_path)
+        loaded = BRFSurface.load(file_path, tables_hash=self.tables['tables_hash'])
+        expected, _ = self.surface.price_plan_columns(self.designs)
+        results, _ = loaded.price_plan_columns(self.designs)
+        np.testing.assert_allclose(results['plan_brf'], expected['plan_brf'], rtol=0, atol=1e-12)
+        with self.assertRaises(ValueError):
+            BRFSurface.load(file_path, tables_hash='0' * 64)
+
+    def test_load_or_build(self):
+        """Test the surface of a table version is built once and then loaded."""
+        surface = load_or_build_surface(self.temp_dir, self.tables, **self.grid)
+        self.assertEqual(len(os.listdir(self.temp_dir)), 1)
+        loaded = load_or_build_surface(self.temp_dir, self.tables)
+        np.testing.assert_array_equal(loaded.base_brf, surface.base_brf)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from census_validation import ERROR, WARNING, format_report, validate_census, validate_census_file
+from columnar_ingest import price_columnar_census
+from rate_book import RateBook
+from constants import (
+    CLAIMS_PROBABILITY_DISTRIBUTION,
+    PCP_COPAY_DATA,
+    SPC_COPAY_DATA,
+    ER_COPAY_DATA,
+    COINSURANCE_THRESHOLD_DATA,
+    DEDUCTIBLE_THRESHOLD_DATA,
+    MOOP_THRESHOLD_DATA
+)
+
+
+class TestCensusValidation(unittest.TestCase):
+    """Test cases for pre-flight census validation."""
+
+    def setUp(self):
+        """Set up the reference tables and a clean census."""
+        self.tables = (CLAIMS_PROBABILITY_DISTRIBUTION, DEDUCTIBLE_THRESHOLD_DATA, COINSURANCE_THRESHOLD_DATA,
+                       MOOP_THRESHOLD_DATA, PCP_COPAY_DATA, SPC_COPAY_DATA, ER_COPAY_DATA)
+        self.rate_book = RateBook(*self.tables)
+        self.temp_dir = tempfile.mkdtemp()
+
+        #an in-band base plan index with a stored PCP copay amount
+        base_plan_index = next(index for index in PCP_COPAY_DATA if PCP_COPAY_DATA[index])
+        self.pcp_amount = next(iter(PCP_COPAY_DATA[base_plan_index]))
+        census = {'plan': [], 'deductible': [], 'coinsurance': [], 'moop': []}
+        deductible_index, moop_index, coinsurance_index = (int(digit) for digit in str(base_plan_index))
+        for _ in range(4):
+            census['deductible'].append(DEDUCTIBLE_THRESHOLD_DATA[deductible_index][0])
+            census['coinsurance'].append(COINSURANCE_THRESHOLD_DATA[coinsurance_index][0])
+            census['moop'].append(MOOP_THRESHOLD_DATA[moop_index][0])
+            census['plan'].append(f"plan_{len(census['plan']) + 1}")
+        census.update({'pcp': [self.pcp_amount] * 4, 'spc': [np.nan] * 4, 'er': [np.nan] * 4,
+                       'ee': [3, 1, 2, 4], 'es': [0, 1, 0, 0], 'ec': [np.nan] * 4, 'ef': [1, 0, 0, 2]})
+        self.census = pd.DataFrame(census)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_clean_census_is_valid(self):
+        """Test a census with in-band designs, stored copays and enrollment has no issues."""
+        report = validate_census(self.census, self.rate_book)
+        self.assertTrue(report['valid'])
+        self.assertEqual(report['n_rows'], 4)
+        self.assertEqual(len(report['issues']), 0)
+        self.assertEqual(report['error_rows'], [])
+
+    def test_reports_every_row_at_once(self):
+        """Test every failing row of every check is reported in one pass, with its severity."""
+        census = self.census.astype(object)
+        census.loc[0, 'deductible'] = 10 ** 9
+        census.loc[1, 'moop'] = 'n/a'
+        census.loc[2, 'pcp'] = 9999
+        census.loc[3, ['ee', 'es', 'ef']] = 0
+        census.loc[1, 'ef'] = -1
+        census.loc[3, 'coinsurance'] = 5.0
+        census.loc[3, 'pcp'] = np.nan
+
+        report = validate_census(census, self.rate_book)
+        issues = report['issues']
+        found = {(row, column, check, severity) for row, column, check, severity
+                 in issues[['row', 'column', 'check', 'severity']].itertuples(index=False)}
+        self.assertEqual(found, {
+            (0, 'deductible', 'out_of_band', ERROR),
+            (1, 'moop', 'not_a_number', ERROR),
+            (1, 'ef', 'negative_enrollment', ERROR),
+            (2, 'pcp', 'copay_not_in_table', WARNING),
+            (3, 'coinsurance', 'out_of_band', WARNING),
+            (3, 'total_enrollment', 'zero_enrollment', WARNING)
+        })
+        self.assertFalse(report['valid'])
+        self.assertEqual(report['error_rows'], [0, 1])
+        self.assertEqual(report['counts']['out_of_band'], 2)
+
+    def test_missing_columns_and_zero_total_enrollment(self):
+        """Test missing columns and a census without enrollment are census-level errors."""
+        census = self.census.drop(columns=['er'])
+        report = validate_census(census, self.rate_book)
+        self.assertEqual(report['missing_columns'], ['er'])
+        self.assertTrue(report['issues']['row'].isna().iloc[0])
+
+        census = self.census.copy()
+        census[['ee', 'es', 'ec', 'ef']] = 0
+        report = validate_census(census, self.rate_book)
+        self.assertIn('zero_total_enrollment', report['counts'])
+        self.assertEqual(report['counts']['zero_enrollment'], 4)
+        self.assertFalse(report['valid'])
+
+    def test_matches_reference_lookups(self):
+        """Test out-of-band rows match the rows the reference Plan path cannot index."""
+        from Plan import Plan
+
+        rng = np.random.default_rng(7)
+        census = pd.DataFrame({'deductible': rng.uniform(-500, 20000, 300).round(),
+                               'coinsurance': rng.uniform(-0.1, 1.1, 300).round(2),
+                               'moop': rng.uniform(-500, 30000, 300).round(),
+                               'pcp': np.nan, 'spc': np.nan, 'er': np.nan,
+                               'ee': 1, 'es': 0, 'ec': 0, 'ef': 0})
+        report = validate_census(census, self.tables)
+        issues = report['issues']
+        for row in range(len(census)):
+            plan = Plan(row, 'plan', *census.loc[row, ['deductible', 'coinsurance', 'moop']])
+            expected = set()
+            if plan._calculate_index(plan.deductible, DEDUCTIBLE_THRESHOLD_DATA) is None:
+                expected.add('deductible')
+            if plan._calculate_index(plan.coinsurance, COINSURANCE_THRESHOLD_DATA) is None:
+                expected.add('coinsurance')
+            if plan._calculate_index(plan.moop, MOOP_THRESHOLD_DATA) is None:
+                expected.add('moop')
+            self.assertEqual(set(issues.loc[issues['row'] == row, 'column']), expected)
+        #without copays, out-of-band designs still price
+        self.assertTrue(report['valid'])
+
+    def test_price_columnar_census_fails_before_pricing(self):
+        """Test columnar pricing raises the full report before pricing an invalid census."""
+        census = self.census.copy()
+        census.loc[[0, 2], 'deductible'] = 10 ** 9
+        path = os.path.join(self.temp_dir, 'census.csv')
+        census.to_csv(path, index=False)
+
+        report = validate_census_file(path, self.rate_book)
+        self.assertEqual(report['error_rows'], [0, 2])
+        self.assertIn('at rows [0, 2]', format_report(report))
+        with self.assertRaises(ValueError) as context:
+            price_columnar_census(path, self.rate_book)
+        self.assertIn('2 error(s) in 2 row(s)', str(context.exception))
+
+        self.census.to_csv(path, index=False)
+        validated = price_columnar_census(path, self.rate_book)
+        unvalidated = price_columnar_census(path, *self.tables, validate=False)
+        np.testing.assert_allclose(validated['results']['plan_brf'], unvalidated['results']['plan_brf'])
+
+
+if __name__ == '__main__':
+    unittest.main()
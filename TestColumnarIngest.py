@@ -0,0 +1,132 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from brf_calculation import calculate_group_brf
+from data_processing import read_plans_from_csv
+from columnar_ingest import apply_census_defaults, read_plan_columns, price_columnar_census, to_float
+from constants import (
+    CLAIMS_PROBABILITY_DISTRIBUTION,
+    PCP_COPAY_DATA,
+    SPC_COPAY_DATA,
+    ER_COPAY_DATA,
+    COINSURANCE_THRESHOLD_DATA,
+    DEDUCTIBLE_THRESHOLD_DATA,
+    MOOP_THRESHOLD_DATA
+)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.ipc as ipc
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+
+@unittest.skipUnless(HAS_PYARROW, "pyarrow is required for Parquet and Arrow census files")
+class TestColumnarIngest(unittest.TestCase):
+    """Test cases for Parquet / Arrow census ingest."""
+
+    def setUp(self):
+        """Write the test CSV census as Parquet, Arrow IPC file and Arrow IPC stream."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.tables = (CLAIMS_PROBABILITY_DISTRIBUTION, DEDUCTIBLE_THRESHOLD_DATA, COINSURANCE_THRESHOLD_DATA,
+                       MOOP_THRESHOLD_DATA, PCP_COPAY_DATA, SPC_COPAY_DATA, ER_COPAY_DATA)
+
+        df = pd.read_csv('data_files/tests/test_1.csv')
+        df.columns = ['plan'] + [column.strip() for column in df.columns[1:]]
+        #an extra warehouse column that pricing never reads
+        df['notes'] = 'not needed'
+        table = pa.Table.from_pandas(df, preserve_index=False)
+
+        self.paths = {
+            'parquet': os.path.join(self.temp_dir, 'census.parquet'),
+            'arrow': os.path.join(self.temp_dir, 'census.arrow'),
+            'arrow_stream': os.path.join(self.temp_dir, 'census.arrows')
+        }
+        pq.write_table(table, self.paths['parquet'])
+        with ipc.new_file(self.paths['arrow'], table.schema) as writer:
+            writer.write_table(table, max_chunksize=2)
+        with ipc.new_stream(self.paths['arrow_stream'], table.schema) as writer:
+            writer.write_table(table)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_columns_match_csv_reader(self):
+        """Test every format gives the same values as read_plans_from_csv."""
+        plans = read_plans_from_csv('data_files/tests/test_1.csv')
+        for file_format, path in self.paths.items():
+            for memory_map in (False, True):
+                columns = read_plan_columns(path, memory_map=memory_map)
+                self.assertNotIn('notes', columns)
+                self.assertEqual(list(columns['plan_name']), [plan.plan_name for plan in plans])
+                np.testing.assert_array_equal(columns['deductible'], [plan.deductible for plan in plans])
+                np.testing.assert_array_equal(columns['total_enrollment'], [plan.total_enrollment for plan in plans])
+                np.testing.assert_array_equal(columns['pcp'], [np.nan if plan.pcp_copay is None else plan.pcp_copay
+                                                               for plan in plans])
+
+    def test_memory_map_is_closed(self):
+        """Test memory-mapped reads do not leave file descriptors open."""
+        open_files = len(os.listdir('/proc/self/fd')) if os.path.isdir('/proc/self/fd') else None
+        #results are kept alive, so any array still pointing into a map would keep it open
+        results = [read_plan_columns(self.paths['arrow'], memory_map=True) for _ in range(50)]
+        self.assertEqual(results[-1]['deductible'][0], 1500)
+        if open_files is not None:
+            self.assertLessEqual(len(os.listdir('/proc/self/fd')), open_files)
+
+    def test_blank_values_use_csv_defaults(self):
+        """Test blank strings and nulls default like read_plans_from_csv."""
+        table = pa.table({'': ['a', None], 'deductible': ['1500', ''], 'coinsurance': [0.2, None],
+                          'moop': [4500.0, 3000.0], 'pcp': ['30', ' '], 'spc': [None, None], 'er': [250.0, None],
+                          'ee': [1, None], 'es': ['', '2'], 'ec': [None, None], 'ef': [0, 3]})
+        path = os.path.join(self.temp_dir, 'blanks.parquet')
+        pq.write_table(table, path)
+
+        columns = read_plan_columns(path)
+        self.assertEqual(list(columns['plan_name']), ['a', 'plan_2'])
+        np.testing.assert_array_equal(columns['deductible'], [1500, 0])
+        np.testing.assert_array_equal(columns['coinsurance'], [0.2, 0])
+        np.testing.assert_array_equal(columns['pcp'], [30, np.nan])
+        np.testing.assert_array_equal(columns['total_enrollment'], [1, 5])
+
+    def test_text_values_raise(self):
+        """Test text that is not a number raises a ValueError naming the column and rows, or is NaN when coerced."""
+        table = pa.table({'': ['a', 'b', 'c'], 'deductible': ['1500', 'n/a', '$1,500'], 'coinsurance': [0.2, 0.2, 0.2],
+                          'moop': [4500.0, 3000.0, 3000.0], 'pcp': [None, None, None], 'spc': [None, None, None],
+                          'er': [None, None, None], 'ee': [1, 1, 1], 'es': [0, 0, 0], 'ec': [0, 0, 0], 'ef': [0, 0, 0]})
+        path = os.path.join(self.temp_dir, 'text.parquet')
+        pq.write_table(table, path)
+        with self.assertRaises(ValueError) as context:
+            read_plan_columns(path)
+        self.assertIn("'deductible'", str(context.exception))
+        self.assertIn("1: 'n/a', 2: '$1,500'", str(context.exception))
+        with self.assertRaises(ValueError):
+            price_columnar_census(path, *self.tables, validate=False)
+
+        np.testing.assert_array_equal(to_float(['1500', ' ', None, 'n/a'], errors='coerce'),
+                                      [1500, np.nan, np.nan, np.nan])
+        columns = apply_census_defaults({name: table.column(name).to_pylist() for name in table.column_names},
+                                        errors='coerce')
+        np.testing.assert_array_equal(columns['deductible'], [1500, 0, 0])
+
+    def test_missing_column_raises(self):
+        """Test a census without a required column raises a ValueError."""
+        path = os.path.join(self.temp_dir, 'missing.parquet')
+        pq.write_table(pa.table({'deductible': [1500]}), path)
+        with self.assertRaises(ValueError):
+            read_plan_columns(path)
+
+    def test_price_columnar_census(self):
+        """Test the group BRF from Parquet matches calculate_group_brf on the CSV."""
+        expected = calculate_group_brf(read_plans_from_csv('data_files/tests/test_1.csv'), *self.tables)
+        result = price_columnar_census(self.paths['parquet'], *self.tables)
+        self.assertAlmostEqual(result['group_brf'], expected, places=12)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from Plan import Plan
+from batch_pricing import PLAN_DESIGN_COLUMNS, plans_to_columns, price_plan_columns
+from data_processing import read_plans_from_csv, reference_tables_hash
+from design_cache import DesignCache
+from quote_store import design_key
+from constants import (
+    CLAIMS_PROBABILITY_DISTRIBUTION,
+    PCP_COPAY_DATA,
+    SPC_COPAY_DATA,
+    ER_COPAY_DATA,
+    COINSURANCE_THRESHOLD_DATA,
+    DEDUCTIBLE_THRESHOLD_DATA,
+    MOOP_THRESHOLD_DATA
+)
+
+
+def _write_designs(db_path, tables_hash, offset, n_designs):
+    """Cache n_designs synthetic designs from another process, one transaction per design."""
+    with DesignCache(db_path) as cache:
+        for deductible in range(offset, offset + n_designs):
+            cache.put((deductible, 0.2, 5000, None, None, None), tables_hash,
+                      {'deductible_index': 1, 'moop_index': 1, 'coinsurance_index': 1, 'base_plan_index': 111,
+                       'base_brf': 0.5, 'copay_brf': 1.0, 'plan_brf': 0.5})
+            cache.get((offset, 0.2, 5000, None, None, None), tables_hash)
+
+
+class TestDesignCache(unittest.TestCase):
+    """Test cases for the on-disk design cache."""
+
+    def setUp(self):
+        """Set up test fixtures and an empty cache."""
+        self.tables = (CLAIMS_PROBABILITY_DISTRIBUTION, DEDUCTIBLE_THRESHOLD_DATA, COINSURANCE_THRESHOLD_DATA,
+                       MOOP_THRESHOLD_DATA, PCP_COPAY_DATA, SPC_COPAY_DATA, ER_COPAY_DATA)
+        self.tables_hash = reference_tables_hash('data_files')
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'design_cache.db')
+        self.cache = DesignCache(self.db_path)
+
+    def tearDown(self):
+        """Close the cache and remove the temporary directory."""
+        self.cache.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_batch_pricing_through_cache(self):
+        """Test cached batch pricing gives the uncached results and prices every design only once."""
+        columns = plans_to_columns(read_plans_from_csv('data_files/tests/test_3.csv'))
+        #an out-of-band design without copays is cached with missing indices
+        columns['deductible'][0] = -100
+        for name in ('pcp', 'spc', 'er'):
+            columns[name][0] = np.nan
+        expected = price_plan_columns(columns, *self.tables)
+        for _ in range(2):
+            results = price_plan_columns(columns, *self.tables, cache=self.cache, tables_hash=self.tables_hash)
+            for name, values in expected.items():
+                np.testing.assert_allclose(results[name], values, rtol=0, atol=1e-12)
+        stats = self.cache.stats()
+        self.assertEqual(stats['hits'], len(columns['deductible']))
+        designs = zip(*(columns[name].tolist() for name in PLAN_DESIGN_COLUMNS))
+        self.assertEqual(stats['entries'], len({design_key(design) for design in designs}))
+
+    def test_plan_uses_cache(self):
+        """Test Plan.calculate_plan_brf reuses designs cached by batch pricing and by other plans."""
+        plans = read_plans_from_csv('data_files/tests/test_1.csv')
+        price_plan_columns(plans_to_columns(plans), *self.tables, cache=self.cache, tables_hash=self.tables_hash)
+        for plan, expected in zip(plans, read_plans_from_csv('data_files/tests/test_1.csv')):
+            plan.calculate_plan_brf(*self.tables, cache=self.cache, tables_hash=self.tables_hash)
+            expected.calculate_plan_brf(*self.tables)
+            self.assertAlmostEqual(plan.plan_brf, expected.plan_brf, places=12)
+            self.assertEqual(plan.get_base_plan_index(), expected.get_base_plan_index())
+        self.assertEqual(self.cache.stats()['hits'], len(plans))
+
+        plan = Plan('1', 'Plan 1', 1234, 0.2, 5678)
+        plan.calculate_plan_brf(*self.tables, cache=self.cache, tables_hash=self.tables_hash)
+        cached = self.cache.get((1234, 0.2, 5678, None, None, None), self.tables_hash)
+        self.assertAlmostEqual(cached['plan_brf'], plan.plan_brf, places=12)
+        self.assertIsNone(self.cache.get((1234, 0.2, 5678, None, None, None), '0' * 64))
+        with self.assertRaises(ValueError):
+            plan.calculate_plan_brf(*self.tables, cache=self.cache)
+
+    def test_size_bounded_eviction(self):
+        """Test the cache stays under max_entries and evicts the least recently used designs first."""
+        cache = DesignCache(os.path.join(self.temp_dir, 'small.db'), max_entries=10)
+        result = {'deductible_index': 1, 'moop_index': 1, 'coinsurance_index': 1, 'base_plan_index': 111,
+                  'base_brf': 0.5, 'copay_brf': 1.0, 'plan_brf': 0.5}
+        for deductible in range(25):
+            cache.put((deductible, 0.2, 5000, None, None, None), self.tables_hash, result)
+            #keep design 0 in use
+            self.assertIsNotNone(cache.get((0, 0.2, 5000, None, None, None), self.tables_hash))
+        self.assertLessEqual(len(cache), 10)
+        self.assertGreater(cache.stats()['evictions'], 0)
+        self.assertIsNone(cache.get((1, 0.2, 5000, None, None, None), self.tables_hash))
+        self.assertIsNotNone(cache.get((24, 0.2, 5000, None, None, None), self.tables_hash))
+        cache.close()
+
+    def test_concurrent_processes(self):
+        """Test several processes write and read the same cache file at once."""
+        context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn')
+        processes = [context.Process(target=_write_designs, args=(self.db_path, self.tables_hash, offset, 50))
+                     for offset in (0, 1000, 2000)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(60)
+            self.assertEqual(process.exitcode, 0)
+        self.assertEqual(len(self.cache), 150)
+
+
+if __name__ == '__main__':
+    unittest.main()
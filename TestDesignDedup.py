@@ -0,0 +1,92 @@
+import unittest
+import numpy as np
+from batch_pricing import price_plan_columns, plans_to_columns
+from brf_calculation import calculate_group_brf
+from data_processing import read_plans_from_csv
+from design_dedup import factorize_designs, price_plan_columns_dedup, calculate_group_brfs_dedup
+from distribution_engine import DistributionEngine
+from equivalence_harness import generate_plan_designs
+from rate_book import RateBook
+from constants import (
+    CLAIMS_PROBABILITY_DISTRIBUTION,
+    PCP_COPAY_DATA,
+    SPC_COPAY_DATA,
+    ER_COPAY_DATA,
+    COINSURANCE_THRESHOLD_DATA,
+    DEDUCTIBLE_THRESHOLD_DATA,
+    MOOP_THRESHOLD_DATA
+)
+
+
+class TestDesignDedup(unittest.TestCase):
+    """Test cases for design deduplication before pricing."""
+
+    def setUp(self):
+        """Set up the tables and a book of 600 rows drawn from 30 designs."""
+        self.tables = (CLAIMS_PROBABILITY_DISTRIBUTION, DEDUCTIBLE_THRESHOLD_DATA, COINSURANCE_THRESHOLD_DATA,
+                       MOOP_THRESHOLD_DATA, PCP_COPAY_DATA, SPC_COPAY_DATA, ER_COPAY_DATA)
+        designs = generate_plan_designs(30, *self.tables, seed=38)
+        rows = np.random.default_rng(38).integers(0, len(designs), size=600)
+        self.columns = {name: designs[name].to_numpy()[rows] for name in designs.columns}
+
+    def test_factorize_designs(self):
+        """Test the inverse index rebuilds every row and missing copays (NaN and 0) are one value."""
+        unique, inverse = factorize_designs(self.columns)
+        self.assertLessEqual(len(unique['deductible']), 30)
+        for name in ('deductible', 'coinsurance', 'moop'):
+            np.testing.assert_array_equal(unique[name][inverse], self.columns[name])
+
+        columns = {'deductible': [500, 500, 500], 'coinsurance': [0.2, 0.2, 0.2], 'moop': [3000, 3000, 3000],
+                   'pcp': [np.nan, 0, 25], 'spc': [0, np.nan, np.nan], 'er': [np.nan, np.nan, np.nan]}
+        unique, inverse = factorize_designs(columns)
+        self.assertEqual(len(unique['deductible']), 2)
+        self.assertEqual(inverse[0], inverse[1])
+        self.assertTrue(np.isnan(unique['pcp'][inverse[0]]))
+
+    def test_matches_batch_pricing(self):
+        """Test dedup pricing through Plan objects and through an engine match pricing every row."""
+        expected = price_plan_columns(self.columns, *self.tables)
+        results, report = price_plan_columns_dedup(self.columns, *self.tables)
+        engine_results, _ = price_plan_columns_dedup(
+            self.columns, *self.tables, engine=DistributionEngine.from_claims_probability(self.tables[0]))
+        for name in ('deductible_index', 'moop_index', 'coinsurance_index', 'base_plan_index'):
+            np.testing.assert_array_equal(results[name], expected[name])
+        np.testing.assert_allclose(results['plan_brf'], expected['plan_brf'], rtol=0, atol=1e-12)
+        np.testing.assert_allclose(engine_results['plan_brf'], expected['plan_brf'], rtol=0, atol=1e-12)
+
+        self.assertEqual(report['n_plans'], 600)
+        self.assertAlmostEqual(report['dedup_ratio'], 600 / report['n_unique_designs'])
+
+    def test_group_brfs(self):
+        """Test book-wide dedup gives the reference group BRFs for the three test groups."""
+        groups = {test_number: read_plans_from_csv(f'data_files/tests/test_{test_number}.csv')
+                  for test_number in (1, 2, 3)}
+        group_brfs, report = calculate_group_brfs_dedup(groups, *self.tables)
+        self.assertEqual(report['n_plans'], sum(len(plans) for plans in groups.values()))
+        for test_number, plans in groups.items():
+            self.assertIsNone(plans[0].plan_brf)
+            self.assertAlmostEqual(group_brfs[test_number], calculate_group_brf(plans, *self.tables), places=12)
+
+    def test_rate_book(self):
+        """Test dedup pricing and group BRFs with a RateBook in place of the seven tables."""
+        rate_book = RateBook(*self.tables)
+        expected = price_plan_columns(self.columns, *self.tables)
+        results, report = price_plan_columns_dedup(self.columns, rate_book)
+        np.testing.assert_array_equal(results['base_plan_index'], expected['base_plan_index'])
+        np.testing.assert_allclose(results['plan_brf'], expected['plan_brf'], rtol=0, atol=1e-12)
+        self.assertEqual(report['n_plans'], 600)
+
+        plans = read_plans_from_csv('data_files/tests/test_1.csv')
+        group_brfs, _ = calculate_group_brfs_dedup({'group_1': plans}, rate_book)
+        self.assertAlmostEqual(group_brfs['group_1'], calculate_group_brf(plans, *self.tables), places=12)
+
+    def test_out_of_band_with_copay(self):
+        """Test an out-of-band design with a copay raises a ValueError, like the reference path."""
+        columns = plans_to_columns(read_plans_from_csv('data_files/tests/test_1.csv'))
+        columns['deductible'][0] = -10
+        with self.assertRaises(ValueError):
+            price_plan_columns_dedup(columns, *self.tables)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import glob
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from multiprocessing.connection import Client
+from brf_calculation import calculate_group_brf
+from data_processing import read_plans_from_csv, load_reference_tables
+from distributed import Coordinator, run_worker, reprice_book_local, authkey_from_environment
+from constants import (
+    CLAIMS_PROBABILITY_DISTRIBUTION,
+    PCP_COPAY_DATA,
+    SPC_COPAY_DATA,
+    ER_COPAY_DATA,
+    COINSURANCE_THRESHOLD_DATA,
+    DEDUCTIBLE_THRESHOLD_DATA,
+    MOOP_THRESHOLD_DATA
+)
+
+AUTHKEY = b'test-key'
+
+
+class TestDistributed(unittest.TestCase):
+    """Test cases for coordinator / worker repricing on localhost."""
+
+    def setUp(self):
+        """Create a book of 12 group census files."""
+        self.temp_dir = tempfile.mkdtemp()
+        for i in range(12):
+            shutil.copy(f'data_files/tests/test_{i % 3 + 1}.csv', os.path.join(self.temp_dir, f'group_{i:02d}.csv'))
+        self.file_paths = glob.glob(os.path.join(self.temp_dir, '*.csv'))
+
+        tables = (CLAIMS_PROBABILITY_DISTRIBUTION, DEDUCTIBLE_THRESHOLD_DATA, COINSURANCE_THRESHOLD_DATA,
+                  MOOP_THRESHOLD_DATA, PCP_COPAY_DATA, SPC_COPAY_DATA, ER_COPAY_DATA)
+        self.expected = {os.path.splitext(os.path.basename(path))[0]: calculate_group_brf(read_plans_from_csv(path), *tables)
+                         for path in self.file_paths}
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_several_worker_processes(self):
+        """Test three worker processes on localhost price the whole book."""
+        streamed = []
+        coordinator = reprice_book_local(self.file_paths, 3, shard_size=2, timeout=120,
+                                         on_result=lambda group_id, group_brf, worker_id: streamed.append(group_id))
+        self.assertEqual(coordinator.failed, {})
+        self.assertEqual(sorted(streamed), sorted(self.expected))
+        for group_id, group_brf in self.expected.items():
+            self.assertAlmostEqual(coordinator.results[group_id], group_brf, places=12)
+        self.assertEqual(sum(coordinator.worker_shards.values()), 6)
+
+    def test_authkey_required(self):
+        """Test there is no default key: an empty key or an unset environment variable is rejected."""
+        with self.assertRaises(ValueError):
+            Coordinator(self.file_paths, b'', address=('localhost', 0))
+        previous = os.environ.pop('BRF_REPRICE_AUTHKEY', None)
+        try:
+            with self.assertRaises(ValueError):
+                authkey_from_environment()
+            os.environ['BRF_REPRICE_AUTHKEY'] = 'secret'
+            self.assertEqual(authkey_from_environment(), b'secret')
+        finally:
+            os.environ.pop('BRF_REPRICE_AUTHKEY', None)
+            if previous is not None:
+                os.environ['BRF_REPRICE_AUTHKEY'] = previous
+
+    def test_lost_worker_shard_is_requeued(self):
+        """Test a shard taken by a worker that disconnects is priced by another worker."""
+        coordinator = Coordinator(self.file_paths, AUTHKEY, address=('localhost', 0), shard_size=4)
+        runner = threading.Thread(target=coordinator.run, kwargs={'timeout': 60})
+        runner.start()
+
+        #a worker that takes a shard and then disappears
+        lost = Client(coordinator.address, authkey=AUTHKEY)
+        lost.send(('hello', 'lost'))
+        self.assertEqual(lost.recv()[0], 'shard')
+        lost.close()
+
+        run_worker(coordinator.address, AUTHKEY, worker_id='survivor', tables=load_reference_tables('data_files'))
+        runner.join()
+        self.assertEqual(coordinator.requeued, 1)
+        self.assertEqual(coordinator.worker_shards['survivor'], 3)
+        self.assertEqual(set(coordinator.results), set(self.expected))
+
+    def test_bad_census_fails_after_retries(self):
+        """Test a shard that cannot be priced is retried and then reported as failed."""
+        with open(os.path.join(self.temp_dir, 'group_bad.csv'), 'w') as f:
+            f.write(',deductible,coinsurance\nplan_1,1000,0.2\n')
+        coordinator = Coordinator([os.path.join(self.temp_dir, 'group_bad.csv')] + self.file_paths,
+                                  AUTHKEY, address=('localhost', 0), shard_size=1, max_attempts=2)
+        worker = threading.Thread(target=run_worker, args=(coordinator.address, AUTHKEY),
+                                  kwargs={'tables': load_reference_tables('data_files')})
+        worker.start()
+        results = coordinator.run(timeout=60)
+        worker.join()
+        self.assertEqual(len(coordinator.failed), 1)
+        self.assertEqual(set(results), set(self.expected))
+
+
+if __name__ == '__main__':
+    unittest.main()
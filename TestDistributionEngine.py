@@ -0,0 +1,71 @@
+import unittest
+import numpy as np
+import pandas as pd
+from Plan import Plan
+from distribution_engine import DistributionEngine
+from constants import CLAIMS_PROBABILITY_DISTRIBUTION
+
+
+class TestDistributionEngine(unittest.TestCase):
+    """Test cases for the prefix-sum DistributionEngine."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.claims_prob = CLAIMS_PROBABILITY_DISTRIBUTION
+        self.engine = DistributionEngine.from_claims_probability(self.claims_prob)
+        self.plans = [
+            Plan(1, "plan_1", 1500, 0.2, 4500),
+            Plan(2, "plan_2", 2500, 0.2, 12700),
+            Plan(3, "zero coinsurance", 0, 0, 500),
+            Plan(4, "moop equals deductible", 2500, 0.2, 2500),
+            Plan(5, "moop below deductible", 3000, 0.3, 2000),
+            Plan(6, "high coinsurance", 5000, 0.5, 9100)
+        ]
+
+    def test_base_brf_matches_plan(self):
+        """Test engine base BRF against Plan.calculate_base_brf() for several designs."""
+        result = self.engine.base_brf_for_plans(self.plans)
+        for plan, value in zip(self.plans, result):
+            self.assertAlmostEqual(value, plan.calculate_base_brf(self.claims_prob), places=12)
+
+    def test_deductible_on_bin_boundary(self):
+        """Test a deductible equal to a claim amount (low <= value < high boundary)."""
+        claim = float(self.claims_prob["expected base rate claims"].iloc[10])
+        plan = Plan(1, "boundary", claim, 0.2, claim + 3000)
+        self.assertAlmostEqual(self.engine.base_brf_for_plans([plan])[0],
+                               plan.calculate_base_brf(self.claims_prob), places=12)
+
+    def test_unsorted_input_and_chunking(self):
+        """Test shuffled bins and small chunks give the same result."""
+        shuffled = self.claims_prob.sample(frac=1, random_state=0)
+        engine = DistributionEngine.from_claims_probability(shuffled)
+        expected = self.engine.base_brf_for_plans(self.plans)
+        np.testing.assert_allclose(engine.base_brf_for_plans(self.plans, chunk_size=2), expected, rtol=1e-12)
+
+    def test_float32_mode(self):
+        """Test float32 mode halves memory and stays close to float64."""
+        engine32 = DistributionEngine.from_claims_probability(self.claims_prob, dtype=np.float32)
+        self.assertEqual(engine32.nbytes * 2, self.engine.nbytes)
+        np.testing.assert_allclose(engine32.base_brf_for_plans(self.plans),
+                                   self.engine.base_brf_for_plans(self.plans), rtol=1e-5)
+
+    def test_from_csv_matches_dataframe(self):
+        """Test building from the CSV applies the read_claims_probability() scaling."""
+        engine = DistributionEngine.from_csv('data_files/claims_probability_distribution.csv')
+        np.testing.assert_allclose(engine.base_brf_for_plans(self.plans),
+                                   self.engine.base_brf_for_plans(self.plans), rtol=1e-12)
+
+    def test_from_member_claims(self):
+        """Test an empirical member distribution matches the equivalent binned DataFrame."""
+        member_claims = np.array([0, 0, 250, 1200, 4000, 4000, 25000, 90000], dtype=float)
+        engine = DistributionEngine.from_member_claims(member_claims)
+
+        starting_point = member_claims.mean() / 12
+        df = pd.DataFrame({"annual frequency": 1 / len(member_claims),
+                           "expected base rate claims": member_claims * 506.43 / starting_point})
+        for plan, value in zip(self.plans, engine.base_brf_for_plans(self.plans)):
+            self.assertAlmostEqual(value, plan.calculate_base_brf(df), places=12)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from brf_calculation import calculate_group_brf
+from data_processing import read_plans_from_csv, read_claims_probability
+from distribution_registry import DistributionRegistry, calculate_group_brfs_by_distribution
+from rate_book import RateBook
+from constants import (
+    CLAIMS_PROBABILITY_DISTRIBUTION,
+    STARTING_POINT,
+    PCP_COPAY_DATA,
+    SPC_COPAY_DATA,
+    ER_COPAY_DATA,
+    COINSURANCE_THRESHOLD_DATA,
+    DEDUCTIBLE_THRESHOLD_DATA,
+    MOOP_THRESHOLD_DATA,
+    DISTRIBUTION_REGISTRY
+)
+
+
+class TestDistributionRegistry(unittest.TestCase):
+    """Test cases for the named claims distribution registry."""
+
+    def setUp(self):
+        """Create a temporary directory with two regional distributions."""
+        self.temp_dir = tempfile.mkdtemp()
+        shutil.copy('data_files/claims_probability_distribution.csv', os.path.join(self.temp_dir, 'north.csv'))
+
+        #a second region with a heavier tail
+        df = pd.read_csv('data_files/claims_probability_distribution.csv')
+        df.columns = df.columns.str.strip()
+        df['total annual claims'] = df['total annual claims'] ** 1.05
+        df.to_csv(os.path.join(self.temp_dir, 'south.csv'), index=False)
+
+        self.registry = DistributionRegistry()
+        self.registry.register_directory(self.temp_dir)
+        self.tables = (DEDUCTIBLE_THRESHOLD_DATA, COINSURANCE_THRESHOLD_DATA, MOOP_THRESHOLD_DATA,
+                       PCP_COPAY_DATA, SPC_COPAY_DATA, ER_COPAY_DATA)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_distributions_load_lazily(self):
+        """Test nothing is read until a distribution is used."""
+        self.assertEqual(self.registry.names(), ['north', 'south'])
+        self.assertFalse(self.registry.is_loaded('north'))
+        self.registry.get('north')
+        self.assertTrue(self.registry.is_loaded('north'))
+        self.assertFalse(self.registry.is_loaded('south'))
+
+    def test_cached_entry_is_reused(self):
+        """Test the same cached DataFrame and engine are returned on every call."""
+        self.assertIs(self.registry.get_distribution('north'), self.registry.get_distribution('north'))
+        self.assertIs(self.registry.get_engine('north'), self.registry.get_engine('north'))
+
+    def test_starting_point_per_distribution(self):
+        """Test each distribution gets its own starting point."""
+        self.assertAlmostEqual(self.registry.get_starting_point('north'), STARTING_POINT, places=10)
+        _, south_starting_point = read_claims_probability(os.path.join(self.temp_dir, 'south.csv'))
+        self.assertAlmostEqual(self.registry.get_starting_point('south'), south_starting_point, places=10)
+        self.assertNotAlmostEqual(south_starting_point, STARTING_POINT, places=3)
+
+    def test_unknown_distribution(self):
+        """Test an unregistered name raises KeyError."""
+        with self.assertRaises(KeyError):
+            self.registry.get('west')
+
+    def test_constants_default_distribution(self):
+        """Test constants.py seeds the registry with the default distribution."""
+        self.assertIs(DISTRIBUTION_REGISTRY.get_distribution(), CLAIMS_PROBABILITY_DISTRIBUTION)
+
+    def test_mixed_region_batch(self):
+        """Test a mixed-region batch matches pricing each group on its own distribution."""
+        groups = [
+            ('group_1', 'north', read_plans_from_csv('data_files/tests/test_1.csv')),
+            ('group_2', 'south', read_plans_from_csv('data_files/tests/test_2.csv')),
+            ('group_3', 'north', read_plans_from_csv('data_files/tests/test_3.csv'))
+        ]
+        results = calculate_group_brfs_by_distribution(groups, self.registry, *self.tables)
+
+        self.assertAlmostEqual(results['group_1'], 0.735, places=3)
+        self.assertAlmostEqual(results['group_3'], 0.757, places=3)
+        expected_south = calculate_group_brf(read_plans_from_csv('data_files/tests/test_2.csv'),
+                                             self.registry.get_distribution('south'), *self.tables)
+        self.assertAlmostEqual(results['group_2'], expected_south, places=12)
+        self.assertNotAlmostEqual(results['group_2'], 0.678, places=3)
+
+    def test_rate_book_tables(self):
+        """Test a RateBook in place of the six tables prices each group on the registry's distribution."""
+        groups = [
+            ('group_1', 'north', read_plans_from_csv('data_files/tests/test_1.csv')),
+            ('group_2', 'south', read_plans_from_csv('data_files/tests/test_2.csv'))
+        ]
+        expected = calculate_group_brfs_by_distribution(groups, self.registry, *self.tables)
+        results = calculate_group_brfs_by_distribution(groups, self.registry, RateBook.from_constants())
+        self.assertEqual(results, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+from equivalence_harness import (generate_plan_designs, generate_out_of_band_designs, generate_census,
+                                 check_out_of_band, run_equivalence)
+from batch_pricing import calculate_indices_array, MISSING_INDEX
+from constants import (
+    CLAIMS_PROBABILITY_DISTRIBUTION,
+    PCP_COPAY_DATA,
+    SPC_COPAY_DATA,
+    ER_COPAY_DATA,
+    COINSURANCE_THRESHOLD_DATA,
+    DEDUCTIBLE_THRESHOLD_DATA,
+    MOOP_THRESHOLD_DATA
+)
+
+
+class TestEquivalenceHarness(unittest.TestCase):
+    """Test cases for the randomized engine equivalence harness."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.tables = (CLAIMS_PROBABILITY_DISTRIBUTION, DEDUCTIBLE_THRESHOLD_DATA, COINSURANCE_THRESHOLD_DATA,
+                       MOOP_THRESHOLD_DATA, PCP_COPAY_DATA, SPC_COPAY_DATA, ER_COPAY_DATA)
+
+    def test_designs_cover_edge_cases(self):
+        """Test generated designs are in band and include the edge cases."""
+        designs = generate_plan_designs(5000, *self.tables, seed=0)
+        for column, data in (('deductible', DEDUCTIBLE_THRESHOLD_DATA), ('coinsurance', COINSURANCE_THRESHOLD_DATA),
+                             ('moop', MOOP_THRESHOLD_DATA)):
+            self.assertFalse((calculate_indices_array(designs[column], data) == MISSING_INDEX).any())
+
+        lows = [low for low, _ in DEDUCTIBLE_THRESHOLD_DATA.values()]
+        self.assertTrue(designs['deductible'].isin(lows).any())
+        self.assertTrue((designs['coinsurance'] == 0).any())
+        self.assertTrue((designs['moop'] == designs['deductible']).any())
+        self.assertTrue(designs['pcp'].isna().any())
+        self.assertFalse(designs['pcp'].dropna().isin(list(PCP_COPAY_DATA[111])).all())
+
+    def test_out_of_band_designs_agree(self):
+        """Test every engine agrees on out-of-band designs: the same value without copays, a ValueError with them."""
+        designs = generate_out_of_band_designs(60, *self.tables, seed=4)
+        in_band = ((calculate_indices_array(designs['deductible'], DEDUCTIBLE_THRESHOLD_DATA) != MISSING_INDEX) &
+                   (calculate_indices_array(designs['coinsurance'], COINSURANCE_THRESHOLD_DATA) != MISSING_INDEX) &
+                   (calculate_indices_array(designs['moop'], MOOP_THRESHOLD_DATA) != MISSING_INDEX))
+        self.assertFalse(in_band.any())
+
+        report = check_out_of_band(designs, self.tables)
+        self.assertTrue(report['passed'], msg=str(report['disagreements'][:3]))
+        self.assertGreater(report['n_raised'], 0)
+        self.assertLess(report['n_raised'], len(designs))
+
+    def test_census_has_enrollment_per_group(self):
+        """Test every generated group has some enrollment."""
+        census = generate_census(generate_plan_designs(100, *self.tables, seed=0), 30, seed=1)
+        totals = census[['ee', 'es', 'ec', 'ef']].sum(axis=1).groupby(census['group_id']).sum()
+        self.assertEqual(len(totals), 30)
+        self.assertTrue((totals > 0).all())
+
+    def test_engines_are_equivalent(self):
+        """Test a small randomized run passes and reports throughput for every engine."""
+        report = run_equivalence(20000, self.tables, reference_sample=200, n_census_files=5, seed=3)
+        self.assertTrue(report['passed'], msg=str(report))
+        for name in ('reference', 'direct', 'vectorized'):
+            self.assertGreater(report['engines'][name]['plans_per_second'], 0)
+        self.assertLess(report['engines']['vectorized']['vs_reference']['worst_abs_diff'], 1e-9)
+        self.assertTrue(report['out_of_band']['passed'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import glob
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+import excel_ingest
+from batch_job import run_batch_job
+from columnar_ingest import read_plan_columns
+from data_processing import hash_file, load_reference_tables, read_plans_from_csv
+from excel_ingest import (build_plan_columns, extract_workbook_values, extract_workbook_values_cached,
+                          extract_workbooks, read_census_plans, read_plans_from_workbook, write_census_csv)
+
+try:
+    import openpyxl
+    HAS_OPENPYXL = True
+except ImportError:
+    HAS_OPENPYXL = False
+
+WORKBOOKS = sorted(glob.glob('data_files/excel_models/*.xlsm'))
+
+
+def census_csv(workbook):
+    """Returns the hand-exported test CSV of a workbook."""
+    return f'data_files/tests/test_{os.path.splitext(workbook)[0][-1]}.csv'
+
+
+def write_inputs_workbook(file_path, plan_values):
+    """Write a minimal workbook with an Inputs sheet laid out like the Excel models (labels in H, plans from I)."""
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = 'Inputs'
+    labels = ['Current Plan Name', 'Deductible', 'Coinsurance', 'Maximum-Out-of-Pocket', 'PCP Copay', 'SPC Copay',
+              'ER Copay', 'Current Enrollment', 'Employee Only', 'Employee & Spouse', 'Employee & Child(ren)',
+              'Employee & Family', 'Plan Count']
+    for row, label in enumerate(labels, start=1):
+        sheet.cell(row=row, column=8, value=label)
+        for column, values in enumerate(plan_values, start=9):
+            sheet.cell(row=row, column=column, value=values.get(label))
+    workbook.save(file_path)
+
+
+@unittest.skipUnless(HAS_OPENPYXL, "openpyxl is required to read Excel models")
+class TestExcelIngest(unittest.TestCase):
+    """Test cases for census ingest from Excel models."""
+
+    def setUp(self):
+        """Create a temporary cache directory."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.temp_dir, 'cache')
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_plans_match_csv_reader(self):
+        """Test the plans read from each workbook match read_plans_from_csv on its hand-exported CSV."""
+        for workbook in WORKBOOKS:
+            plans = read_plans_from_workbook(workbook, self.cache_dir)
+            expected_plans = read_plans_from_csv(census_csv(workbook))
+            self.assertEqual(len(plans), len(expected_plans))
+            for plan, expected in zip(plans, expected_plans):
+                for field in ('plan_id', 'deductible', 'coinsurance', 'moop', 'pcp_copay', 'spc_copay', 'er_copay',
+                              'ee_enrollment', 'spouse_enrollment', 'children_enrollment', 'family_enrollment'):
+                    self.assertEqual(getattr(plan, field), getattr(expected, field), msg=f"{workbook} {field}")
+
+    def test_names_from_workbook(self):
+        """Test plan names come from the workbook and the unfilled group name placeholder is None."""
+        extracted = extract_workbook_values('data_files/excel_models/Bath_&_Tennis_Club_test1.xlsm')
+        self.assertEqual([plan['plan_name'] for plan in extracted['plans']],
+                         ['$1500PPO', '$2500PPO', '$1700PPO', '$2500PPO'])
+        self.assertIsNone(extracted['group_name'])
+
+    def test_columns_match_columnar_reader(self):
+        """Test the workbook census columns match columnar_ingest.read_plan_columns on the CSV."""
+        for workbook in WORKBOOKS:
+            columns = build_plan_columns(extract_workbook_values_cached(workbook, self.cache_dir))
+            expected = read_plan_columns(census_csv(workbook))
+            for column in ('deductible', 'coinsurance', 'moop', 'pcp', 'spc', 'er', 'total_enrollment'):
+                np.testing.assert_array_equal(columns[column], expected[column], err_msg=f"{workbook} {column}")
+
+    def test_census_csv_export(self):
+        """Test an exported census CSV reads back like the hand-exported test CSV."""
+        for workbook in WORKBOOKS:
+            path = os.path.join(self.temp_dir, 'census.csv')
+            write_census_csv(extract_workbook_values(workbook), path)
+            exported = read_plan_columns(path)
+            expected = read_plan_columns(census_csv(workbook))
+            for column in ('deductible', 'coinsurance', 'moop', 'pcp', 'spc', 'er', 'ee', 'es', 'ec', 'ef'):
+                np.testing.assert_array_equal(exported[column], expected[column], err_msg=f"{workbook} {column}")
+
+    def test_cache_skips_parsing(self):
+        """Test a cached workbook is not parsed again, and an older cache format is parsed again."""
+        workbook = WORKBOOKS[0]
+        first = read_plans_from_workbook(workbook, self.cache_dir)
+        cache_path = os.path.join(self.cache_dir, f"{hash_file(workbook)}.json")
+        self.assertTrue(os.path.exists(cache_path))
+
+        with mock.patch.object(excel_ingest, 'extract_workbook_values', side_effect=AssertionError("parsed")):
+            again = read_plans_from_workbook(workbook, self.cache_dir)
+            self.assertEqual(len(extract_workbooks(WORKBOOKS[:1], self.cache_dir)), 1)
+        self.assertEqual([plan.deductible for plan in again], [plan.deductible for plan in first])
+
+        with open(cache_path, 'r') as f:
+            values = json.load(f)
+        values['format_version'] = 1
+        with open(cache_path, 'w') as f:
+            json.dump(values, f)
+        with mock.patch.object(excel_ingest, 'extract_workbook_values',
+                               wraps=excel_ingest.extract_workbook_values) as extract:
+            read_plans_from_workbook(workbook, self.cache_dir)
+            self.assertEqual(extract.call_count, 1)
+
+    def test_parallel_extraction_keeps_order(self):
+        """Test parallel extraction returns the workbooks in order and fills the cache."""
+        #one workbook is already cached, the others are parsed in worker processes
+        extract_workbook_values_cached(WORKBOOKS[1], self.cache_dir)
+        extracted = extract_workbooks(WORKBOOKS, self.cache_dir, max_workers=2)
+        self.assertEqual([values['workbook'] for values in extracted], [os.path.basename(path) for path in WORKBOOKS])
+        self.assertEqual(len(os.listdir(self.cache_dir)), len(WORKBOOKS))
+        self.assertEqual(extracted, extract_workbooks(WORKBOOKS, self.cache_dir))
+
+    def test_text_cells(self):
+        """Test numeric text is parsed, blanks default like the CSV reader and other text raises a ValueError."""
+        plan = {'Current Plan Name': 'PPO', 'Deductible': '1500', 'Coinsurance': 0.2, 'Maximum-Out-of-Pocket': 4500,
+                'PCP Copay': ' ', 'Employee Only': 3, 'Plan Count': 1}
+        path = os.path.join(self.temp_dir, 'census.xlsx')
+        write_inputs_workbook(path, [plan])
+        plans = read_plans_from_workbook(path, None)
+        self.assertEqual((plans[0].deductible, plans[0].pcp_copay, plans[0].spouse_enrollment), (1500.0, None, 0))
+
+        for label, value in (('Deductible', '#N/A'), ('Coinsurance', '20%'), ('Employee & Family', '$1,500')):
+            write_inputs_workbook(path, [plan, dict(plan, **{label: value})])
+            with self.assertRaises(ValueError) as context:
+                read_plans_from_workbook(path, None)
+            message = str(context.exception)
+            for part in ('census.xlsx', f"'{label}' row", 'plan 2 (column J)', repr(value)):
+                self.assertIn(part, message)
+
+    def test_batch_job_prices_workbooks(self):
+        """Test a batch job prices an Excel model like its hand-exported CSV."""
+        workbook = os.path.join(self.temp_dir, 'group_1.xlsm')
+        shutil.copyfile(WORKBOOKS[0], workbook)
+        census = os.path.join(self.temp_dir, 'group_1_csv.csv')
+        shutil.copyfile(census_csv(WORKBOOKS[0]), census)
+        self.assertEqual(len(read_census_plans(workbook, self.cache_dir)), len(read_census_plans(census)))
+
+        report = run_batch_job([workbook, census], os.path.join(self.temp_dir, 'journal.jsonl'),
+                               tables=load_reference_tables('data_files'), fsync=False)
+        self.assertEqual(report['failed'], {})
+        self.assertAlmostEqual(report['results']['group_1'], report['results']['group_1_csv'], places=12)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+import unittest
+import glob
+from data_processing import read_plans_from_csv, hash_file
+from excel_regression import extract_workbook_values, extract_workbook_values_cached, build_plans, run_regression, ENGINES
+
+try:
+    import openpyxl
+    HAS_OPENPYXL = True
+except ImportError:
+    HAS_OPENPYXL = False
+
+WORKBOOKS = sorted(glob.glob('data_files/excel_models/*.xlsm'))
+
+
+@unittest.skipUnless(HAS_OPENPYXL, "openpyxl is required to read the Excel models")
+class TestExcelRegression(unittest.TestCase):
+    """Test cases for the Excel model regression harness."""
+
+    def setUp(self):
+        """Create a temporary cache directory."""
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the temporary cache directory."""
+        shutil.rmtree(self.cache_dir)
+
+    def test_extracted_census_matches_test_csv(self):
+        """Test the census read from each workbook matches the hand-exported test CSV."""
+        for workbook in WORKBOOKS:
+            test_number = os.path.splitext(workbook)[0][-1]
+            expected_plans = read_plans_from_csv(f'data_files/tests/test_{test_number}.csv')
+            plans = build_plans(extract_workbook_values(workbook))
+
+            self.assertEqual(len(plans), len(expected_plans))
+            for plan, expected in zip(plans, expected_plans):
+                self.assertEqual((plan.deductible, plan.coinsurance, plan.moop),
+                                 (expected.deductible, expected.coinsurance, expected.moop))
+                self.assertEqual((plan.pcp_copay, plan.spc_copay, plan.er_copay),
+                                 (expected.pcp_copay, expected.spc_copay, expected.er_copay))
+                self.assertEqual(plan.total_enrollment, expected.total_enrollment)
+
+    def test_expected_group_brf(self):
+        """Test the composite relativity is extracted (Test.py expects 0.735 for test 1)."""
+        extracted = extract_workbook_values('data_files/excel_models/Bath_&_Tennis_Club_test1.xlsm')
+        self.assertAlmostEqual(extracted['expected_group_brf'], 0.735, places=3)
+        self.assertEqual(len(extracted['plans']), 4)
+
+    def test_extraction_is_cached_by_hash(self):
+        """Test a cache file keyed by the workbook hash is written and reused."""
+        workbook = WORKBOOKS[0]
+        first = extract_workbook_values_cached(workbook, self.cache_dir)
+        cache_path = os.path.join(self.cache_dir, f"{hash_file(workbook)}.json")
+        self.assertTrue(os.path.exists(cache_path))
+        self.assertEqual(extract_workbook_values_cached(workbook, self.cache_dir), first)
+
+    def test_all_engines_match_workbooks(self):
+        """Test every engine matches every workbook's plan and group values."""
+        results = run_regression(WORKBOOKS, cache_dir=self.cache_dir, max_workers=2)
+        self.assertEqual(len(results), len(WORKBOOKS) * len(ENGINES))
+        for result in results:
+            self.assertTrue(result['passed'], msg=str(result))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import numpy as np
+from equivalence_harness import generate_plan_designs
+from distribution_engine import DistributionEngine
+from batch_pricing import price_plan_columns, calculate_indices_array, MISSING_INDEX
+from numba_kernels import price_indices_and_base_brf, price_plan_columns_numba, threshold_arrays
+from constants import (
+    CLAIMS_PROBABILITY_DISTRIBUTION,
+    PCP_COPAY_DATA,
+    SPC_COPAY_DATA,
+    ER_COPAY_DATA,
+    COINSURANCE_THRESHOLD_DATA,
+    DEDUCTIBLE_THRESHOLD_DATA,
+    MOOP_THRESHOLD_DATA
+)
+
+
+class TestNumbaKernels(unittest.TestCase):
+    """Test cases for the fused pricing kernel (compiled if numba is installed, plain Python otherwise)."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.tables = (CLAIMS_PROBABILITY_DISTRIBUTION, DEDUCTIBLE_THRESHOLD_DATA, COINSURANCE_THRESHOLD_DATA,
+                       MOOP_THRESHOLD_DATA, PCP_COPAY_DATA, SPC_COPAY_DATA, ER_COPAY_DATA)
+        self.engine = DistributionEngine.from_claims_probability(CLAIMS_PROBABILITY_DISTRIBUTION)
+        self.designs = generate_plan_designs(500, *self.tables, seed=3)
+
+    def test_threshold_arrays(self):
+        """Test threshold dictionaries keep their table order."""
+        lows, highs, indices = threshold_arrays({3: (0, 10), 1: (10, 20)})
+        self.assertEqual(lows.tolist(), [0.0, 10.0])
+        self.assertEqual(highs.tolist(), [10.0, 20.0])
+        self.assertEqual(indices.tolist(), [3, 1])
+
+    def test_kernel_matches_vectorized(self):
+        """Test the fused kernel gives the same indices and base BRF as the vectorized engine."""
+        deductible_index, moop_index, coinsurance_index, base_brf = price_indices_and_base_brf(
+            self.engine, self.designs['deductible'], self.designs['coinsurance'], self.designs['moop'],
+            DEDUCTIBLE_THRESHOLD_DATA, COINSURANCE_THRESHOLD_DATA, MOOP_THRESHOLD_DATA)
+
+        np.testing.assert_array_equal(deductible_index,
+                                      calculate_indices_array(self.designs['deductible'], DEDUCTIBLE_THRESHOLD_DATA))
+        np.testing.assert_array_equal(moop_index, calculate_indices_array(self.designs['moop'], MOOP_THRESHOLD_DATA))
+        np.testing.assert_array_equal(coinsurance_index,
+                                      calculate_indices_array(self.designs['coinsurance'], COINSURANCE_THRESHOLD_DATA))
+        expected = self.engine.base_brf(self.designs['deductible'], self.designs['coinsurance'], self.designs['moop'])
+        np.testing.assert_allclose(base_brf, expected, rtol=0, atol=1e-12)
+
+    def test_out_of_band_value(self):
+        """Test a value outside every band gives MISSING_INDEX."""
+        deductible_index, _, _, _ = price_indices_and_base_brf(
+            self.engine, [-5.0], [0.2], [1000.0],
+            DEDUCTIBLE_THRESHOLD_DATA, COINSURANCE_THRESHOLD_DATA, MOOP_THRESHOLD_DATA)
+        self.assertEqual(deductible_index[0], MISSING_INDEX)
+
+    def test_price_plan_columns_numba(self):
+        """Test the numba pricing entry point matches batch pricing (or falls back to it)."""
+        expected = price_plan_columns(self.designs, *self.tables, engine=self.engine)
+        actual = price_plan_columns_numba(self.designs, *self.tables, engine=self.engine)
+        for column in ('base_plan_index', 'copay_brf'):
+            np.testing.assert_array_equal(actual[column], expected[column])
+        np.testing.assert_allclose(actual['plan_brf'], expected['plan_brf'], rtol=0, atol=1e-12)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,7 @@
 import unittest
+from unittest import mock
 from Plan import Plan
+from rate_book import RateBook
 from constants import (
     CLAIMS_PROBABILITY_DISTRIBUTION,
     PCP_COPAY_DATA,
@@ -642,6 +644,76 @@ class TestPlan(unittest.TestCase):
         self.assertAlmostEqual(plan3.plan_brf, plan3.base_brf, places=10)
         self.assertAlmostEqual(plan4.plan_brf, plan4.base_brf, places=10)
 
+    #test lazy derived values
+    def test_lazy_values_with_rate_book(self):
+        """Test a plan bound to a RateBook computes its indices and BRFs on first access."""
+        from data_processing import read_plans_from_csv
+
+        rate_book = RateBook(self.claims_prob, self.deductible_data, self.coinsurance_data, self.moop_data,
+                             self.pcp_copay, self.spc_copay, self.er_copay)
+        for plan in read_plans_from_csv('data_files/tests/test_1.csv'):
+            expected = plan.calculate_plan_brf(self.claims_prob, self.deductible_data, self.coinsurance_data,
+                                               self.moop_data, self.pcp_copay, self.spc_copay, self.er_copay)
+            expected_index = plan.get_base_plan_index()
+            plan.bind(rate_book)
+            self.assertAlmostEqual(plan.plan_brf, expected, places=12)
+            self.assertEqual(plan.get_base_plan_index(), expected_index)
+            self.assertAlmostEqual(plan.calculate_plan_brf(), expected, places=12)
+
+    def test_targeted_invalidation(self):
+        """Test an edit recomputes only the stages it affects."""
+        from data_processing import read_plans_from_csv
+
+        rate_book = RateBook(self.claims_prob, self.deductible_data, self.coinsurance_data, self.moop_data,
+                             self.pcp_copay, self.spc_copay, self.er_copay)
+        plan = read_plans_from_csv('data_files/tests/test_1.csv')[0]
+        plan.bind(rate_book)
+        plan.plan_brf
+        base_brf = mock.patch.object(plan, '_compute_base_brf', wraps=plan._compute_base_brf)
+        copay_brf = mock.patch.object(plan, '_compute_copay_brf', wraps=plan._compute_copay_brf)
+        with base_brf as base_calls, copay_brf as copay_calls:
+            #a copay edit redoes the copay BRF only
+            plan.pcp_copay = 10 if plan.pcp_copay != 10 else 20
+            plan.plan_brf
+            self.assertEqual((base_calls.call_count, copay_calls.call_count), (0, 1))
+
+            #an enrollment edit redoes no BRF
+            plan.update_enrollment(ee_enrollment=plan.ee_enrollment + 5)
+            plan.plan_brf
+            self.assertEqual((base_calls.call_count, copay_calls.call_count), (0, 1))
+
+            #setting the same value again keeps everything
+            plan.deductible = plan.deductible
+            plan.plan_brf
+            self.assertEqual((base_calls.call_count, copay_calls.call_count), (0, 1))
+
+            #a deductible edit redoes the base BRF, and the copay BRF through the base plan index
+            plan.deductible = plan.deductible + 250
+            plan.plan_brf
+            self.assertEqual((base_calls.call_count, copay_calls.call_count), (1, 2))
+
+        expected = Plan('1', 'Plan 1', plan.deductible, plan.coinsurance, plan.moop, plan.pcp_copay,
+                        plan.spc_copay, plan.er_copay)
+        self.assertAlmostEqual(plan.plan_brf, expected.calculate_plan_brf(rate_book), places=12)
+
+    def test_edit_clears_stale_values_without_rate_book(self):
+        """Test an edit clears the BRFs calculated from the old value when no RateBook is bound."""
+        plan = Plan('1', 'Plan 1', 1000, 0.2, 5000, pcp_copay=25, ee_enrollment=3)
+        plan.calculate_plan_brf(self.claims_prob, self.deductible_data, self.coinsurance_data, self.moop_data,
+                                self.pcp_copay, self.spc_copay, self.er_copay)
+        plan.spc_copay = 50
+        self.assertIsNotNone(plan.base_brf)
+        self.assertIsNone(plan.copay_brf)
+        self.assertIsNone(plan.plan_brf)
+        plan.moop = 6000
+        self.assertIsNone(plan.base_brf)
+        self.assertIsNone(plan.moop_index)
+        self.assertIsNotNone(plan.deductible_index)
+        plan.update_enrollment(spouse_enrollment=2)
+        self.assertEqual(plan.total_enrollment, 5)
+        with self.assertRaises(ValueError):
+            plan.calculate_plan_brf()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,88 @@
+import threading
+import unittest
+from brf_calculation import calculate_group_brf
+from data_processing import read_plans_from_csv
+from pure_pricing import compile_pricing_tables, price_plan, price_group, price_groups_threaded
+from rate_book import RateBook
+from constants import (
+    CLAIMS_PROBABILITY_DISTRIBUTION,
+    PCP_COPAY_DATA,
+    SPC_COPAY_DATA,
+    ER_COPAY_DATA,
+    COINSURANCE_THRESHOLD_DATA,
+    DEDUCTIBLE_THRESHOLD_DATA,
+    MOOP_THRESHOLD_DATA
+)
+
+
+class TestPurePricing(unittest.TestCase):
+    """Test cases for the reentrant, side-effect free pricing path."""
+
+    def setUp(self):
+        """Compile the tables and read the three test groups."""
+        self.tables = (CLAIMS_PROBABILITY_DISTRIBUTION, DEDUCTIBLE_THRESHOLD_DATA, COINSURANCE_THRESHOLD_DATA,
+                       MOOP_THRESHOLD_DATA, PCP_COPAY_DATA, SPC_COPAY_DATA, ER_COPAY_DATA)
+        self.pricing_tables = compile_pricing_tables(*self.tables)
+        self.groups = {f"group_{test_number}": read_plans_from_csv(f'data_files/tests/test_{test_number}.csv')
+                       for test_number in (1, 2, 3)}
+
+    def test_matches_reference_without_side_effects(self):
+        """Test the pure path gives the reference results and leaves the plans untouched."""
+        for group_id, plans in self.groups.items():
+            group_price = price_group(plans, self.pricing_tables, group_id)
+            self.assertIsNone(plans[0].plan_brf)
+            self.assertIsNone(plans[0].deductible_index)
+            self.assertAlmostEqual(group_price.group_brf, calculate_group_brf(plans, *self.tables), places=12)
+            for plan, plan_price in zip(plans, group_price.plans):
+                self.assertEqual(plan_price.base_plan_index, plan.get_base_plan_index())
+                self.assertAlmostEqual(plan_price.plan_brf, plan.plan_brf, places=12)
+
+    def test_results_are_immutable(self):
+        """Test results and shared tables cannot be modified."""
+        plan_price = price_plan(self.groups['group_1'][0], self.pricing_tables)
+        with self.assertRaises(AttributeError):
+            plan_price.plan_brf = 1.0
+        with self.assertRaises(ValueError):
+            self.pricing_tables.compiled_copays[0].values[0, 0] = 2.0
+
+    def test_thread_pool(self):
+        """Test the thread pool gives the same results as pricing one group at a time."""
+        expected = {group_id: price_group(plans, self.pricing_tables, group_id).group_brf
+                    for group_id, plans in self.groups.items()}
+        results = price_groups_threaded(self.groups, self.pricing_tables, max_workers=4)
+        self.assertEqual(list(results), list(self.groups))
+        for group_id, group_price in results.items():
+            self.assertEqual(group_price.group_brf, expected[group_id])
+
+    def test_accepts_rate_book_and_tables(self):
+        """Test a RateBook and the seven table arguments price every group like compile_pricing_tables."""
+        self.assertIsInstance(self.pricing_tables, RateBook)
+        rate_book = RateBook.from_constants()
+        expected = price_groups_threaded(self.groups, self.pricing_tables)
+        for tables in (rate_book, self.tables):
+            results = price_groups_threaded(self.groups, tables, max_workers=2)
+            for group_id, plans in self.groups.items():
+                self.assertEqual(results[group_id], expected[group_id])
+                self.assertEqual(price_group(plans, tables, group_id), expected[group_id])
+
+    def test_same_plans_from_many_threads(self):
+        """Test many threads pricing the same Plan objects at once all get the same answer."""
+        plans = self.groups['group_2']
+        expected = price_group(plans, self.pricing_tables).group_brf
+        results = []
+
+        def price_repeatedly():
+            for _ in range(20):
+                results.append(price_group(plans, self.pricing_tables).group_brf)
+
+        threads = [threading.Thread(target=price_repeatedly) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 160)
+        self.assertTrue(all(result == expected for result in results))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+from datetime import date
+from brf_calculation import calculate_group_brf
+from data_processing import read_plans_from_csv, reference_tables_hash
+from quote_store import QuoteStore, design_key, plan_design
+from rate_book import RateBook
+from constants import (
+    CLAIMS_PROBABILITY_DISTRIBUTION,
+    PCP_COPAY_DATA,
+    SPC_COPAY_DATA,
+    ER_COPAY_DATA,
+    COINSURANCE_THRESHOLD_DATA,
+    DEDUCTIBLE_THRESHOLD_DATA,
+    MOOP_THRESHOLD_DATA
+)
+
+
+class TestQuoteStore(unittest.TestCase):
+    """Test cases for the SQLite quote history store."""
+
+    def setUp(self):
+        """Create an in-memory store holding the three test groups."""
+        self.tables = (CLAIMS_PROBABILITY_DISTRIBUTION, DEDUCTIBLE_THRESHOLD_DATA, COINSURANCE_THRESHOLD_DATA,
+                       MOOP_THRESHOLD_DATA, PCP_COPAY_DATA, SPC_COPAY_DATA, ER_COPAY_DATA)
+        self.tables_hash = reference_tables_hash('data_files')
+        self.store = QuoteStore(':memory:', batch_size=2)
+
+        quotes = []
+        for test_number, quote_date in ((1, date(2026, 1, 1)), (2, date(2026, 2, 1)), (3, date(2026, 3, 1))):
+            plans = read_plans_from_csv(f'data_files/tests/test_{test_number}.csv')
+            quotes.append((f"group_{test_number}", plans, calculate_group_brf(plans, *self.tables), 'v1', quote_date,
+                           self.tables_hash))
+        self.quote_ids = self.store.save_groups(quotes)
+
+    def tearDown(self):
+        """Close the store."""
+        self.store.close()
+
+    def test_find_by_group(self):
+        """Test quotes are found by group id, newest first."""
+        plans = read_plans_from_csv('data_files/tests/test_1.csv')
+        self.store.save_group('group_1', plans, calculate_group_brf(plans, *self.tables), 'v2', date(2026, 6, 1))
+        quotes = self.store.find_quotes_by_group('group_1')
+        self.assertEqual([quote['table_version'] for quote in quotes], ['v2', 'v1'])
+        self.assertAlmostEqual(quotes[1]['group_brf'], 0.735, places=3)
+        self.assertEqual(quotes[1]['total_enrollment'], 77)
+
+    def test_find_by_date(self):
+        """Test quotes are found by a date range."""
+        quotes = self.store.find_quotes_by_date('2026-01-15', date(2026, 3, 1))
+        self.assertEqual([quote['group_id'] for quote in quotes], ['group_2', 'group_3'])
+        self.assertEqual(len(self.store.get_quote_plans(quotes[0]['quote_id'])), 4)
+
+    def test_find_by_design(self):
+        """Test plans are found by design tuple, and missing copays match None, NaN and 0."""
+        self.assertEqual(len(self.store.find_plans_by_design((1500, 0.2, 4500, 30, 55, 250))), 1)
+        self.assertEqual(len(self.store.find_plans_by_design((1700.0, 0.2, 5100, None, 0, float('nan')), 'v1')), 1)
+        self.assertEqual(len(self.store.find_plans_by_design((1500, 0.2, 4500, 30, 55, 250), 'v2')), 0)
+
+    def test_design_key(self):
+        """Test int and float designs give the same key."""
+        self.assertEqual(design_key((1500, 0.2, 4500, 30, None, 0)), design_key((1500.0, 0.2, 4500.0, 30.0, 0, None)))
+
+    def test_reuse_stored_result(self):
+        """Test a stored design on tables with the same content hash is reused, and other tables are recomputed."""
+        plans = read_plans_from_csv('data_files/tests/test_1.csv')
+        stored = self.store.lookup_design(plan_design(plans[0]), self.tables_hash)
+        self.assertIsNotNone(stored)
+        self.assertIsNone(self.store.lookup_design(plan_design(plans[0]), '0' * 64))
+
+        #an empty distribution would price every plan at 0, so a reused result proves nothing was recomputed
+        empty = CLAIMS_PROBABILITY_DISTRIBUTION.iloc[0:0]
+        group_brf = self.store.calculate_group_brf(plans, self.tables_hash, empty, *self.tables[1:])
+        self.assertAlmostEqual(group_brf, 0.735, places=3)
+        self.assertEqual(plans[0].get_base_plan_index(), 212)
+
+    def test_rate_book_tables(self):
+        """Test a RateBook in place of the seven tables prices designs that are not stored yet."""
+        plans = read_plans_from_csv('data_files/tests/test_2.csv')
+        group_brf = self.store.calculate_group_brf(plans, '0' * 64, RateBook(*self.tables))
+        self.assertAlmostEqual(group_brf, calculate_group_brf(read_plans_from_csv('data_files/tests/test_2.csv'),
+                                                              *self.tables), places=12)
+
+    def test_same_version_label_different_tables(self):
+        """Test plans saved under the same version label but without a matching content hash are not reused."""
+        plans = read_plans_from_csv('data_files/tests/test_1.csv')
+        self.store.save_group('group_edited', plans, calculate_group_brf(plans, *self.tables), 'v1', date(2026, 6, 1),
+                              tables_hash='edited')
+        self.assertEqual(self.store.find_quotes_by_group('group_edited')[0]['tables_hash'], 'edited')
+        self.assertIsNone(self.store.lookup_design(plan_design(plans[0]), 'v1'))
+
+        legacy = QuoteStore(':memory:')
+        legacy.save_group('group_legacy', plans, 0.7, 'v1')
+        self.assertIsNone(legacy.lookup_design(plan_design(plans[0]), None))
+        legacy.close()
+
+    def test_unpriced_plan_rejected(self):
+        """Test saving a plan that was never priced raises a ValueError."""
+        plans = read_plans_from_csv('data_files/tests/test_1.csv')
+        with self.assertRaises(ValueError):
+            self.store.save_group('group_x', plans, 0.7, 'v1')
+        self.assertEqual(self.store.find_quotes_by_group('group_x'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
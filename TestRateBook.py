@@ -0,0 +1,87 @@
+import pickle
+import unittest
+import numpy as np
+from batch_pricing import calculate_group_brf_batch, calculate_indices_array, plans_to_columns, price_plan_columns
+from brf_calculation import calculate_group_brf
+from data_processing import read_plans_from_csv
+from equivalence_harness import generate_plan_designs
+from numba_kernels import price_plan_columns_numba
+from rate_book import CompiledThresholds, RateBook, as_rate_book
+from constants import (
+    CLAIMS_PROBABILITY_DISTRIBUTION,
+    PCP_COPAY_DATA,
+    SPC_COPAY_DATA,
+    ER_COPAY_DATA,
+    COINSURANCE_THRESHOLD_DATA,
+    DEDUCTIBLE_THRESHOLD_DATA,
+    MOOP_THRESHOLD_DATA
+)
+
+
+class TestRateBook(unittest.TestCase):
+    """Test cases for the compiled RateBook."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.tables = (CLAIMS_PROBABILITY_DISTRIBUTION, DEDUCTIBLE_THRESHOLD_DATA, COINSURANCE_THRESHOLD_DATA,
+                       MOOP_THRESHOLD_DATA, PCP_COPAY_DATA, SPC_COPAY_DATA, ER_COPAY_DATA)
+        self.rate_book = RateBook.from_constants()
+
+    def test_compiled_thresholds(self):
+        """Test band edge lookup against calculate_indices_array, including overlapping bands and misses."""
+        overlapping = {1: (0, 100), 2: (50, 200), 3: (150, 175), 4: (300, 400)}
+        values = np.array([-1, 0, 49.9, 50, 99.99, 100, 150, 174, 175, 199, 200, 250, 300, 399, 400, np.nan, np.inf])
+        np.testing.assert_array_equal(CompiledThresholds(overlapping).lookup(values),
+                                      calculate_indices_array(values, overlapping))
+        for threshold_data in (DEDUCTIBLE_THRESHOLD_DATA, COINSURANCE_THRESHOLD_DATA, MOOP_THRESHOLD_DATA):
+            edges = np.array([edge for band in threshold_data.values() for edge in band], dtype=float)
+            values = np.concatenate((edges, edges - 1e-9, edges + 1e-9, [-1, 1e9]))
+            np.testing.assert_array_equal(CompiledThresholds(threshold_data).lookup(values),
+                                          calculate_indices_array(values, threshold_data))
+
+    def test_price_plan_columns_matches_tables(self):
+        """Test pricing on a RateBook gives the same results as the seven table arguments."""
+        designs = generate_plan_designs(2000, *self.tables, seed=46)
+        expected = price_plan_columns(designs, *self.tables)
+        for results in (price_plan_columns(designs, self.rate_book), self.rate_book.price_plan_columns(designs),
+                        price_plan_columns_numba(designs, self.rate_book)):
+            np.testing.assert_array_equal(results['base_plan_index'], expected['base_plan_index'])
+            np.testing.assert_allclose(results['plan_brf'], expected['plan_brf'], rtol=0, atol=1e-12)
+
+    def test_old_signatures_accept_rate_book(self):
+        """Test Plan.calculate_plan_brf and the group functions take a RateBook in place of the seven tables."""
+        expected = calculate_group_brf(read_plans_from_csv('data_files/tests/test_2.csv'), *self.tables)
+        plans = read_plans_from_csv('data_files/tests/test_2.csv')
+        self.assertAlmostEqual(calculate_group_brf(plans, self.rate_book), expected, places=12)
+        self.assertIsNotNone(plans[0].plan_brf)
+        self.assertAlmostEqual(calculate_group_brf_batch(plans, self.rate_book), expected, places=12)
+        self.assertAlmostEqual(self.rate_book.calculate_group_brf(plans), expected, places=12)
+        self.assertAlmostEqual(plans[0].calculate_plan_brf(self.rate_book), plans[0].plan_brf, places=12)
+        self.assertIs(as_rate_book(self.rate_book), self.rate_book)
+        self.assertAlmostEqual(as_rate_book(self.tables).calculate_group_brf(plans), expected, places=12)
+
+    def test_immutable(self):
+        """Test a RateBook, its arrays and its tables cannot be modified."""
+        with self.assertRaises(AttributeError):
+            self.rate_book.engine = None
+        with self.assertRaises(ValueError):
+            self.rate_book.base_plan_index[0, 0, 0] = 0
+        with self.assertRaises(ValueError):
+            self.rate_book.compiled_copays[0].values[0, 0] = 2.0
+        with self.assertRaises(TypeError):
+            self.rate_book.deductible_threshold_data[1] = (0, 1)
+        with self.assertRaises(TypeError):
+            self.rate_book.pcp_copay_data[next(iter(PCP_COPAY_DATA))][10] = 2.0
+
+    def test_pickle(self):
+        """Test a pickled RateBook prices the same and keeps its tables hash."""
+        loaded = pickle.loads(pickle.dumps(self.rate_book))
+        self.assertEqual(loaded.tables_hash, self.rate_book.tables_hash)
+        np.testing.assert_array_equal(loaded.engine.cumulative_claims, self.rate_book.engine.cumulative_claims)
+        columns = plans_to_columns(read_plans_from_csv('data_files/tests/test_3.csv'))
+        np.testing.assert_array_equal(loaded.price_plan_columns(columns)['plan_brf'],
+                                      self.rate_book.price_plan_columns(columns)['plan_brf'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from Plan import Plan
+from batch_pricing import MISSING_INDEX, plans_to_columns, price_plan_columns
+from brf_calculation import calculate_group_brf
+from data_processing import read_plans_from_csv
+from columnar_ingest import price_columnar_census
+from results_writer import ResultsWriter, BookResultsWriter, PLAN_RESULT_FIELDS
+from json_conversions import get_table_versions
+from constants import (
+    CLAIMS_PROBABILITY_DISTRIBUTION,
+    PCP_COPAY_DATA,
+    SPC_COPAY_DATA,
+    ER_COPAY_DATA,
+    COINSURANCE_THRESHOLD_DATA,
+    DEDUCTIBLE_THRESHOLD_DATA,
+    MOOP_THRESHOLD_DATA
+)
+
+try:
+    import pyarrow
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+
+class TestResultsWriter(unittest.TestCase):
+    """Test cases for the streaming results writers."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.tables = (CLAIMS_PROBABILITY_DISTRIBUTION, DEDUCTIBLE_THRESHOLD_DATA, COINSURANCE_THRESHOLD_DATA,
+                       MOOP_THRESHOLD_DATA, PCP_COPAY_DATA, SPC_COPAY_DATA, ER_COPAY_DATA)
+        self.versions = get_table_versions()
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def _write_book(self, file_format):
+        """Price the three test groups and write them with a small buffer."""
+        with BookResultsWriter(self.temp_dir, file_format, self.versions, buffer_rows=3) as writer:
+            for test_number in (1, 2):
+                plans = read_plans_from_csv(f'data_files/tests/test_{test_number}.csv')
+                writer.write_group(f"test_{test_number}", calculate_group_brf(plans, *self.tables), plans=plans)
+            result = price_columnar_census('data_files/tests/test_3.csv', *self.tables)
+            writer.write_group("test_3", result['group_brf'], columns=result['columns'], results=result['results'])
+        return writer
+
+    def test_csv_book(self):
+        """Test plan and group CSV files have every row, field and table version."""
+        writer = self._write_book('csv')
+        self.assertEqual(writer.plans.rows_written, 11)
+        plans = pd.read_csv(os.path.join(self.temp_dir, 'plan_results.csv'))
+        groups = pd.read_csv(os.path.join(self.temp_dir, 'group_results.csv'))
+
+        self.assertEqual(len(plans), 11)
+        for field in PLAN_RESULT_FIELDS:
+            self.assertIn(field, plans.columns)
+        self.assertEqual(list(groups['group_id']), ['test_1', 'test_2', 'test_3'])
+        self.assertAlmostEqual(groups['group_brf'][0], 0.735, places=3)
+        self.assertAlmostEqual(groups['group_brf'][2], 0.757, places=3)
+        self.assertEqual(str(plans['coinsurance_thresholds_version'][0]), self.versions['coinsurance_thresholds'])
+
+    def test_jsonl_book(self):
+        """Test JSON lines output, with missing copays written as null."""
+        self._write_book('jsonl')
+        with open(os.path.join(self.temp_dir, 'plan_results.jsonl')) as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual(len(rows), 11)
+        self.assertIsNone(rows[2]['pcp'])
+        self.assertEqual(rows[0]['base_plan_index'], 212)
+
+    @unittest.skipUnless(HAS_PYARROW, "pyarrow is required for Parquet output")
+    def test_parquet_book(self):
+        """Test Parquet output written as several row groups."""
+        self._write_book('parquet')
+        plans = pd.read_parquet(os.path.join(self.temp_dir, 'plan_results.parquet'))
+        groups = pd.read_parquet(os.path.join(self.temp_dir, 'group_results.parquet'))
+        self.assertEqual(len(plans), 11)
+        self.assertEqual(groups['total_enrollment'].tolist(), [77, 101, 377])
+
+    def test_out_of_band_plan(self):
+        """Test an out-of-band plan without copays is written with MISSING_INDEX, like batch pricing results."""
+        plans = [Plan(1, 'a', 100000, 0.2, 4500, ee_enrollment=1),
+                 read_plans_from_csv('data_files/tests/test_1.csv')[0]]
+        group_brf = calculate_group_brf(plans, *self.tables)
+        expected = price_plan_columns(plans_to_columns(plans), *self.tables)
+        with BookResultsWriter(self.temp_dir, 'csv') as writer:
+            writer.write_group('out_of_band', group_brf, plans=plans)
+        written = pd.read_csv(os.path.join(self.temp_dir, 'plan_results.csv'))
+        for field in ('deductible_index', 'moop_index', 'coinsurance_index', 'base_plan_index'):
+            self.assertEqual(list(written[field]), expected[field].tolist())
+        self.assertEqual(written['deductible_index'][0], MISSING_INDEX)
+        self.assertEqual(written['base_plan_index'][0], MISSING_INDEX)
+
+    def test_unsupported_format(self):
+        """Test an unknown file format raises a ValueError."""
+        with self.assertRaises(ValueError):
+            ResultsWriter(os.path.join(self.temp_dir, 'results.xml'), ['a'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import numpy as np
+import data_processing
+from batch_pricing import plans_to_columns, price_plan_columns
+from data_processing import read_plans_from_csv
+from distribution_engine import DistributionEngine
+from rate_book import RateBook
+from scenario_pricing import Scenario, price_plan_scenarios, price_scenarios
+from constants import (
+    CLAIMS_PROBABILITY_DISTRIBUTION,
+    PCP_COPAY_DATA,
+    SPC_COPAY_DATA,
+    ER_COPAY_DATA,
+    COINSURANCE_THRESHOLD_DATA,
+    DEDUCTIBLE_THRESHOLD_DATA,
+    MOOP_THRESHOLD_DATA
+)
+
+
+class TestScenarioPricing(unittest.TestCase):
+    """Test cases for (trend, base rate) scenario pricing."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.tables = (CLAIMS_PROBABILITY_DISTRIBUTION, DEDUCTIBLE_THRESHOLD_DATA, COINSURANCE_THRESHOLD_DATA,
+                       MOOP_THRESHOLD_DATA, PCP_COPAY_DATA, SPC_COPAY_DATA, ER_COPAY_DATA)
+        self.columns = plans_to_columns(read_plans_from_csv('data_files/tests/test_3.csv'))
+        self.scenarios = [(1.0, data_processing.BASE_RATE), (1.08, data_processing.BASE_RATE), Scenario(1.0, 550.0),
+                          Scenario(1.12, 480.0)]
+
+    def test_baseline_matches_batch_pricing(self):
+        """Test the baseline scenario gives the same results as price_plan_columns()."""
+        result = price_scenarios(self.columns, [Scenario(1.0)], *self.tables)
+        expected = price_plan_columns(self.columns, *self.tables)
+        np.testing.assert_allclose(result['plan_brf'], expected['plan_brf'], rtol=0, atol=1e-12)
+        np.testing.assert_array_equal(result['base_plan_index'], expected['base_plan_index'])
+
+    def test_matches_rescaled_distribution(self):
+        """Test every scenario against an engine built on the rescaled claims distribution."""
+        result = price_scenarios(self.columns, self.scenarios, *self.tables)
+        self.assertEqual(len(result), len(self.scenarios) * len(self.columns['deductible']))
+        for scenario, (trend, base_rate) in enumerate(self.scenarios):
+            distribution = CLAIMS_PROBABILITY_DISTRIBUTION.copy()
+            distribution['expected base rate claims'] *= trend * base_rate / data_processing.BASE_RATE
+            engine = DistributionEngine.from_claims_probability(distribution)
+            expected = engine.base_brf(self.columns['deductible'], self.columns['coinsurance'], self.columns['moop'])
+            expected *= data_processing.BASE_RATE / base_rate
+            rows = result[result['scenario'] == scenario]
+            np.testing.assert_allclose(rows['base_brf'], expected, rtol=1e-12)
+            np.testing.assert_array_equal(rows['plan_id'], self.columns['plan_id'])
+
+    def test_chunking_does_not_change_results(self):
+        """Test a memory budget of a few pairs per chunk gives the same result as one chunk."""
+        result = price_scenarios(self.columns, self.scenarios, *self.tables)
+        chunked = price_scenarios(self.columns, self.scenarios, *self.tables, memory_budget=3 * 160)
+        np.testing.assert_array_equal(chunked['plan_brf'], result['plan_brf'])
+
+    def test_globals_and_plans_unchanged(self):
+        """Test scenario pricing neither changes BASE_RATE nor the plans."""
+        plans = read_plans_from_csv('data_files/tests/test_3.csv')
+        price_plan_scenarios(plans, self.scenarios, *self.tables)
+        self.assertEqual(data_processing.BASE_RATE, 506.43)
+        self.assertIsNone(plans[0].plan_brf)
+
+    def test_rate_book(self):
+        """Test a RateBook in place of the seven tables gives the same scenario results."""
+        expected = price_scenarios(self.columns, self.scenarios, *self.tables)
+        rate_book = RateBook(*self.tables)
+        result = price_scenarios(self.columns, self.scenarios, rate_book)
+        np.testing.assert_array_equal(result['base_plan_index'], expected['base_plan_index'])
+        np.testing.assert_allclose(result['plan_brf'], expected['plan_brf'], rtol=0, atol=1e-12)
+        plans = read_plans_from_csv('data_files/tests/test_3.csv')
+        np.testing.assert_allclose(price_plan_scenarios(plans, self.scenarios, rate_book)['plan_brf'],
+                                   expected['plan_brf'], rtol=0, atol=1e-12)
+
+    def test_invalid_scenarios(self):
+        """Test non-positive scenarios and budgets raise a ValueError."""
+        with self.assertRaises(ValueError):
+            price_scenarios(self.columns, [(0.0, 500.0)], *self.tables)
+        with self.assertRaises(ValueError):
+            price_scenarios(self.columns, [(1.0, -1.0)], *self.tables)
+        with self.assertRaises(ValueError):
+            price_scenarios(self.columns, self.scenarios, *self.tables, memory_budget=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+import numpy as np
+from Plan import Plan
+from simulation import plan_paid_claims, sample_group_brfs, simulate_base_brf
+from constants import CLAIMS_PROBABILITY_DISTRIBUTION
+
+
+class TestSimulation(unittest.TestCase):
+    """Test cases for the Monte Carlo base BRF simulation."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        self.claims_prob = CLAIMS_PROBABILITY_DISTRIBUTION
+        self.plans = [
+            Plan(1, "plan_1", 1500, 0.2, 4500),
+            Plan(2, "plan_2", 0, 0, 500),
+            Plan(3, "plan_3", 2500, 0.2, 2500)
+        ]
+
+    def test_plan_paid_claims_matches_row_helper(self):
+        """Test the vectorized plan-paid claims against Plan._base_brf_compute_helper."""
+        for plan in self.plans:
+            expected = [plan._base_brf_compute_helper({"expected base rate claims": claim, "annual frequency": 1.0})
+                        for claim in self.claims_prob["expected base rate claims"]]
+            result = plan_paid_claims(self.claims_prob["expected base rate claims"].to_numpy(),
+                                      plan.deductible, plan.coinsurance, plan.moop)
+            np.testing.assert_allclose(result, expected, rtol=1e-12, atol=1e-9)
+
+    def test_simulated_mean_converges_to_base_brf(self):
+        """Test the simulated mean is close to the expected-value base BRF."""
+        summaries = simulate_base_brf(self.plans, self.claims_prob, n_groups=200_000, seed=1)
+        for plan, summary in zip(self.plans, summaries):
+            plan.calculate_base_brf(self.claims_prob)
+            self.assertAlmostEqual(summary['mean'], plan.base_brf, delta=4 * summary['std'] / summary['n'] ** 0.5)
+            self.assertEqual(summary['plan_id'], plan.plan_id)
+
+    def test_group_size_reduces_variance(self):
+        """Test larger simulated groups have a smaller BRF variance."""
+        single = simulate_base_brf(self.plans[:1], self.claims_prob, n_groups=20_000, seed=2)[0]
+        grouped = simulate_base_brf(self.plans[:1], self.claims_prob, n_groups=20_000, group_size=50, seed=2)[0]
+        self.assertLess(grouped['variance'], single['variance'])
+
+    def test_seeded_streams_are_reproducible_and_independent(self):
+        """Test the same seed and stream repeat, and different streams differ."""
+        first = sample_group_brfs(self.plans, self.claims_prob, 1000, seed=7, stream_index=0)
+        repeat = sample_group_brfs(self.plans, self.claims_prob, 1000, seed=7, stream_index=0, chunk_size=300)
+        other = sample_group_brfs(self.plans, self.claims_prob, 1000, seed=7, stream_index=1)
+        np.testing.assert_array_equal(first, repeat)
+        self.assertFalse(np.array_equal(first, other))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import pandas as pd
+from brf_calculation import calculate_group_brf
+from data_processing import read_plans_from_csv
+from table_reloader import TableReloader
+
+
+class TestTableReloader(unittest.TestCase):
+    """Test cases for hot reload of the reference tables."""
+
+    def setUp(self):
+        """Copy the reference tables to a temporary directory and load them."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.data_dir = os.path.join(self.temp_dir, 'data_files')
+        shutil.copytree('data_files', self.data_dir, ignore=shutil.ignore_patterns('excel_models', 'tests'))
+        self.reloader = TableReloader(self.data_dir, poll_interval=0.05)
+        self.plans = read_plans_from_csv('data_files/tests/test_1.csv')
+
+    def tearDown(self):
+        """Stop the watcher and remove the temporary directory."""
+        self.reloader.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def edit_pcp_copays(self, factor):
+        """Scale every PCP copay relativity, changing the file's size and modification time."""
+        copay_path = os.path.join(self.data_dir, 'copays', 'pcp_copays.csv')
+        df = pd.read_csv(copay_path)
+        df[df.columns[1:]] = df[df.columns[1:]] * factor
+        df.to_csv(copay_path, index=False)
+        os.utime(copay_path, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+
+    def test_matches_reference(self):
+        """Test pricing on the compiled tables matches calculate_group_brf on the same tables."""
+        self.assertAlmostEqual(self.reloader.calculate_group_brf(self.plans),
+                               calculate_group_brf(self.plans, *self.reloader.tables()), places=12)
+
+    def test_check_swaps_new_tables(self):
+        """Test an edited copay file is picked up, and a table set already taken stays unchanged."""
+        self.assertFalse(self.reloader.check())
+        old_tables = self.reloader.current()
+        old_brf = self.reloader.calculate_group_brf(self.plans)
+
+        self.edit_pcp_copays(1.1)
+        self.assertTrue(self.reloader.check())
+        new_tables = self.reloader.current()
+        self.assertIsNot(new_tables, old_tables)
+        self.assertEqual(old_tables['version'], 1)
+        self.assertEqual(new_tables['version'], 2)
+        self.assertNotEqual(new_tables['tables_hash'], old_tables['tables_hash'])
+        self.assertNotAlmostEqual(self.reloader.calculate_group_brf(self.plans), old_brf, places=6)
+
+        #an in-flight call holding the old table set still prices on the old tables
+        self.assertAlmostEqual(calculate_group_brf(self.plans, *self.reloader.tables(old_tables)), old_brf, places=12)
+
+        metrics = self.reloader.metrics()
+        self.assertEqual(metrics['reloads'], 1)
+        self.assertGreater(metrics['last_reload_seconds'], 0)
+
+    def test_failed_reload_keeps_old_tables(self):
+        """Test a broken file keeps the old tables and records the error."""
+        with open(os.path.join(self.data_dir, 'thresholds', 'threshold_match_moop.csv'), 'w') as f:
+            f.write('threshold match,low,high\n1,abc,5\n')
+        self.assertFalse(self.reloader.check())
+        metrics = self.reloader.metrics()
+        self.assertEqual(metrics['version'], 1)
+        self.assertEqual(metrics['failed_reloads'], 1)
+        self.assertIsNotNone(metrics['last_error'])
+
+    def test_background_watcher(self):
+        """Test the polling thread swaps in edited tables on its own."""
+        self.reloader.start()
+        self.edit_pcp_copays(0.9)
+        deadline = time.time() + 10
+        while self.reloader.metrics()['version'] == 1 and time.time() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(self.reloader.metrics()['version'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from brf_calculation import calculate_group_brf
+from data_processing import read_plans_from_csv, load_reference_tables, reference_tables_hash
+from json_conversions import get_table_versions
+from table_store import VersionedTableStore, TABLE_ARGUMENTS
+from constants import (
+    CLAIMS_PROBABILITY_DISTRIBUTION,
+    STARTING_POINT,
+    PCP_COPAY_DATA,
+    SPC_COPAY_DATA,
+    ER_COPAY_DATA,
+    COINSURANCE_THRESHOLD_DATA,
+    DEDUCTIBLE_THRESHOLD_DATA,
+    MOOP_THRESHOLD_DATA
+)
+
+
+class TestTableStore(unittest.TestCase):
+    """Test cases for the versioned reference table store."""
+
+    def setUp(self):
+        """Create a store with two versions: the current tables and a version with a heavier claims tail."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = VersionedTableStore(os.path.join(self.temp_dir, 'versions'), capacity=1)
+        self.store.snapshot('data_files', effective_date='2025-01-01', description='current tables')
+
+        #second version: copy of data_files/ with a heavier claims tail
+        source_dir = os.path.join(self.temp_dir, 'source')
+        shutil.copytree('data_files', source_dir, ignore=shutil.ignore_patterns('excel_models', 'tests'))
+        claims_path = os.path.join(source_dir, 'claims_probability_distribution.csv')
+        df = pd.read_csv(claims_path)
+        df['total annual claims'] = df['total annual claims'] ** 1.05
+        df.to_csv(claims_path, index=False)
+        self.next_table_versions = dict(get_table_versions(), claims_probability_distribution='next')
+        self.store.snapshot(source_dir, effective_date='2026-01-01', table_versions=self.next_table_versions)
+
+        self.current_tables = (CLAIMS_PROBABILITY_DISTRIBUTION, DEDUCTIBLE_THRESHOLD_DATA, COINSURANCE_THRESHOLD_DATA,
+                               MOOP_THRESHOLD_DATA, PCP_COPAY_DATA, SPC_COPAY_DATA, ER_COPAY_DATA)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_load_reference_tables(self):
+        """Test load_reference_tables reads the same tables as constants.py."""
+        tables = load_reference_tables('data_files')
+        self.assertAlmostEqual(tables['starting_point'], STARTING_POINT, places=9)
+        self.assertEqual(tables['moop_threshold_data'], MOOP_THRESHOLD_DATA)
+        self.assertEqual(tables['er_copay_data'], ER_COPAY_DATA)
+
+    def test_versions(self):
+        """Test versions are numbered automatically and chosen by quote date."""
+        self.assertEqual([manifest['version'] for manifest in self.store.versions()], ['1.0', '1.1'])
+        self.assertEqual(self.store.latest_version(), '1.1')
+        self.assertEqual(self.store.version_for_date('2025-06-30'), '1.0')
+        self.assertEqual(self.store.version_for_date('2026-01-01'), '1.1')
+        with self.assertRaises(ValueError):
+            self.store.version_for_date('2024-12-31')
+
+    def test_find_version(self):
+        """Test stored results map back to their snapshot by content hash or by JSON metadata versions."""
+        tables_hash = reference_tables_hash('data_files')
+        self.assertEqual(self.store.find_version(tables_hash=tables_hash), '1.0')
+        self.assertEqual(self.store.find_version(table_versions=get_table_versions()), '1.0')
+        self.assertEqual(self.store.find_version(table_versions=self.next_table_versions), '1.1')
+        self.assertEqual(self.store.get('1.0')['tables_hash'], tables_hash)
+        self.assertNotEqual(self.store.get('1.1')['tables_hash'], tables_hash)
+        with self.assertRaises(ValueError):
+            self.store.find_version(tables_hash='0' * 64)
+
+    def test_snapshots_are_immutable(self):
+        """Test an existing version cannot be overwritten and edited files are detected."""
+        with self.assertRaises(ValueError):
+            self.store.snapshot('data_files', version='1.0')
+
+        with open(os.path.join(self.store.root, '1.0', 'copays', 'pcp_copays.csv'), 'a') as f:
+            f.write('\n')
+        with self.assertRaises(ValueError):
+            self.store.get('1.0')
+
+    def test_pinned_version(self):
+        """Test pricing on a pinned version matches pricing on those tables directly."""
+        plans = read_plans_from_csv('data_files/tests/test_1.csv')
+        self.assertAlmostEqual(self.store.calculate_group_brf(plans, version='1.0'),
+                               calculate_group_brf(plans, *self.current_tables), places=12)
+
+        tables = self.store.get(quote_date='2026-03-01')
+        self.assertEqual(tables['version'], '1.1')
+        self.assertNotAlmostEqual(self.store.calculate_group_brf(plans, quote_date='2026-03-01'),
+                                  calculate_group_brf(plans, *self.current_tables), places=4)
+        self.assertEqual(len(self.store.tables('1.1')), len(TABLE_ARGUMENTS))
+
+    def test_mixed_batch_loads_each_version_once(self):
+        """Test a batch alternating between versions loads each version once, even with an LRU of one."""
+        groups = []
+        for i in range(6):
+            plans = read_plans_from_csv(f'data_files/tests/test_{i % 3 + 1}.csv')
+            quote_date = '2025-07-01' if i % 2 == 0 else '2026-07-01'
+            groups.append((f"group_{i}", None, quote_date, plans))
+
+        results = self.store.calculate_group_brfs(groups)
+        self.assertEqual(list(results), [f"group_{i}" for i in range(6)])
+        self.assertEqual(self.store.loads, 2)
+        self.assertAlmostEqual(results['group_0'], calculate_group_brf(groups[0][3], *self.current_tables), places=12)
+
+    def test_lru_eviction(self):
+        """Test the least recently used version is unloaded when the store is full."""
+        store = VersionedTableStore(self.store.root, capacity=1)
+        store.get('1.0')
+        store.get('1.1')
+        self.assertEqual(store.resident_versions(), ['1.1'])
+        store.get('1.1')
+        self.assertEqual(store.loads, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,266 @@
+"""
+Overlapped ingest -> price -> write pipeline for a directory of group census files.
+
+Pricing a book one file at a time leaves the CPU idle while a file is read and the disk idle
+while a group is priced. BookPipeline runs the three stages concurrently on an asyncio event
+loop, joined by bounded queues:
+
+    read (read_workers tasks)  -> parsed queue -> price (price_workers tasks) -> priced queue -> write (1 task)
+
+Reading and parsing (read_plans_from_csv, or excel_ingest for Excel models) run on an I/O
+thread pool, pricing runs on a thread pool with the reentrant pure_pricing path (either can be
+given another executor, e.g. a process pool for parsing, which holds the GIL), and writing runs
+on one dedicated thread so rows keep a single writer. A full queue blocks the stage in front of
+it, so a slow writer throttles pricing and reading instead of buffering the whole book.
+
+metrics() can be read at any time (also from another thread) and reports, per stage, the
+number of groups, busy time and throughput, and per queue, the current, maximum and mean depth.
+
+Usage:
+    python async_pipeline.py <census_dir> <output_dir> [data_dir]
+"""
+import asyncio
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+from batch_pricing import plans_to_columns, weighted_group_brf
+from data_processing import load_reference_tables
+from excel_ingest import read_census_plans
+from rate_book import RateBook, as_rate_book
+from results_writer import BookResultsWriter
+
+DEFAULT_READ_WORKERS = 2
+DEFAULT_PRICE_WORKERS = 4
+DEFAULT_QUEUE_SIZE = 16
+DEFAULT_SAMPLE_INTERVAL = 0.01
+STAGES = ('read', 'price', 'write')
+QUEUES = ('parsed', 'priced')
+
+#end-of-work marker passed down the queues
+_DONE = object()
+
+
+class BookPipeline:
+    def __init__(self, tables, writer=None, read_workers=DEFAULT_READ_WORKERS, price_workers=DEFAULT_PRICE_WORKERS,
+                 queue_size=DEFAULT_QUEUE_SIZE, read_executor=None, price_executor=None,
+                 sample_interval=DEFAULT_SAMPLE_INTERVAL, audit_log=None):
+        """
+        Configure a pipeline.
+        Args:
+            tables: rate_book.RateBook shared by every pricing thread (a tuple of the seven table
+                    arguments is compiled to one)
+            writer: Optional object with write_group(group_id, group_brf, columns=..., results=...),
+                    e.g. results_writer.BookResultsWriter
+            read_workers: Number of concurrent file reads
+            price_workers: Number of groups priced concurrently
+            queue_size: Capacity of each queue between stages
+            read_executor: Optional executor for reading and parsing (a thread pool of read_workers threads
+                           by default; parsing holds the GIL, so a process pool helps when reading is the bottleneck)
+            price_executor: Optional executor for pricing (a thread pool of price_workers threads by default)
+            sample_interval: Seconds between queue depth samples
+            audit_log: Optional audit_log.AuditLog recording every priced group
+        """
+        if min(read_workers, price_workers, queue_size) < 1:
+            raise ValueError("read_workers, price_workers and queue_size must be at least 1")
+        self.tables = as_rate_book(tables)
+        self.writer = writer
+        self.read_workers = read_workers
+        self.price_workers = price_workers
+        self.queue_size = queue_size
+        self.read_executor = read_executor
+        self.price_executor = price_executor
+        self.sample_interval = sample_interval
+        self.audit_log = audit_log
+
+        self.results = {}
+        self.failed = {}
+        self._stages = {stage: {'groups': 0, 'busy_seconds': 0.0} for stage in STAGES}
+        self._queue_depths = {name: {'depth': 0, 'max_depth': 0, 'samples': 0, 'total_depth': 0} for name in QUEUES}
+        self._start = None
+        self._end = None
+
+    def run(self, file_paths):
+        """
+        Price every census file (the group id is the file name without extension).
+        Returns:
+            Dictionary of group_id -> group BRF (failed groups are listed in self.failed)
+        """
+        return asyncio.run(self.run_async(file_paths))
+
+    async def run_async(self, file_paths):
+        """
+        Same as run(), from a running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        queues = {name: asyncio.Queue(maxsize=self.queue_size) for name in QUEUES}
+        pending_paths = iter(sorted(file_paths))
+        read_executor = self.read_executor or ThreadPoolExecutor(self.read_workers)
+        write_executor = ThreadPoolExecutor(1)
+        price_executor = self.price_executor or ThreadPoolExecutor(self.price_workers)
+
+        self._start = time.perf_counter()
+        sampler = asyncio.create_task(self._sample_queues(queues))
+        try:
+            readers = [asyncio.create_task(self._read(loop, read_executor, pending_paths, queues['parsed']))
+                       for _ in range(self.read_workers)]
+            pricers = [asyncio.create_task(self._price(loop, price_executor, queues['parsed'], queues['priced']))
+                       for _ in range(self.price_workers)]
+            writer = asyncio.create_task(self._write(loop, write_executor, queues['priced']))
+
+            await asyncio.gather(*readers)
+            for _ in pricers:
+                await queues['parsed'].put(_DONE)
+            await asyncio.gather(*pricers)
+            await queues['priced'].put(_DONE)
+            await writer
+        finally:
+            self._end = time.perf_counter()
+            sampler.cancel()
+            if self.read_executor is None:
+                read_executor.shutdown()
+            write_executor.shutdown()
+            if self.price_executor is None:
+                price_executor.shutdown()
+        return self.results
+
+    def metrics(self):
+        """
+        Returns per-stage and per-queue metrics:
+            stages: {read|price|write: {groups, busy_seconds, groups_per_second}}
+            queues: {parsed|priced: {capacity, depth, max_depth, mean_depth}}
+            elapsed_seconds, failed
+        """
+        if self._start is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self._end or time.perf_counter()) - self._start
+        stages = {}
+        for stage, values in self._stages.items():
+            stages[stage] = dict(values, groups_per_second=values['groups'] / elapsed if elapsed else 0.0)
+        queues = {}
+        for name, values in self._queue_depths.items():
+            queues[name] = {'capacity': self.queue_size, 'depth': values['depth'], 'max_depth': values['max_depth'],
+                            'mean_depth': values['total_depth'] / values['samples'] if values['samples'] else 0.0}
+        return {'stages': stages, 'queues': queues, 'elapsed_seconds': elapsed, 'failed': len(self.failed)}
+
+    #private helper methods
+    async def _read(self, loop, executor, pending_paths, parsed_queue):
+        """
+        Read stage: read and parse census files until none are left.
+        """
+        for file_path in pending_paths:
+            group_id = os.path.splitext(os.path.basename(file_path))[0]
+            try:
+                plans, seconds = await loop.run_in_executor(executor, _timed, read_census_plans, file_path)
+            except Exception as e:
+                self.failed[group_id] = f"{type(e).__name__}: {e}"
+                continue
+            self._count('read', seconds)
+            await parsed_queue.put((group_id, plans))
+
+    async def _price(self, loop, executor, parsed_queue, priced_queue):
+        """
+        Price stage: price parsed groups in the executor until the end marker.
+        """
+        while True:
+            item = await parsed_queue.get()
+            if item is _DONE:
+                return
+            group_id, plans = item
+            try:
+                priced, seconds = await loop.run_in_executor(executor, _timed, price_group_columns, plans, self.tables)
+            except Exception as e:
+                self.failed[group_id] = f"{type(e).__name__}: {e}"
+                continue
+            self._count('price', seconds)
+            if self.audit_log is not None:
+                columns, results, group_brf = priced
+                self.audit_log.record_group(group_id, columns, results, group_brf)
+            await priced_queue.put((group_id,) + priced)
+
+    async def _write(self, loop, executor, priced_queue):
+        """
+        Write stage: hand priced groups to the writer, one at a time, until the end marker.
+        """
+        while True:
+            item = await priced_queue.get()
+            if item is _DONE:
+                return
+            group_id, columns, results, group_brf = item
+            seconds = 0.0
+            if self.writer is not None:
+                try:
+                    _, seconds = await loop.run_in_executor(executor, _timed, self._write_group,
+                                                            group_id, columns, results, group_brf)
+                except Exception as e:
+                    #keep draining the queue, otherwise the stages in front of the writer block forever
+                    self.failed[group_id] = f"{type(e).__name__}: {e}"
+                    continue
+            self.results[group_id] = group_brf
+            self._count('write', seconds)
+
+    def _write_group(self, group_id, columns, results, group_brf):
+        """Write one group (runs on the writer thread)."""
+        self.writer.write_group(group_id, group_brf, columns=columns, results=results)
+
+    async def _sample_queues(self, queues):
+        """
+        Sample the depth of every queue until cancelled.
+        """
+        while True:
+            for name, queue in queues.items():
+                depth = queue.qsize()
+                values = self._queue_depths[name]
+                values['depth'] = depth
+                values['max_depth'] = max(values['max_depth'], depth)
+                values['samples'] += 1
+                values['total_depth'] += depth
+            await asyncio.sleep(self.sample_interval)
+
+    def _count(self, stage, seconds):
+        """Record one group through a stage."""
+        self._stages[stage]['groups'] += 1
+        self._stages[stage]['busy_seconds'] += seconds
+
+
+def price_group_columns(plans, tables):
+    """
+    Price one group without modifying its plans.
+    Args:
+        plans: List of Plan objects
+        tables: RateBook, or a tuple of the seven table arguments
+    Returns:
+        (columns, results, group_brf): the plan columns, their price_plan_columns results and the group BRF
+    """
+    columns = plans_to_columns(plans)
+    results = as_rate_book(tables).price_plan_columns(columns)
+    return columns, results, weighted_group_brf(results['plan_brf'], columns['total_enrollment'])
+
+
+def _timed(function, *args):
+    """Call a function and return (result, seconds)."""
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+    reference_tables = load_reference_tables(sys.argv[3] if len(sys.argv) > 3 else 'data_files')
+    rate_book = RateBook.from_reference_tables(reference_tables)
+    with BookResultsWriter(sys.argv[2]) as book_writer:
+        pipeline = BookPipeline(rate_book, book_writer)
+        pipeline.run([path for pattern in ('*.csv', '*.xlsm', '*.xlsx')
+                      for path in glob.glob(os.path.join(sys.argv[1], pattern))])
+    metrics = pipeline.metrics()
+    print(f"Priced {len(pipeline.results)} groups in {metrics['elapsed_seconds']:.2f}s ({metrics['failed']} failed)")
+    for stage, values in metrics['stages'].items():
+        print(f"  {stage}: {values['groups_per_second']:.1f} groups/s, busy {values['busy_seconds']:.2f}s")
+    for name, values in metrics['queues'].items():
+        print(f"  {name} queue: max {values['max_depth']} / {values['capacity']}, mean {values['mean_depth']:.1f}")
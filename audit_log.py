@@ -0,0 +1,302 @@
+"""
+Append-only audit trail of priced groups.
+
+The JSON mirrors record who changed a reference table and when, but a quote did not record which
+inputs and table versions produced it. AuditLog writes one JSON line per priced group:
+
+    recorded_at, group_id, input_hash, tables_hash, table_versions, n_plans, total_enrollment,
+    group_brf, plans (plan_id, indices, base_plan_index, base_brf, copay_brf and plan_brf
+    as columns), plus any extra context given by the caller (e.g. the census file and its SHA-256)
+
+input_hash is the SHA-256 of the design and enrollment columns that were priced (see
+hash_plan_inputs), so the same census gives the same hash whichever format it was read from.
+
+Recording stays off the pricing hot path: record_group / record_plans only copy the arrays (or
+read the plan attributes) and put them on a queue. A background thread hashes, serializes and
+writes the records in buffered blocks, and rotates the log once it reaches max_bytes. Rotated
+files are renamed with a timestamp and never deleted or rewritten, so the trail stays
+append-only. The queue is bounded: if the writer falls behind, recording blocks instead of
+dropping records.
+
+Each process should write its own log file (e.g. one per worker), since rotation renames the file.
+"""
+import hashlib
+import json
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+from batch_pricing import MISSING_INDEX, plans_to_columns
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_BUFFER_RECORDS = 256
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_MAX_PENDING = 10000
+
+#columns hashed into input_hash, in order
+INPUT_HASH_COLUMNS = ('deductible', 'coinsurance', 'moop', 'pcp', 'spc', 'er', 'total_enrollment')
+PLAN_AUDIT_FIELDS = ('plan_id', 'deductible_index', 'moop_index', 'coinsurance_index', 'base_plan_index',
+                     'base_brf', 'copay_brf', 'plan_brf')
+
+#queue markers
+_CLOSE = object()
+
+
+class AuditLog:
+    def __init__(self, log_path, tables_hash=None, table_versions=None, max_bytes=DEFAULT_MAX_BYTES,
+                 buffer_records=DEFAULT_BUFFER_RECORDS, flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 max_pending=DEFAULT_MAX_PENDING, fsync=False):
+        """
+        Open (or continue) an audit log and start its writer thread.
+        Args:
+            log_path: Path of the current JSON lines log (rotated files are written next to it)
+            tables_hash: Content hash of the reference tables (load_reference_tables()['tables_hash']),
+                         recorded on every record unless a record gives its own
+            table_versions: Dictionary of table name -> version (e.g. json_conversions.get_table_versions()),
+                            recorded on every record unless a record gives its own
+            max_bytes: The log is rotated once it reaches this size (None never rotates)
+            buffer_records: Number of records serialized before they are written out
+            flush_interval: Seconds the writer waits before writing a partial buffer
+            max_pending: Number of records queued before recording blocks
+            fsync: Force every written block to disk
+        """
+        if buffer_records < 1 or max_pending < 1:
+            raise ValueError("buffer_records and max_pending must be at least 1")
+        self.log_path = log_path
+        self.tables_hash = tables_hash
+        self.table_versions = dict(table_versions) if table_versions is not None else None
+        self.max_bytes = max_bytes
+        self.buffer_records = buffer_records
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+
+        self.records_written = 0
+        self.rotated_files = []
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._closed = False
+
+        directory = os.path.dirname(log_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(log_path, 'a', encoding='utf-8')
+        self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+        self._thread.start()
+
+    def record_group(self, group_id, columns, results, group_brf, tables_hash=None, table_versions=None, **context):
+        """
+        Record one group priced with batch pricing.
+        Args:
+            group_id: Identifier of the group
+            columns: Census columns (deductible, coinsurance, moop, pcp, spc, er, total_enrollment,
+                     optionally plan_id) as priced
+            results: Results from batch_pricing.price_plan_columns
+            group_brf: The group BRF
+            tables_hash, table_versions: Override the log's tables for this record
+            context: Extra JSON-serializable fields stored on the record
+        """
+        inputs = {column: np.array(columns[column], dtype=float) for column in INPUT_HASH_COLUMNS}
+        n_plans = len(results['plan_brf'])
+        plans = {field: np.array(results[field]) for field in PLAN_AUDIT_FIELDS[1:]}
+        plans['plan_id'] = np.array(columns['plan_id']) if 'plan_id' in columns else np.arange(1, n_plans + 1)
+        self._put(group_id, inputs, plans, group_brf, tables_hash, table_versions, context)
+
+    def record_plans(self, group_id, plans, group_brf, tables_hash=None, table_versions=None, **context):
+        """
+        Record one group of Plan objects priced with calculate_group_brf (or Plan.calculate_plan_brf).
+        Args:
+            group_id: Identifier of the group
+            plans: The priced Plan objects (their current values are recorded)
+            group_brf: The group BRF
+            tables_hash, table_versions, context: See record_group
+        """
+        columns = plans_to_columns(plans)
+        inputs = {column: columns[column] for column in INPUT_HASH_COLUMNS}
+        results = {'plan_id': columns['plan_id']}
+        for field in PLAN_AUDIT_FIELDS[1:]:
+            if field == 'base_plan_index':
+                values = [MISSING_INDEX if None in (plan.deductible_index, plan.moop_index, plan.coinsurance_index)
+                          else plan.get_base_plan_index() for plan in plans]
+            else:
+                values = [getattr(plan, field) for plan in plans]
+            results[field] = np.array([np.nan if value is None else value for value in values], dtype=float)
+        self._put(group_id, inputs, results, group_brf, tables_hash, table_versions, context)
+
+    def flush(self):
+        """
+        Block until every record queued so far is written (and fsynced when fsync=True).
+        """
+        self._check_error()
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+        self._check_error()
+
+    def close(self):
+        """Write every queued record, stop the writer thread and close the log."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_CLOSE)
+        self._thread.join()
+        self._file.close()
+        self._check_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    #private helper methods
+    def _put(self, group_id, inputs, plans, group_brf, tables_hash, table_versions, context):
+        """Queue one record for the writer thread."""
+        if self._closed:
+            raise ValueError("The audit log is closed")
+        self._check_error()
+        self._queue.put({
+            'recorded_at': datetime.now(timezone.utc).isoformat(),
+            'group_id': group_id,
+            'inputs': inputs,
+            'plans': plans,
+            'group_brf': group_brf,
+            'tables_hash': self.tables_hash if tables_hash is None else tables_hash,
+            'table_versions': self.table_versions if table_versions is None else dict(table_versions),
+            'context': context
+        })
+
+    def _check_error(self):
+        """Raise the writer thread's error in the recording thread."""
+        if self._error is not None:
+            raise RuntimeError(f"Audit log writer failed: {self._error}") from self._error
+
+    def _run(self):
+        """
+        Writer thread: serialize queued records and write them in blocks until closed.
+        """
+        lines = []
+        waiting = []
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval if lines else None)
+            except queue.Empty:
+                item = None
+            if isinstance(item, dict):
+                try:
+                    lines.append(_serialize(item))
+                except Exception as e:
+                    self._error = e
+            elif item is not None:
+                waiting.append(item)
+            if lines and (item is None or item is _CLOSE or waiting or len(lines) >= self.buffer_records):
+                self._write(lines)
+                lines = []
+            for marker in waiting:
+                if marker is _CLOSE:
+                    return
+                marker.set()
+            waiting = []
+
+    def _write(self, lines):
+        """Append a block of lines, then rotate if the log reached max_bytes."""
+        try:
+            self._file.write(''.join(lines))
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self.records_written += len(lines)
+            if self.max_bytes is not None and self._file.tell() >= self.max_bytes:
+                self._rotate()
+        except Exception as e:
+            self._error = e
+
+    def _rotate(self):
+        """Rename the full log with a timestamp and start a new one."""
+        self._file.close()
+        base, extension = os.path.splitext(self.log_path)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+        sequence = 0
+        rotated_path = f"{base}.{stamp}-{sequence:04d}{extension}"
+        while os.path.exists(rotated_path):
+            sequence += 1
+            rotated_path = f"{base}.{stamp}-{sequence:04d}{extension}"
+        os.rename(self.log_path, rotated_path)
+        self.rotated_files.append(rotated_path)
+        self._file = open(self.log_path, 'a', encoding='utf-8')
+
+
+def hash_plan_inputs(columns):
+    """
+    SHA-256 of the priced design and enrollment columns (INPUT_HASH_COLUMNS, as float64,
+    missing copays as NaN), identifying the inputs of a quote independently of the file format.
+    """
+    digest = hashlib.sha256()
+    for column in INPUT_HASH_COLUMNS:
+        values = np.ascontiguousarray(columns[column], dtype=np.float64)
+        #one NaN bit pattern, so every missing copay hashes the same
+        values = np.where(np.isnan(values), np.nan, values)
+        digest.update(column.encode())
+        digest.update(values.tobytes())
+    return digest.hexdigest()
+
+
+def read_audit_log(log_path, include_rotated=True):
+    """
+    Read the records of an audit log, oldest first.
+    Args:
+        log_path: Path of the current log
+        include_rotated: If True, also read the rotated files next to it
+    Returns:
+        List of record dictionaries
+    """
+    base, extension = os.path.splitext(log_path)
+    paths = []
+    if include_rotated:
+        directory = os.path.dirname(log_path) or '.'
+        prefix = os.path.basename(base) + '.'
+        paths = sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                       if name.startswith(prefix) and name.endswith(extension)
+                       and os.path.join(directory, name) != log_path)
+    if os.path.exists(log_path):
+        paths.append(log_path)
+
+    records = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    return records
+
+
+def _serialize(item):
+    """Build the JSON line of one queued record (runs on the writer thread)."""
+    plans = item['plans']
+    total_enrollment = item['inputs']['total_enrollment']
+    record = {
+        'recorded_at': item['recorded_at'],
+        'group_id': item['group_id'],
+        'input_hash': hash_plan_inputs(item['inputs']),
+        'tables_hash': item['tables_hash'],
+        'table_versions': item['table_versions'],
+        'n_plans': len(plans['plan_brf']),
+        'total_enrollment': float(np.sum(total_enrollment)),
+        'group_brf': _number(item['group_brf']),
+        'plans': {field: [_number(value) for value in np.asarray(plans[field]).tolist()]
+                  for field in PLAN_AUDIT_FIELDS}
+    }
+    for field in ('deductible_index', 'moop_index', 'coinsurance_index', 'base_plan_index'):
+        record['plans'][field] = [None if value is None or value == MISSING_INDEX else int(value)
+                                  for value in record['plans'][field]]
+    record.update(item['context'])
+    return json.dumps(record) + '\n'
+
+
+def _number(value):
+    """Plain JSON value: numpy scalars become Python numbers and NaN becomes None."""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
@@ -0,0 +1,170 @@
+"""
+Checkpointed, resumable batch pricing of group census files.
+
+A book run prices every census file (CSV, or an Excel model read with excel_ingest) with
+read_plans_from_csv / calculate_group_brf and appends one line per finished group to a JSON
+lines journal, flushed and fsynced before the next group starts. If the run dies, running it again with the same journal skips every group
+already in the journal and prices only the rest.
+
+A journal entry is only reused while it is still valid: each entry records the SHA-256 of the
+census file and the content hash of the reference tables (data_processing.reference_tables_hash)
+it was priced with, so an edited census file or a change to any reference table CSV causes the
+group to be priced again. The journal is never rewritten; newer entries for a group win.
+
+Usage:
+    python batch_job.py <census_dir> <journal_path> [data_dir]
+"""
+import glob
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+from brf_calculation import calculate_group_brf
+from data_processing import load_reference_tables, hash_file
+from excel_ingest import read_census_plans
+from rate_book import RateBook
+
+
+class BatchJournal:
+    def __init__(self, journal_path, fsync=True):
+        """
+        Open (or create) an append-only journal of priced groups.
+        Args:
+            journal_path: Path of the JSON lines journal
+            fsync: Force every entry to disk before returning (turn off only for tests / scratch runs)
+        """
+        self.journal_path = journal_path
+        self.fsync = fsync
+        self.entries = self._read()
+        self._file = open(journal_path, 'a')
+        #a crash can leave a partial last line; start the next entry on a fresh line
+        if self._file.tell() > 0 and not self._ends_with_newline():
+            self._file.write('\n')
+
+    def completed(self, group_id, file_sha256, tables_hash):
+        """
+        Returns the journal entry of a group if it was priced from the same census file on the
+        same tables, or None if it must be priced (again).
+        """
+        entry = self.entries.get(group_id)
+        if (entry is None or entry['status'] != 'priced' or entry['file_sha256'] != file_sha256
+                or entry['tables_hash'] != tables_hash):
+            return None
+        return entry
+
+    def append(self, entry):
+        """
+        Append one entry and make it durable.
+        """
+        entry = dict(entry, recorded_at=datetime.now().isoformat() + "Z")
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.entries[entry['group_id']] = entry
+
+    def close(self):
+        """Close the journal file."""
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    #private helper methods
+    def _read(self):
+        """
+        Read the latest entry of every group, skipping a partial last line left by a crash.
+        """
+        entries = {}
+        if not os.path.exists(self.journal_path):
+            return entries
+        with open(self.journal_path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                entries[entry['group_id']] = entry
+        return entries
+
+    def _ends_with_newline(self):
+        """Returns True if the journal file ends with a newline."""
+        with open(self.journal_path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+
+def run_batch_job(file_paths, journal_path, data_dir='data_files', tables=None, on_result=None, fsync=True,
+                  audit_log=None):
+    """
+    Price a book of group census files, skipping groups the journal already holds valid results for.
+    Args:
+        file_paths: Group census CSV files or Excel models (the group id is the file name without extension)
+        journal_path: Path of the checkpoint journal (created if missing)
+        data_dir: Directory with the reference tables
+        tables: Optional already-loaded tables from load_reference_tables (skips loading)
+        on_result: Optional callback(group_id, group_brf) called after each group is journaled
+        fsync: Force every journal entry to disk
+        audit_log: Optional audit_log.AuditLog recording every priced group (with its census file)
+    Returns:
+        Dictionary with results (group_id -> group BRF for every priced or reused group),
+        priced, skipped and invalidated (lists of group ids) and failed (group_id -> error)
+    """
+    if tables is None:
+        tables = load_reference_tables(data_dir)
+    rate_book = RateBook.from_reference_tables(tables)
+    tables_hash = tables['tables_hash']
+
+    report = {'results': {}, 'priced': [], 'skipped': [], 'invalidated': [], 'failed': {}}
+    with BatchJournal(journal_path, fsync=fsync) as journal:
+        for file_path in sorted(file_paths):
+            group_id = os.path.splitext(os.path.basename(file_path))[0]
+            file_sha256 = hash_file(file_path)
+            entry = journal.completed(group_id, file_sha256, tables_hash)
+            if entry is not None:
+                report['results'][group_id] = entry['group_brf']
+                report['skipped'].append(group_id)
+                continue
+            previous = journal.entries.get(group_id)
+            if previous is not None and previous['status'] == 'priced':
+                report['invalidated'].append(group_id)
+
+            base = {'group_id': group_id, 'file': file_path, 'file_sha256': file_sha256, 'tables_hash': tables_hash}
+            try:
+                plans = read_census_plans(file_path)
+                group_brf = float(calculate_group_brf(plans, rate_book))
+            except Exception as e:
+                #a bad census file is journaled as failed and retried on the next run
+                report['failed'][group_id] = f"{type(e).__name__}: {e}"
+                journal.append(dict(base, status='failed', error=report['failed'][group_id]))
+                continue
+            journal.append(dict(base, status='priced', group_brf=group_brf))
+            if audit_log is not None:
+                audit_log.record_plans(group_id, plans, group_brf, tables_hash=tables_hash,
+                                       file=file_path, file_sha256=file_sha256)
+            report['results'][group_id] = group_brf
+            report['priced'].append(group_id)
+            if on_result is not None:
+                on_result(group_id, group_brf)
+    return report
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+    start = time.perf_counter()
+    census_files = [path for pattern in ('*.csv', '*.xlsm', '*.xlsx')
+                    for path in glob.glob(os.path.join(sys.argv[1], pattern))]
+    report = run_batch_job(census_files, sys.argv[2],
+                           sys.argv[3] if len(sys.argv) > 3 else 'data_files')
+    print(f"Priced {len(report['priced'])} groups, reused {len(report['skipped'])} from the journal "
+          f"({len(report['invalidated'])} invalidated), {len(report['failed'])} failed "
+          f"in {time.perf_counter() - start:.1f}s")
+    for group_id, error in sorted(report['failed'].items()):
+        print(f"FAILED {group_id}: {error}")
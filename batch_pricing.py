@@ -0,0 +1,415 @@
+"""
+Vectorized pricing of many plans at once.
+
+These functions follow the same steps as Plan.calculate_plan_brf() (indices, base BRF,
+copay BRF, plan BRF) but work on columns of plan designs instead of one Plan object at a
+time, and never modify Plan objects.
+"""
+import numpy as np
+import pandas as pd
+
+from distribution_engine import DistributionEngine
+
+#index value used when a value does not fall in any threshold band
+MISSING_INDEX = -1
+
+PLAN_DESIGN_COLUMNS = ('deductible', 'coinsurance', 'moop', 'pcp', 'spc', 'er')
+ENROLLMENT_COLUMNS = ('ee', 'es', 'ec', 'ef')
+
+#what a group BRF is when the group's total enrollment is zero (see aggregate_group_brfs)
+ZERO_ENROLLMENT_POLICIES = ('raise', 'nan', 'unweighted')
+
+
+def calculate_indices_array(values, threshold_data):
+    """
+    Vectorized version of Plan._calculate_index.
+    Args:
+        values: Array of values to look up
+        threshold_data: Dictionary with threshold match as key and (low, high) tuple as value
+    Returns:
+        int64 array with the index of the first band where low <= value < high,
+        or MISSING_INDEX where no band matches
+    """
+    values = np.asarray(values, dtype=float)
+    result = np.full(values.shape, MISSING_INDEX, dtype=np.int64)
+
+    #walk the bands backwards so the first matching band (in dictionary order) wins
+    for index, (low, high) in reversed(list(threshold_data.items())):
+        result[(low <= values) & (values < high)] = index
+    return result
+
+
+def combine_base_plan_index(deductible_index, moop_index, coinsurance_index):
+    """
+    Vectorized version of Plan.get_base_plan_index: joins the digits of the three indices.
+    Example: deductible=2, moop=1, coinsurance=3 -> 213
+    """
+    deductible_index = np.asarray(deductible_index, dtype=np.int64)
+    moop_index = np.asarray(moop_index, dtype=np.int64)
+    coinsurance_index = np.asarray(coinsurance_index, dtype=np.int64)
+    return (deductible_index * 10 ** (_count_digits(moop_index) + _count_digits(coinsurance_index)) +
+            moop_index * 10 ** _count_digits(coinsurance_index) +
+            coinsurance_index)
+
+
+class CompiledCopayTable:
+    """
+    A copay table (copay_data[base_index][copay_amount] = value) flattened into sorted arrays,
+    so many (base plan index, copay amount) pairs are looked up with two binary searches
+    instead of one dictionary lookup per pair.
+    """
+    __slots__ = ('base_indices', 'amounts', 'values')
+
+    def __init__(self, copay_data):
+        """
+        Args:
+            copay_data: 2D dictionary where copay_data[base_index][copay_amount] = value
+        """
+        self.base_indices = np.array(sorted(copay_data), dtype=np.int64)
+        self.amounts = np.array(sorted({amount for column in copay_data.values() for amount in column}), dtype=float)
+
+        #pairs missing from the table keep the default relativity of 1.0
+        self.values = np.ones((len(self.base_indices), len(self.amounts)))
+        for row, base_index in enumerate(self.base_indices.tolist()):
+            for amount, value in copay_data[base_index].items():
+                self.values[row, np.searchsorted(self.amounts, amount)] = value
+
+    @classmethod
+    def from_arrays(cls, base_indices, amounts, values):
+        """
+        Rebuild a compiled table from its three arrays (e.g. as saved to disk).
+        """
+        table = cls.__new__(cls)
+        table.base_indices = np.asarray(base_indices, dtype=np.int64)
+        table.amounts = np.asarray(amounts, dtype=float)
+        table.values = np.asarray(values, dtype=float)
+        return table
+
+    def to_dict(self):
+        """
+        Returns the table as a 2D dictionary (copay_data[base_index][copay_amount] = value).
+        """
+        return {int(base_index): {_number(amount): float(value) for amount, value in zip(self.amounts, row)}
+                for base_index, row in zip(self.base_indices, self.values)}
+
+    def lookup(self, base_plan_index, copay_amounts):
+        """
+        Relativity for each (base plan index, copay amount) pair, 1.0 where the pair is not in the table.
+        """
+        rows = np.searchsorted(self.base_indices, base_plan_index)
+        columns = np.searchsorted(self.amounts, copay_amounts)
+        rows_clipped = np.minimum(rows, len(self.base_indices) - 1)
+        columns_clipped = np.minimum(columns, len(self.amounts) - 1)
+        found = ((rows < len(self.base_indices)) & (columns < len(self.amounts)) &
+                 (self.base_indices[rows_clipped] == base_plan_index) & (self.amounts[columns_clipped] == copay_amounts))
+        return np.where(found, self.values[rows_clipped, columns_clipped], 1.0)
+
+
+def lookup_copay_relativity(copay_data, base_plan_index, copay_amounts):
+    """
+    Vectorized version of Plan.find_copay_relativity.
+    Missing copays (NaN or 0) and amounts not found in the table give 1.0.
+    Args:
+        copay_data: 2D dictionary where copay_data[base_index][copay_amount] = value
+                    (or a CompiledCopayTable built from one)
+        base_plan_index: Array of base plan indices
+        copay_amounts: Array of copay amounts
+    Returns:
+        float64 array of relativity values
+    """
+    base_plan_index = np.asarray(base_plan_index, dtype=np.int64)
+    copay_amounts = np.asarray(copay_amounts, dtype=float)
+    result = np.ones(len(copay_amounts))
+
+    has_copay = _has_copay(copay_amounts)
+    if not has_copay.any():
+        return result
+
+    table = copay_data if isinstance(copay_data, CompiledCopayTable) else CompiledCopayTable(copay_data)
+    if len(table.base_indices) and len(table.amounts):
+        result[has_copay] = table.lookup(base_plan_index[has_copay], copay_amounts[has_copay])
+    return result
+
+
+def plans_to_columns(plans):
+    """
+    Convert a list of Plan objects to a dictionary of design and enrollment arrays.
+    Missing copays become NaN.
+    """
+    def _copay(value):
+        return np.nan if value is None else value
+
+    return {
+        'plan_id': np.array([plan.plan_id for plan in plans]),
+        'plan_name': np.array([plan.plan_name for plan in plans], dtype=object),
+        'deductible': np.array([plan.deductible for plan in plans], dtype=float),
+        'coinsurance': np.array([plan.coinsurance for plan in plans], dtype=float),
+        'moop': np.array([plan.moop for plan in plans], dtype=float),
+        'pcp': np.array([_copay(plan.pcp_copay) for plan in plans], dtype=float),
+        'spc': np.array([_copay(plan.spc_copay) for plan in plans], dtype=float),
+        'er': np.array([_copay(plan.er_copay) for plan in plans], dtype=float),
+        'total_enrollment': np.array([plan.total_enrollment for plan in plans], dtype=float)
+    }
+
+
+def price_plan_columns(columns, claims_probability_distribution, deductible_threshold_data=None,
+                       coinsurance_threshold_data=None, moop_threshold_data=None,
+                       pcp_copay_data=None, spc_copay_data=None, er_copay_data=None, engine=None, cache=None,
+                       tables_hash=None):
+    """
+    Calculate indices, base BRF, copay BRF and plan BRF for columns of plan designs.
+
+    Args:
+        columns: Dictionary (or DataFrame) with deductible, coinsurance, moop, pcp, spc and er arrays
+        claims_probability_distribution: DataFrame with claims probability data
+                                         (or a rate_book.RateBook standing for all seven tables)
+        deductible_threshold_data: Dictionary with deductible threshold ranges
+        coinsurance_threshold_data: Dictionary with coinsurance threshold ranges
+        moop_threshold_data: Dictionary with MOOP threshold ranges
+        pcp_copay_data: 2D dictionary with PCP copay relativity data
+        spc_copay_data: 2D dictionary with SPC copay relativity data
+        er_copay_data: 2D dictionary with ER copay relativity data
+        engine: Optional precompiled DistributionEngine for the distribution (built if not given)
+        cache: Optional design_cache.DesignCache; cached designs are not recomputed and new ones are cached
+        tables_hash: Content hash of the tables (load_reference_tables()['tables_hash']), needed with a cache
+                     (defaults to the RateBook's)
+
+    Returns:
+        Dictionary of arrays: deductible_index, moop_index, coinsurance_index, base_plan_index,
+        base_brf, copay_brf and plan_brf
+
+    As in Plan.calculate_plan_brf(), a design outside a threshold band is still priced
+    (its base_plan_index is MISSING_INDEX) unless it has a copay, which needs the base plan
+    index for the lookup; those rows raise a ValueError.
+    """
+    tables = (claims_probability_distribution, deductible_threshold_data, coinsurance_threshold_data,
+              moop_threshold_data, pcp_copay_data, spc_copay_data, er_copay_data)
+    rate_book = _rate_book(claims_probability_distribution)
+    if cache is not None:
+        if tables_hash is None and rate_book is not None:
+            tables_hash = rate_book.tables_hash
+        return _price_plan_columns_cached(columns, cache, tables_hash, tables, engine)
+    if rate_book is not None:
+        return rate_book.price_plan_columns(columns)
+
+    deductible = np.asarray(columns['deductible'], dtype=float)
+    coinsurance = np.asarray(columns['coinsurance'], dtype=float)
+    moop = np.asarray(columns['moop'], dtype=float)
+
+    #step 1: calculate indices
+    deductible_index = calculate_indices_array(deductible, deductible_threshold_data)
+    moop_index = calculate_indices_array(moop, moop_threshold_data)
+    coinsurance_index = calculate_indices_array(coinsurance, coinsurance_threshold_data)
+
+    #step 2: calculate base brf
+    if engine is None:
+        engine = DistributionEngine.from_claims_probability(claims_probability_distribution)
+    base_brf = engine.base_brf(deductible, coinsurance, moop)
+
+    #steps 3 and 4: copay brf and final plan brf
+    return finish_plan_pricing(columns, deductible_index, moop_index, coinsurance_index, base_brf,
+                               pcp_copay_data, spc_copay_data, er_copay_data)
+
+
+def finish_plan_pricing(columns, deductible_index, moop_index, coinsurance_index, base_brf,
+                        pcp_copay_data, spc_copay_data, er_copay_data, base_plan_index=None):
+    """
+    Steps 3 and 4 of price_plan_columns, shared by every engine that computes the indices and
+    base BRF its own way: combine the base plan index, look up the copay BRF and multiply.
+    Args:
+        columns: Dictionary (or DataFrame) with pcp, spc and er arrays
+        deductible_index, moop_index, coinsurance_index: Index arrays (MISSING_INDEX when out of band)
+        base_brf: Array of base BRF values
+        pcp_copay_data, spc_copay_data, er_copay_data: Copay tables (dictionaries or CompiledCopayTable)
+        base_plan_index: Optional precomputed base plan index array (e.g. from a RateBook)
+    Returns:
+        Dictionary of arrays (see price_plan_columns)
+    """
+    base_plan_index = _base_plan_index_or_missing(deductible_index, moop_index, coinsurance_index,
+                                                  columns['pcp'], columns['spc'], columns['er'], base_plan_index)
+
+    #step 3: calculate copay brf
+    copay_brf = (lookup_copay_relativity(pcp_copay_data, base_plan_index, columns['pcp']) *
+                 lookup_copay_relativity(spc_copay_data, base_plan_index, columns['spc']) *
+                 lookup_copay_relativity(er_copay_data, base_plan_index, columns['er']))
+
+    #step 4: calculate final plan brf
+    return {
+        'deductible_index': deductible_index,
+        'moop_index': moop_index,
+        'coinsurance_index': coinsurance_index,
+        'base_plan_index': base_plan_index,
+        'base_brf': base_brf,
+        'copay_brf': copay_brf,
+        'plan_brf': base_brf * copay_brf
+    }
+
+
+def calculate_group_brf_batch(plans, claims_probability_distribution, deductible_threshold_data=None,
+                              coinsurance_threshold_data=None, moop_threshold_data=None,
+                              pcp_copay_data=None, spc_copay_data=None, er_copay_data=None, engine=None):
+    """
+    Vectorized version of calculate_group_brf. The Plan objects are not modified.
+
+    Returns:
+        The weighted average BRF for the group of plans
+    """
+    columns = plans_to_columns(plans)
+    results = price_plan_columns(columns, claims_probability_distribution, deductible_threshold_data,
+                                 coinsurance_threshold_data, moop_threshold_data,
+                                 pcp_copay_data, spc_copay_data, er_copay_data, engine=engine)
+    return weighted_group_brf(results['plan_brf'], columns['total_enrollment'])
+
+
+def aggregate_group_brfs(group_keys, plan_brf, enrollment, zero_enrollment='nan'):
+    """
+    Book-level group BRFs: Σ(plan_brf × enrollment) / Σ(enrollment) for every group key, computed
+    with one segmented reduction over a flat array of priced plans instead of one call per group.
+    Args:
+        group_keys: Array with the group key of every plan (any hashable values, not missing)
+        plan_brf: Array of plan BRFs
+        enrollment: Array of plan enrollments
+        zero_enrollment: Group BRF of a group whose total enrollment is zero:
+                         'nan' (default), 'unweighted' (plain mean of its plan BRFs) or 'raise' (ValueError)
+    Returns:
+        Dictionary of arrays, one entry per group in order of first appearance: group_key, n_plans,
+        total_enrollment, group_brf and zero_enrollment (True for the zero-enrollment groups)
+    """
+    _validate_zero_enrollment_policy(zero_enrollment)
+    codes, keys = pd.factorize(np.asarray(group_keys))
+    if (codes < 0).any():
+        raise ValueError(f"Missing group key for {int((codes < 0).sum())} plan(s).")
+    plan_brf = np.asarray(plan_brf, dtype=float)
+    enrollment = np.asarray(enrollment, dtype=float)
+    n_groups = len(keys)
+
+    n_plans = np.bincount(codes, minlength=n_groups)
+    total_enrollment = np.bincount(codes, weights=enrollment, minlength=n_groups)
+    weighted_brf = np.bincount(codes, weights=plan_brf * enrollment, minlength=n_groups)
+
+    zero = total_enrollment == 0
+    group_brf = np.full(n_groups, np.nan)
+    np.divide(weighted_brf, total_enrollment, out=group_brf, where=~zero)
+    if zero.any():
+        if zero_enrollment == 'raise':
+            raise ValueError(f"{int(zero.sum())} group(s) have zero total enrollment: {keys[zero][:10].tolist()}")
+        if zero_enrollment == 'unweighted':
+            group_brf[zero] = np.bincount(codes, weights=plan_brf, minlength=n_groups)[zero] / n_plans[zero]
+    return {
+        'group_key': np.asarray(keys),
+        'n_plans': n_plans,
+        'total_enrollment': total_enrollment,
+        'group_brf': group_brf,
+        'zero_enrollment': zero
+    }
+
+
+def weighted_group_brf(plan_brf, enrollment, zero_enrollment='raise'):
+    """
+    Group BRF of one group: Σ(plan_brf × enrollment) / Σ(enrollment).
+    A group with zero total enrollment is handled by the zero_enrollment policy
+    (see aggregate_group_brfs); by default it raises a ValueError.
+    """
+    _validate_zero_enrollment_policy(zero_enrollment)
+    plan_brf = np.asarray(plan_brf, dtype=float)
+    enrollment = np.asarray(enrollment, dtype=float)
+    total_enrollment = float(enrollment.sum())
+    if total_enrollment != 0:
+        return float((plan_brf * enrollment).sum()) / total_enrollment
+    if zero_enrollment == 'raise':
+        raise ValueError("Cannot calculate a group BRF: the group has zero total enrollment.")
+    if zero_enrollment == 'unweighted' and len(plan_brf):
+        return float(plan_brf.mean())
+    return float('nan')
+
+
+#private helper methods
+def _validate_zero_enrollment_policy(zero_enrollment):
+    """Raise a ValueError for an unknown zero enrollment policy."""
+    if zero_enrollment not in ZERO_ENROLLMENT_POLICIES:
+        raise ValueError(f"zero_enrollment must be one of {ZERO_ENROLLMENT_POLICIES}, got {zero_enrollment!r}")
+
+
+def _price_plan_columns_cached(columns, cache, tables_hash, tables, engine):
+    """
+    price_plan_columns through a design cache: look every design up first, price only the misses
+    and cache them.
+    """
+    if tables_hash is None:
+        raise ValueError("A tables_hash is needed to use a design cache.")
+    designs = list(zip(*(np.asarray(columns[name], dtype=float).tolist() for name in PLAN_DESIGN_COLUMNS)))
+    cached = cache.get_many(designs, tables_hash)
+    misses = np.array([row for row, result in enumerate(cached) if result is None], dtype=np.int64)
+
+    results = {
+        'deductible_index': np.empty(len(designs), dtype=np.int64),
+        'moop_index': np.empty(len(designs), dtype=np.int64),
+        'coinsurance_index': np.empty(len(designs), dtype=np.int64),
+        'base_plan_index': np.empty(len(designs), dtype=np.int64),
+        'base_brf': np.empty(len(designs)),
+        'copay_brf': np.empty(len(designs)),
+        'plan_brf': np.empty(len(designs))
+    }
+    for row, result in enumerate(cached):
+        if result is not None:
+            for name, values in results.items():
+                values[row] = MISSING_INDEX if result[name] is None else result[name]
+
+    if len(misses):
+        miss_columns = {name: np.asarray(columns[name], dtype=float)[misses] for name in PLAN_DESIGN_COLUMNS}
+        priced = price_plan_columns(miss_columns, *tables, engine=engine)
+        for name, values in results.items():
+            values[misses] = priced[name]
+        #out-of-band indices are stored as NULL, as the Plan path leaves them None
+        cache.put_many([designs[row] for row in misses.tolist()], tables_hash,
+                       [{name: (None if name.endswith('index') and values[position] == MISSING_INDEX
+                                else values[position]) for name, values in priced.items()}
+                        for position in range(len(misses))])
+    return results
+
+
+def _rate_book(claims_probability_distribution):
+    """Returns the RateBook passed in place of the seven tables, or None."""
+    #imported here: rate_book is built on this module
+    from rate_book import RateBook
+    return claims_probability_distribution if isinstance(claims_probability_distribution, RateBook) else None
+
+
+def _count_digits(values):
+    """
+    Number of decimal digits of non-negative integers (0 has one digit).
+    """
+    return np.floor(np.log10(np.maximum(values, 1))).astype(np.int64) + 1
+
+
+def _number(value):
+    """A whole float as an int (like the copay amounts read by read_copay_data), otherwise a float."""
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+def _has_copay(copay_amounts):
+    """
+    True where a copay is set (not NaN and not 0), i.e. where Plan.calculate_copay_brf looks it up.
+    """
+    copay_amounts = np.asarray(copay_amounts, dtype=float)
+    return ~np.isnan(copay_amounts) & (copay_amounts != 0)
+
+
+def _base_plan_index_or_missing(deductible_index, moop_index, coinsurance_index, pcp, spc, er, base_plan_index=None):
+    """
+    Combine the indices, with MISSING_INDEX for designs outside a threshold band.
+    Raise a ValueError listing the out-of-band rows that have a copay, which the reference
+    Plan path cannot price either.
+    """
+    missing = ((deductible_index == MISSING_INDEX) | (moop_index == MISSING_INDEX) |
+               (coinsurance_index == MISSING_INDEX))
+    needs_index = missing & (_has_copay(pcp) | _has_copay(spc) | _has_copay(er))
+    if needs_index.any():
+        rows = np.flatnonzero(needs_index)
+        raise ValueError(f"No threshold band found for {len(rows)} plan(s) with copays at rows {rows[:10].tolist()}.")
+    if base_plan_index is not None:
+        return base_plan_index
+    base_plan_index = combine_base_plan_index(deductible_index, moop_index, coinsurance_index)
+    base_plan_index[missing] = MISSING_INDEX
+    return base_plan_index
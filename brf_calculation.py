@@ -1,4 +1,4 @@
-def calculate_group_brf(plans, claims_probability_distribution, deductible_threshold_data, coinsurance_threshold_data, moop_threshold_data, pcp_copay_data, spc_copay_data, er_copay_data):
+def calculate_group_brf(plans, claims_probability_distribution, deductible_threshold_data=None, coinsurance_threshold_data=None, moop_threshold_data=None, pcp_copay_data=None, spc_copay_data=None, er_copay_data=None):
     """
     Calculate the weighted average BRF for a group of plans.
     
@@ -11,6 +11,7 @@ def calculate_group_brf(plans, claims_probability_distribution, deductible_thres
     Args:
         plans: List of Plan objects to calculate BRF for
         claims_probability_distribution: DataFrame with claims probability data
+                                         (or a rate_book.RateBook standing for all seven tables)
         deductible_threshold_data: Dictionary with deductible threshold ranges
         coinsurance_threshold_data: Dictionary with coinsurance threshold ranges
         moop_threshold_data: Dictionary with MOOP threshold ranges
@@ -36,6 +37,8 @@ def calculate_group_brf(plans, claims_probability_distribution, deductible_thres
         weighted_group_brf += plan.plan_brf * plan.total_enrollment
         total_group_enrollment += plan.total_enrollment
 
+    if total_group_enrollment == 0:
+        raise ValueError("Cannot calculate a group BRF: the group has zero total enrollment.")
     return weighted_group_brf / total_group_enrollment
   
 
@@ -0,0 +1,304 @@
+"""
+Materialized BRF surface for fast quoting.
+
+Most quotes fall on a fixed grid of deductibles, coinsurances and MOOPs. build_surface prices
+every grid point once for a table version and keeps the base BRF surface, together with the
+compiled copay relativities, threshold bands and claims distribution, in one compressed .npz
+file named after the tables' content hash.
+
+A design is then served from the surface:
+- on a grid point, the stored base BRF is returned as is;
+- inside a grid cell that does not cross a threshold band edge, the base BRF is interpolated
+  trilinearly from the cell's eight corners, if the cell's interpolation error (sampled on a
+  small lattice inside the cell when the surface is built) is within error_bound;
+- anything else (off the grid, a cell crossing a band edge, or a cell whose error is too large)
+  is priced exactly with the distribution engine stored in the file.
+The indices and copay BRF are always computed exactly, as in price_plan_columns.
+"""
+import bisect
+import json
+import os
+
+import numpy as np
+
+from batch_pricing import MISSING_INDEX, CompiledCopayTable, calculate_indices_array, finish_plan_pricing
+from distribution_engine import DistributionEngine
+
+DEFAULT_DEDUCTIBLES = np.arange(0, 20001, 250, dtype=float)
+DEFAULT_COINSURANCES = np.round(np.arange(0, 1.0001, 0.05), 2)
+DEFAULT_MOOPS = np.arange(0, 30001, 250, dtype=float)
+DEFAULT_ERROR_BOUND = 1e-4
+DEFAULT_ERROR_SAMPLES = 3
+#the cell error is sampled, not a strict maximum, so a cell is only served when the sampled error
+#is comfortably inside the bound
+ERROR_SAFETY_FACTOR = 2.0
+
+AXES = ('deductible', 'coinsurance', 'moop')
+THRESHOLD_TABLES = ('deductible_threshold_data', 'coinsurance_threshold_data', 'moop_threshold_data')
+COPAY_TABLES = ('pcp_copay_data', 'spc_copay_data', 'er_copay_data')
+COPAY_COLUMNS = ('pcp', 'spc', 'er')
+
+
+class BRFSurface:
+    def __init__(self, axes, base_brf, cell_error, threshold_data, compiled_copays, engine, tables_hash=None,
+                 error_bound=DEFAULT_ERROR_BOUND):
+        """
+        Wrap a precomputed surface. Use build_surface() or BRFSurface.load() to create one.
+        Args:
+            axes: (deductibles, coinsurances, moops) sorted grid axes
+            base_brf: Base BRF at every grid point, shape (len(deductibles), len(coinsurances), len(moops))
+            cell_error: Sampled interpolation error of every grid cell (one less point on each axis)
+            threshold_data: (deductible, coinsurance, moop) threshold dictionaries
+            compiled_copays: (pcp, spc, er) CompiledCopayTable
+            engine: DistributionEngine used for exact fallback pricing
+            tables_hash: Content hash of the tables the surface was built from
+            error_bound: Largest interpolation error served without falling back to exact pricing
+        """
+        self.axes = tuple(np.asarray(axis, dtype=float) for axis in axes)
+        self.base_brf = np.asarray(base_brf, dtype=float)
+        self.cell_error = np.asarray(cell_error, dtype=float)
+        self.threshold_data = tuple(threshold_data)
+        self.compiled_copays = tuple(compiled_copays)
+        self.engine = engine
+        self.tables_hash = tables_hash
+        self.error_bound = error_bound
+
+        #cells with a threshold band edge strictly inside cannot be interpolated
+        self._cell_in_band = tuple(_cells_in_band(axis, bands) for axis, bands in zip(self.axes, self.threshold_data))
+        #plain Python copies for the scalar lookup, which avoids numpy call overhead
+        self._axis_lists = tuple(axis.tolist() for axis in self.axes)
+        self._copay_dicts = tuple(table.to_dict() for table in self.compiled_copays)
+
+    #serving
+    def lookup(self, deductible, coinsurance, moop, pcp=None, spc=None, er=None):
+        """
+        Price one plan design from the surface.
+        Returns:
+            Dictionary with base_brf, copay_brf, plan_brf and source ('grid', 'interpolated' or 'computed')
+        """
+        values = (float(deductible), float(coinsurance), float(moop))
+        base_brf, source = self._scalar_base_brf(values)
+        if base_brf is None:
+            base_brf = float(self.engine.base_brf([values[0]], [values[1]], [values[2]])[0])
+            source = 'computed'
+
+        copay_brf = 1.0
+        copays = [copay for copay in (pcp, spc, er) if copay and copay == copay]
+        if copays:
+            indices = [_scalar_band(value, bands) for value, bands in zip(values, self.threshold_data)]
+            if None in indices:
+                raise ValueError(f"No threshold band found for design {values} with copays.")
+            base_plan_index = int(f"{indices[0]}{indices[2]}{indices[1]}")
+            for copay, copay_data in zip((pcp, spc, er), self._copay_dicts):
+                if copay and copay == copay:
+                    copay_brf *= copay_data.get(base_plan_index, {}).get(copay, 1.0)
+        return {'base_brf': base_brf, 'copay_brf': copay_brf, 'plan_brf': base_brf * copay_brf, 'source': source}
+
+    def price_plan_columns(self, columns):
+        """
+        Same results as batch_pricing.price_plan_columns, with the base BRF served from the surface.
+        Args:
+            columns: Dictionary (or DataFrame) with deductible, coinsurance, moop, pcp, spc and er arrays
+        Returns:
+            (results, report): dictionary of result arrays (see price_plan_columns), and a dictionary
+            with the number of grid, interpolated and computed designs
+        """
+        values = [np.atleast_1d(np.asarray(columns[name], dtype=float)) for name in AXES]
+        base_brf, grid_hit, served = self._array_base_brf(values)
+        computed = ~served
+        if computed.any():
+            base_brf[computed] = self.engine.base_brf(*(value[computed] for value in values))
+
+        indices = [calculate_indices_array(value, bands) for value, bands in zip(values, self.threshold_data)]
+        results = finish_plan_pricing(columns, indices[0], indices[2], indices[1], base_brf, *self.compiled_copays)
+        report = {'grid': int(grid_hit.sum()), 'interpolated': int((served & ~grid_hit).sum()),
+                  'computed': int(computed.sum())}
+        return results, report
+
+    #storage
+    def save(self, file_path):
+        """
+        Save the surface as one compressed .npz file.
+        """
+        arrays = {f"{name}_axis": axis for name, axis in zip(AXES, self.axes)}
+        for name, table in zip(COPAY_TABLES, self.compiled_copays):
+            arrays[f"{name}_base_indices"] = table.base_indices
+            arrays[f"{name}_amounts"] = table.amounts
+            arrays[f"{name}_values"] = table.values
+        metadata = {
+            'tables_hash': self.tables_hash,
+            'threshold_data': {name: [[index, low, high] for index, (low, high) in bands.items()]
+                               for name, bands in zip(THRESHOLD_TABLES, self.threshold_data)}
+        }
+        np.savez_compressed(file_path, base_brf=self.base_brf, cell_error=self.cell_error.astype(np.float32),
+                            claims=self.engine.claims, frequencies=self.engine.frequencies,
+                            metadata=np.array(json.dumps(metadata)), **arrays)
+
+    @classmethod
+    def load(cls, file_path, tables_hash=None, error_bound=DEFAULT_ERROR_BOUND):
+        """
+        Load a surface saved by save().
+        Args:
+            tables_hash: If given, raise a ValueError unless the surface was built from these tables
+            error_bound: Largest interpolation error served without falling back to exact pricing
+        """
+        with np.load(file_path) as data:
+            metadata = json.loads(str(data['metadata']))
+            if tables_hash is not None and metadata['tables_hash'] != tables_hash:
+                raise ValueError(f"BRF surface {file_path} was built from other reference tables")
+            threshold_data = tuple({int(index): (low, high) for index, low, high in metadata['threshold_data'][name]}
+                                   for name in THRESHOLD_TABLES)
+            compiled_copays = tuple(CompiledCopayTable.from_arrays(data[f"{name}_base_indices"],
+                                                                   data[f"{name}_amounts"], data[f"{name}_values"])
+                                    for name in COPAY_TABLES)
+            return cls(tuple(data[f"{name}_axis"] for name in AXES), data['base_brf'], data['cell_error'],
+                       threshold_data, compiled_copays, DistributionEngine(data['claims'], data['frequencies']),
+                       tables_hash=metadata['tables_hash'], error_bound=error_bound)
+
+    #private helper methods
+    def _scalar_base_brf(self, values):
+        """
+        Base BRF of one design from the surface, or (None, None) if it must be computed.
+        """
+        cell = []
+        for value, axis in zip(values, self._axis_lists):
+            if not axis[0] <= value <= axis[-1] or len(axis) < 2:
+                return None, None
+            position = min(bisect.bisect_right(axis, value) - 1, len(axis) - 2)
+            cell.append((position, (value - axis[position]) / (axis[position + 1] - axis[position])))
+        (i, ti), (j, tj), (k, tk) = cell
+
+        if ti in (0.0, 1.0) and tj in (0.0, 1.0) and tk in (0.0, 1.0):
+            return float(self.base_brf[i + int(ti), j + int(tj), k + int(tk)]), 'grid'
+        if not (self._cell_in_band[0][i] and self._cell_in_band[1][j] and self._cell_in_band[2][k]):
+            return None, None
+        if self.cell_error[i, j, k] * ERROR_SAFETY_FACTOR > self.error_bound:
+            return None, None
+
+        corners = self.base_brf[i:i + 2, j:j + 2, k:k + 2].tolist()
+        value = 0.0
+        for a, wi in ((0, 1 - ti), (1, ti)):
+            for b, wj in ((0, 1 - tj), (1, tj)):
+                for c, wk in ((0, 1 - tk), (1, tk)):
+                    value += wi * wj * wk * corners[a][b][c]
+        return value, 'interpolated'
+
+    def _array_base_brf(self, values):
+        """
+        Base BRF of many designs from the surface.
+        Returns:
+            (base_brf, grid_hit, served): base BRF (NaN where not served), and boolean arrays of the
+            designs on a grid point and of every design served from the surface
+        """
+        n = len(values[0])
+        positions, weights = [], []
+        inside = np.ones(n, dtype=bool)
+        on_grid = np.ones(n, dtype=bool)
+        in_band = np.ones(n, dtype=bool)
+        for value, axis, cell_in_band in zip(values, self.axes, self._cell_in_band):
+            position = np.clip(np.searchsorted(axis, value, side='right') - 1, 0, len(axis) - 2)
+            weight = (value - axis[position]) / (axis[position + 1] - axis[position])
+            inside &= (value >= axis[0]) & (value <= axis[-1])
+            on_grid &= (weight == 0) | (weight == 1)
+            in_band &= cell_in_band[position]
+            positions.append(position)
+            weights.append(np.where(np.isfinite(weight), weight, 0.0))
+
+        (i, j, k), (ti, tj, tk) = positions, weights
+        base_brf = np.zeros(n)
+        for a, wi in ((0, 1 - ti), (1, ti)):
+            for b, wj in ((0, 1 - tj), (1, tj)):
+                for c, wk in ((0, 1 - tk), (1, tk)):
+                    base_brf += wi * wj * wk * self.base_brf[i + a, j + b, k + c]
+
+        grid_hit = inside & on_grid
+        served = grid_hit | (inside & in_band & (self.cell_error[i, j, k] * ERROR_SAFETY_FACTOR <= self.error_bound))
+        base_brf[~served] = np.nan
+        return base_brf, grid_hit, served
+
+
+def build_surface(tables, deductibles=DEFAULT_DEDUCTIBLES, coinsurances=DEFAULT_COINSURANCES, moops=DEFAULT_MOOPS,
+                  engine=None, error_bound=DEFAULT_ERROR_BOUND, error_samples=DEFAULT_ERROR_SAMPLES):
+    """
+    Price every point of a design grid for one set of tables.
+    Args:
+        tables: Dictionary from load_reference_tables (or VersionedTableStore.get / TableReloader.current)
+        deductibles, coinsurances, moops: Grid axes
+        engine: Optional compiled DistributionEngine for the tables (built if not given)
+        error_bound: Largest interpolation error served without falling back to exact pricing
+        error_samples: Number of points per axis at which each cell's interpolation error is sampled
+    Returns:
+        A BRFSurface
+    """
+    axes = tuple(np.unique(np.asarray(axis, dtype=float)) for axis in (deductibles, coinsurances, moops))
+    if min(len(axis) for axis in axes) < 2:
+        raise ValueError("Every grid axis needs at least two points")
+    if engine is None:
+        engine = DistributionEngine.from_claims_probability(tables['claims_probability_distribution'])
+
+    grid = np.meshgrid(*axes, indexing='ij')
+    base_brf = engine.base_brf(*(points.ravel() for points in grid)).reshape(grid[0].shape)
+
+    #interpolation error of every cell, sampled on an error_samples^3 lattice inside the cell: the
+    #base BRF has kinks wherever a deductible, MOOP or corridor end crosses a claims bin, so one
+    #sample at the cell centre can miss them
+    fractions = np.arange(1, error_samples + 1) / (error_samples + 1)
+    shape = tuple(len(axis) - 1 for axis in axes)
+    cell_error = np.zeros(shape)
+    for ti in fractions:
+        for tj in fractions:
+            for tk in fractions:
+                weights = (ti, tj, tk)
+                points = np.meshgrid(*(axis[:-1] + weight * np.diff(axis) for axis, weight in zip(axes, weights)),
+                                     indexing='ij')
+                exact = engine.base_brf(*(point.ravel() for point in points)).reshape(shape)
+                interpolated = np.zeros(shape)
+                for a, wi in ((0, 1 - ti), (1, ti)):
+                    for b, wj in ((0, 1 - tj), (1, tj)):
+                        for c, wk in ((0, 1 - tk), (1, tk)):
+                            interpolated += wi * wj * wk * base_brf[a:a + shape[0], b:b + shape[1], c:c + shape[2]]
+                np.maximum(cell_error, np.abs(interpolated - exact), out=cell_error)
+
+    return BRFSurface(axes, base_brf, cell_error, tuple(tables[name] for name in THRESHOLD_TABLES),
+                      tuple(CompiledCopayTable(tables[name]) for name in COPAY_TABLES), engine,
+                      tables_hash=tables.get('tables_hash'), error_bound=error_bound)
+
+
+def load_or_build_surface(directory, tables, error_bound=DEFAULT_ERROR_BOUND, **grid):
+    """
+    Load the surface of a table version from a directory, building and saving it on first use.
+    The file is named after the tables' content hash, so each table version is built once.
+    Args:
+        directory: Directory holding the surface files
+        tables: Dictionary from load_reference_tables (must have tables_hash)
+        grid: Optional deductibles / coinsurances / moops axes for a new surface
+    """
+    file_path = os.path.join(directory, f"brf_surface_{tables['tables_hash'][:16]}.npz")
+    if os.path.exists(file_path):
+        return BRFSurface.load(file_path, tables_hash=tables['tables_hash'], error_bound=error_bound)
+    os.makedirs(directory, exist_ok=True)
+    surface = build_surface(tables, error_bound=error_bound, **grid)
+    #write to a temporary name first so a concurrent reader never sees a partial file
+    temp_path = f"{file_path}.{os.getpid()}.tmp.npz"
+    surface.save(temp_path)
+    os.replace(temp_path, file_path)
+    return surface
+
+
+#private helper methods
+def _cells_in_band(axis, threshold_data):
+    """
+    True for every grid cell [axis[i], axis[i + 1]] whose lower corner is in a band and which
+    has no band edge strictly inside it.
+    """
+    lower = calculate_indices_array(axis[:-1], threshold_data)
+    below_upper = calculate_indices_array(np.nextafter(axis[1:], -np.inf), threshold_data)
+    return (lower != MISSING_INDEX) & (lower == below_upper)
+
+
+def _scalar_band(value, threshold_data):
+    """Index of the first band containing a value, or None (as Plan._calculate_index)."""
+    for index, (low, high) in threshold_data.items():
+        if low <= value < high:
+            return index
+    return None
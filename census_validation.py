@@ -0,0 +1,249 @@
+"""
+Pre-flight validation of a whole census before pricing.
+
+A bad census row used to surface only once pricing reached it: a deductible outside every
+threshold band makes Plan._calculate_index return None and get_base_plan_index then fails with
+int(None), and batch pricing raises on the first out-of-band rows with copays. validate_census
+checks every row of a parsed census at once, with array operations against a RateBook, and
+returns one structured report of everything that is wrong, so a large batch fails before any
+pricing starts.
+
+Checks (severity in parentheses):
+    missing_column          a required census column is absent (error)
+    not_a_number            a value is present but is not a number (error)
+    out_of_band             a deductible, coinsurance or MOOP value is outside every threshold band
+                            (error when the row has a copay, which cannot be priced without a
+                            base plan index, warning otherwise)
+    copay_not_in_table      a copay amount is not in the copay table of the row's base plan index,
+                            so it is priced with a relativity of 1.0 (warning)
+    negative_enrollment     an enrollment count is below zero (error)
+    zero_enrollment         a plan has no enrollment and does not count in the group BRF (warning)
+    zero_total_enrollment   the census has no enrollment at all, so it has no group BRF (error)
+
+Usage:
+    python census_validation.py <census_file> [<census_file> ...] [--data-dir data_files]
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from batch_pricing import MISSING_INDEX
+from columnar_ingest import (CENSUS_COLUMNS, COPAY_COLUMNS, DESIGN_COLUMNS, ENROLLMENT_COLUMNS, FILE_FORMATS,
+                             apply_census_defaults, not_a_number)
+from rate_book import as_rate_book
+
+ERROR = 'error'
+WARNING = 'warning'
+
+#census-level issues (missing columns, zero total enrollment) have no row
+ISSUE_COLUMNS = ('row', 'column', 'check', 'severity', 'value')
+
+#copay column -> RateBook copay table attribute
+COPAY_TABLES = {'pcp': 'pcp_copay_data', 'spc': 'spc_copay_data', 'er': 'er_copay_data'}
+
+
+def validate_census(census, rate_book, raise_on_error=False):
+    """
+    Validate every row of a parsed census against the threshold bands and copay tables.
+    Args:
+        census: Dictionary of column name -> array-like, or a DataFrame, with the read_plans_from_csv
+                columns (deductible, coinsurance, moop, pcp, spc, er, ee, es, ec, ef; names may have spaces)
+        rate_book: RateBook (or a tuple of the seven table arguments) to validate against
+        raise_on_error: If True, raise a ValueError summarizing the report when it has any error
+    Returns:
+        Dictionary with:
+            valid: True if there are no errors (warnings are allowed)
+            n_rows: Number of census rows
+            missing_columns: Required columns not in the census
+            issues: DataFrame with one row per issue (row, column, check, severity, value);
+                    row is the 0-based census row, <NA> for census-level issues
+            counts: Dictionary of check -> number of issues
+            error_rows: Sorted list of rows with at least one error
+    """
+    rate_book = as_rate_book(rate_book)
+    raw = _strip_names(census)
+    n_rows = len(next(iter(raw.values()))) if raw else 0
+    issues = []
+
+    missing_columns = [column for column in CENSUS_COLUMNS if column not in raw]
+    for column in missing_columns:
+        issues.append(_census_issue(column, 'missing_column', ERROR, None))
+
+    #the numeric checks run on the columns that are present, with missing ones filled as blank
+    blank = np.full(n_rows, np.nan)
+    present = {column: raw.get(column, blank) for column in CENSUS_COLUMNS}
+    for column in CENSUS_COLUMNS:
+        if column in raw:
+            values = np.asarray(raw[column])
+            rows = np.flatnonzero(not_a_number(values))
+            issues.append(_row_issues(rows, column, 'not_a_number', ERROR, values))
+
+    columns = apply_census_defaults(present, errors='coerce')
+    has_copay = np.zeros(n_rows, dtype=bool)
+    for column in COPAY_COLUMNS:
+        has_copay |= np.nan_to_num(columns[column], nan=0.0) != 0
+
+    indices = rate_book.calculate_indices(columns['deductible'], columns['coinsurance'], columns['moop'])
+    deductible_index, moop_index, coinsurance_index, base_plan_index = indices
+    for column, index in zip(DESIGN_COLUMNS, (deductible_index, coinsurance_index, moop_index)):
+        if column in raw:
+            out_of_band = index == MISSING_INDEX
+            issues.append(_row_issues(np.flatnonzero(out_of_band & has_copay), column, 'out_of_band', ERROR,
+                                      columns[column]))
+            issues.append(_row_issues(np.flatnonzero(out_of_band & ~has_copay), column, 'out_of_band', WARNING,
+                                      columns[column]))
+
+    in_band = base_plan_index != MISSING_INDEX
+    for column, compiled in zip(COPAY_COLUMNS, rate_book.compiled_copays):
+        amounts = np.nan_to_num(columns[column], nan=0.0)
+        found = _copay_in_table(getattr(rate_book, COPAY_TABLES[column]), compiled, base_plan_index, amounts)
+        rows = np.flatnonzero(in_band & (amounts != 0) & ~found)
+        issues.append(_row_issues(rows, column, 'copay_not_in_table', WARNING, columns[column]))
+
+    for column in ENROLLMENT_COLUMNS:
+        if column in raw:
+            rows = np.flatnonzero(columns[column] < 0)
+            issues.append(_row_issues(rows, column, 'negative_enrollment', ERROR, columns[column]))
+    if not set(ENROLLMENT_COLUMNS) & set(missing_columns):
+        total_enrollment = columns['total_enrollment']
+        issues.append(_row_issues(np.flatnonzero(total_enrollment == 0), 'total_enrollment', 'zero_enrollment',
+                                  WARNING, total_enrollment))
+        if n_rows and total_enrollment.sum() == 0:
+            issues.append(_census_issue('total_enrollment', 'zero_total_enrollment', ERROR, 0))
+
+    report = _build_report(issues, n_rows, missing_columns)
+    if raise_on_error and not report['valid']:
+        raise ValueError(format_report(report))
+    return report
+
+
+def validate_census_file(file_path, rate_book, file_format=None, raise_on_error=False):
+    """
+    Read a whole census file (CSV, Parquet or Arrow IPC) and validate it with validate_census.
+    Args:
+        file_path: Path to the census file
+        rate_book: RateBook (or a tuple of the seven table arguments) to validate against
+        file_format: 'csv', 'parquet', 'arrow' or 'arrow_stream' (guessed from the extension if None)
+        raise_on_error: If True, raise a ValueError summarizing the report when it has any error
+    Returns:
+        Validation report (see validate_census), with the file path under 'file'
+    """
+    if file_format is None:
+        file_format = FILE_FORMATS.get(os.path.splitext(file_path)[1].lower())
+    if file_format == 'csv':
+        census = pd.read_csv(file_path)
+    elif file_format == 'parquet':
+        census = pd.read_parquet(file_path)
+    elif file_format in ('arrow', 'arrow_stream'):
+        import pyarrow as pa
+        import pyarrow.ipc as ipc
+
+        with pa.OSFile(file_path, 'rb') as source:
+            reader = ipc.open_file(source) if file_format == 'arrow' else ipc.open_stream(source)
+            census = reader.read_all().to_pandas()
+    else:
+        raise ValueError(f"Unsupported census file format for {file_path}: {file_format}")
+
+    report = validate_census(census, rate_book)
+    report['file'] = file_path
+    if raise_on_error and not report['valid']:
+        raise ValueError(format_report(report))
+    return report
+
+
+def format_report(report, max_rows=10):
+    """
+    One-paragraph summary of a validation report, listing the first rows of every check.
+    """
+    issues = report['issues']
+    n_errors = int((issues['severity'] == ERROR).sum())
+    n_warnings = int((issues['severity'] == WARNING).sum())
+    source = f" {report['file']}" if 'file' in report else ''
+    lines = [f"Census{source} has {n_errors} error(s) in {len(report['error_rows'])} row(s) "
+             f"and {n_warnings} warning(s) over {report['n_rows']} row(s)."]
+    for (check, severity, column), group in issues.groupby(['check', 'severity', 'column'], sort=False):
+        rows = group['row'].dropna().astype(int).tolist()
+        where = f" at rows {rows[:max_rows]}" + (" ..." if len(rows) > max_rows else '') if rows else ''
+        lines.append(f"  {severity}: {check} in {column} ({len(group)}){where}")
+    return '\n'.join(lines)
+
+
+#private helper methods
+def _strip_names(census):
+    """Census columns keyed by stripped column name (the first column is the plan name, as in read_plans_from_csv)."""
+    if isinstance(census, pd.DataFrame):
+        return {str(name).strip(): census[name].to_numpy() for name in census.columns}
+    return {str(name).strip(): values for name, values in census.items()}
+
+
+def _copay_in_table(copay_data, compiled, base_plan_index, amounts):
+    """
+    True where the (base plan index, copay amount) pair is in the copay table
+    (the compiled table cannot tell a missing pair from a stored relativity of 1.0).
+    """
+    if not len(compiled.base_indices) or not len(compiled.amounts):
+        return np.zeros(len(amounts), dtype=bool)
+    stored = np.zeros(compiled.values.shape, dtype=bool)
+    for row, base_index in enumerate(compiled.base_indices.tolist()):
+        stored[row, np.searchsorted(compiled.amounts, np.array(list(copay_data[base_index]), dtype=float))] = True
+    rows = np.searchsorted(compiled.base_indices, base_plan_index)
+    columns = np.searchsorted(compiled.amounts, amounts)
+    rows_clipped = np.minimum(rows, len(compiled.base_indices) - 1)
+    columns_clipped = np.minimum(columns, len(compiled.amounts) - 1)
+    return ((compiled.base_indices[rows_clipped] == base_plan_index) & (compiled.amounts[columns_clipped] == amounts)
+            & stored[rows_clipped, columns_clipped])
+
+
+def _row_issues(rows, column, check, severity, values):
+    """Issues of one check on one column, as a DataFrame (one row per failing census row)."""
+    return pd.DataFrame({'row': pd.array(rows, dtype='Int64'), 'column': column, 'check': check,
+                         'severity': severity, 'value': pd.Series(np.asarray(values)[rows], dtype=object)})
+
+
+def _census_issue(column, check, severity, value):
+    """A census-level issue (no row), as a one-row DataFrame."""
+    return pd.DataFrame({'row': pd.array([None], dtype='Int64'), 'column': [column], 'check': [check],
+                         'severity': [severity], 'value': pd.Series([value], dtype=object)})
+
+
+def _build_report(issues, n_rows, missing_columns):
+    """Assemble the validation report from the per-check issue frames."""
+    issues = [frame for frame in issues if len(frame)]
+    if issues:
+        issues = pd.concat(issues, ignore_index=True)
+    else:
+        issues = _census_issue(None, None, None, None).iloc[:0]
+    issues = issues.sort_values('row', kind='stable', na_position='first').reset_index(drop=True)
+    errors = issues[issues['severity'] == ERROR]
+    return {
+        'valid': errors.empty,
+        'n_rows': n_rows,
+        'missing_columns': missing_columns,
+        'issues': issues,
+        'counts': issues['check'].value_counts(sort=False).to_dict(),
+        'error_rows': sorted(errors['row'].dropna().astype(int).unique().tolist())
+    }
+
+
+if __name__ == "__main__":
+    arguments = sys.argv[1:]
+    data_dir = 'data_files'
+    if '--data-dir' in arguments:
+        position = arguments.index('--data-dir')
+        data_dir = arguments[position + 1]
+        del arguments[position:position + 2]
+    if not arguments:
+        print(__doc__)
+        sys.exit(1)
+
+    from rate_book import RateBook
+
+    book = RateBook.from_data_dir(data_dir)
+    failed = 0
+    for census_path in arguments:
+        census_report = validate_census_file(census_path, book)
+        failed += not census_report['valid']
+        print(format_report(census_report))
+    sys.exit(1 if failed else 0)
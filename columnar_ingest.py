@@ -0,0 +1,252 @@
+"""
+Columnar census ingest from Parquet and Arrow IPC (Feather) files.
+
+read_plans_from_csv builds one Plan object per row. Census exports from the warehouse are
+Parquet, and for large books it is much cheaper to read only the columns pricing needs
+straight into arrays and hand them to batch_pricing.price_plan_columns. The same NaN/blank
+defaulting rules as read_plans_from_csv are applied. Text that is not a number (e.g. 'n/a' or
+'$1,500') raises a ValueError rather than defaulting to 0; census_validation reports every such
+value at once.
+
+Requires pyarrow for Parquet and Arrow files (CSV files are read with pandas).
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from batch_pricing import price_plan_columns, weighted_group_brf
+
+DESIGN_COLUMNS = ('deductible', 'coinsurance', 'moop')
+COPAY_COLUMNS = ('pcp', 'spc', 'er')
+ENROLLMENT_COLUMNS = ('ee', 'es', 'ec', 'ef')
+CENSUS_COLUMNS = DESIGN_COLUMNS + COPAY_COLUMNS + ENROLLMENT_COLUMNS
+
+#file extension -> format name
+FILE_FORMATS = {
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+    '.ipc': 'arrow',
+    '.arrows': 'arrow_stream',
+    '.csv': 'csv'
+}
+
+
+def read_plan_columns(file_path, file_format=None, memory_map=False, include_names=True):
+    """
+    Read the census columns of a plan file into arrays, without building Plan objects.
+    Args:
+        file_path: Path to a Parquet, Arrow IPC (file or stream) or CSV census file
+        file_format: 'parquet', 'arrow', 'arrow_stream' or 'csv' (guessed from the extension if None)
+        memory_map: If True, memory-map Parquet/Arrow files instead of reading them into memory
+        include_names: If True, also read the plan name column (the first column)
+    Returns:
+        Dictionary of arrays with plan_name (if requested), deductible, coinsurance, moop,
+        pcp, spc, er (NaN when missing), ee, es, ec, ef and total_enrollment
+    Raises a ValueError if a census value is text that is not a number (see to_float).
+    """
+    return apply_census_defaults(_read_raw_columns(file_path, file_format, memory_map, include_names))
+
+
+def apply_census_defaults(raw_columns, errors='raise'):
+    """
+    Apply the read_plans_from_csv defaulting rules to raw census columns.
+    Blank or NaN deductible, coinsurance, moop and enrollment become 0, blank or NaN copays
+    stay missing (NaN), and copays and enrollment are truncated to whole numbers.
+    Args:
+        raw_columns: Dictionary of column name -> array-like (optionally with plan_name)
+        errors: Policy for text that is not a number (see to_float): 'raise' or 'coerce' (treated as blank)
+    Returns:
+        Dictionary of numpy arrays (see read_plan_columns)
+    """
+    missing = [column for column in CENSUS_COLUMNS if column not in raw_columns]
+    if missing:
+        raise ValueError(f"Census is missing required columns: {missing}")
+
+    columns = {}
+    for column in DESIGN_COLUMNS:
+        columns[column] = np.nan_to_num(to_float(raw_columns[column], errors, column), nan=0.0)
+    for column in COPAY_COLUMNS:
+        columns[column] = np.trunc(to_float(raw_columns[column], errors, column))
+    for column in ENROLLMENT_COLUMNS:
+        columns[column] = np.trunc(np.nan_to_num(to_float(raw_columns[column], errors, column),
+                                                 nan=0.0)).astype(np.int64)
+    columns['total_enrollment'] = columns['ee'] + columns['es'] + columns['ec'] + columns['ef']
+
+    if 'plan_name' in raw_columns:
+        names = pd.Series(raw_columns['plan_name'], dtype=object)
+        defaults = pd.Series([f"plan_{i + 1}" for i in range(len(names))], dtype=object)
+        columns['plan_name'] = names.where(names.notna(), defaults).astype(str).to_numpy(dtype=object)
+    return columns
+
+
+def to_float(values, errors='raise', column=None):
+    """
+    Convert a census column to float. Blanks (None, NaN, empty text, 'None' and 'nan') become NaN.
+    Args:
+        values: Array-like column
+        errors: 'raise' to raise a ValueError listing the rows holding text that is not a number,
+                or 'coerce' to make them NaN (census_validation reports them as not_a_number)
+        column: Column name used in the error message
+    Returns:
+        float64 numpy array
+    """
+    if errors not in ('raise', 'coerce'):
+        raise ValueError(f"errors must be 'raise' or 'coerce', not {errors!r}")
+    values = np.asarray(values)
+    if values.dtype.kind in 'fiub':
+        return values.astype(float)
+    text = pd.Series(values, dtype=object).astype(str).str.strip()
+    blank = _blank(values)
+    result = pd.to_numeric(text.where(~blank), errors='coerce').to_numpy(dtype=float)
+    if errors == 'raise':
+        rows = np.flatnonzero(~blank & np.isnan(result))
+        if len(rows):
+            shown = ', '.join(f"{row}: {values[row]!r}" for row in rows[:10])
+            more = f" and {len(rows) - 10} more" if len(rows) > 10 else ""
+            name = f"Census column {column!r}" if column else "Census column"
+            raise ValueError(f"{name} has values that are not numbers (row: value): {shown}{more}")
+    return result
+
+
+def not_a_number(values):
+    """
+    True where a census value is present (not blank, see to_float) but is not a number.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind in 'fiub':
+        return np.zeros(len(values), dtype=bool)
+    return ~_blank(values) & np.isnan(to_float(values, errors='coerce'))
+
+
+def price_columnar_census(file_path, claims_probability_distribution, deductible_threshold_data=None,
+                          coinsurance_threshold_data=None, moop_threshold_data=None,
+                          pcp_copay_data=None, spc_copay_data=None, er_copay_data=None,
+                          engine=None, file_format=None, memory_map=False, validate=True,
+                          audit_log=None, group_id=None):
+    """
+    Read a columnar census file and price it with batch pricing, without building Plan objects.
+    With validate=True the whole census is checked first (census_validation.validate_census) and
+    a ValueError summarizing every error is raised before anything is priced. With an
+    audit_log (audit_log.AuditLog) the priced group is recorded under group_id (the file name
+    without extension by default).
+
+    Returns:
+        Dictionary with columns (from read_plan_columns), results (from price_plan_columns)
+        and group_brf (enrollment-weighted average plan BRF)
+    """
+    raw = _read_raw_columns(file_path, file_format, memory_map, True)
+    if validate:
+        from census_validation import validate_census
+        from rate_book import RateBook
+
+        rate_book = claims_probability_distribution
+        if not isinstance(rate_book, RateBook):
+            rate_book = RateBook(claims_probability_distribution, deductible_threshold_data,
+                                 coinsurance_threshold_data, moop_threshold_data,
+                                 pcp_copay_data, spc_copay_data, er_copay_data, engine=engine)
+        validate_census(raw, rate_book, raise_on_error=True)
+        claims_probability_distribution = rate_book
+    columns = apply_census_defaults(raw)
+    results = price_plan_columns(columns, claims_probability_distribution, deductible_threshold_data,
+                                 coinsurance_threshold_data, moop_threshold_data,
+                                 pcp_copay_data, spc_copay_data, er_copay_data, engine=engine)
+    group_brf = weighted_group_brf(results['plan_brf'], columns['total_enrollment'])
+    if audit_log is not None:
+        if group_id is None:
+            group_id = os.path.splitext(os.path.basename(file_path))[0]
+        from rate_book import RateBook
+
+        tables_hash = None
+        if isinstance(claims_probability_distribution, RateBook):
+            tables_hash = claims_probability_distribution.tables_hash
+        audit_log.record_group(group_id, columns, results, group_brf, tables_hash=tables_hash, file=file_path)
+    return {'columns': columns, 'results': results, 'group_brf': group_brf}
+
+
+#private helper methods
+def _read_raw_columns(file_path, file_format, memory_map, include_names):
+    """
+    Read the census columns of a file as stored, before the defaulting rules.
+    """
+    if file_format is None:
+        file_format = FILE_FORMATS.get(os.path.splitext(file_path)[1].lower())
+    if file_format not in ('parquet', 'arrow', 'arrow_stream', 'csv'):
+        raise ValueError(f"Unsupported census file format for {file_path}: {file_format}")
+
+    if file_format == 'csv':
+        return _read_csv_columns(file_path, include_names)
+    return _read_arrow_columns(file_path, file_format, memory_map, include_names)
+
+
+def _read_arrow_columns(file_path, file_format, memory_map, include_names):
+    """
+    Read only the needed columns from a Parquet or Arrow IPC file with pyarrow.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        import pyarrow.ipc as ipc
+    except ImportError:
+        raise ImportError("pyarrow is required to read Parquet and Arrow census files (pip install pyarrow)")
+
+    if file_format == 'parquet':
+        schema_names = pq.read_schema(file_path).names
+        wanted = _select_columns(schema_names, include_names)
+        table = pq.read_table(file_path, columns=list(wanted), memory_map=memory_map)
+    else:
+        with (pa.memory_map(file_path, 'r') if memory_map else pa.OSFile(file_path, 'rb')) as source:
+            reader = ipc.open_file(source) if file_format == 'arrow' else ipc.open_stream(source)
+            wanted = _select_columns(reader.schema.names, include_names)
+            if file_format == 'arrow':
+                #record batches are sliced to the wanted columns one at a time
+                batches = [reader.get_batch(i).select(list(wanted)) for i in range(reader.num_record_batches)]
+            else:
+                batches = [batch.select(list(wanted)) for batch in reader]
+            table = pa.Table.from_batches(batches, schema=pa.schema([reader.schema.field(name) for name in wanted]))
+            #copy the columns out while the file (or memory map) is still open, since
+            #to_numpy can return views into the mapped buffers
+            return {key: np.array(table.column(name).to_numpy(zero_copy_only=False), copy=True)
+                    for name, key in wanted.items()}
+
+    return {key: table.column(name).to_numpy(zero_copy_only=False) for name, key in wanted.items()}
+
+
+def _read_csv_columns(file_path, include_names):
+    """
+    Read only the needed columns from a CSV census file with pandas.
+    """
+    header = pd.read_csv(file_path, nrows=0).columns
+    wanted = _select_columns(list(header), include_names)
+    df = pd.read_csv(file_path, usecols=list(wanted))
+    return {key: df[name].to_numpy() for name, key in wanted.items()}
+
+
+def _select_columns(names, include_names):
+    """
+    Map file column names (possibly with spaces) to census fields.
+    The plan name is the first column, as in read_plans_from_csv.
+    Returns:
+        Dictionary of file column name -> census field, in file order
+    """
+    stripped = {name.strip(): name for name in names}
+    missing = [column for column in CENSUS_COLUMNS if column not in stripped]
+    if missing:
+        raise ValueError(f"Census is missing required columns: {missing}")
+
+    wanted = {}
+    if include_names and names and names[0].strip() not in CENSUS_COLUMNS:
+        wanted[names[0]] = 'plan_name'
+    for column in CENSUS_COLUMNS:
+        wanted[stripped[column]] = column
+    return wanted
+
+
+def _blank(values):
+    """
+    True where a text or object column value is blank: None, NaN, empty text, 'None' or 'nan'.
+    """
+    series = pd.Series(values, dtype=object)
+    return (series.isna() | series.astype(str).str.strip().isin(['', 'None', 'nan'])).to_numpy()
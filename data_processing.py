@@ -1,9 +1,10 @@
 import pandas as pd
 import csv 
 import numpy as np
+import hashlib
 import json
 import os
-from datetime import datetime
+from datetime import date, datetime
 
 BASE_RATE = 506.43
 
@@ -103,6 +104,78 @@ def read_claims_probability(file_path):
     
     return df, starting_point
 
+#reference table argument name -> CSV path inside a data directory (same layout as data_files/)
+REFERENCE_TABLE_FILES = {
+    'claims_probability_distribution': 'claims_probability_distribution.csv',
+    'deductible_threshold_data': 'thresholds/threshold_match_deductible.csv',
+    'coinsurance_threshold_data': 'thresholds/threshold_match_coinsurance.csv',
+    'moop_threshold_data': 'thresholds/threshold_match_moop.csv',
+    'pcp_copay_data': 'copays/pcp_copays.csv',
+    'spc_copay_data': 'copays/spc_copays.csv',
+    'er_copay_data': 'copays/er_copays.csv'
+}
+
+def load_reference_tables(data_dir='data_files'):
+    """
+    Read every reference table from a data directory laid out like data_files/.
+    Args:
+        data_dir: Directory holding the claims probability, threshold and copay CSVs
+    Returns:
+        Dictionary keyed by the calculate_plan_brf argument names (claims_probability_distribution,
+        deductible_threshold_data, ...), plus starting_point and tables_hash (see reference_tables_hash)
+    """
+    tables = {'tables_hash': combine_table_hashes(hash_reference_files(data_dir))}
+    for name, relative_path in REFERENCE_TABLE_FILES.items():
+        file_path = os.path.join(data_dir, relative_path)
+        if name == 'claims_probability_distribution':
+            tables[name], tables['starting_point'] = read_claims_probability(file_path)
+        elif name.endswith('_threshold_data'):
+            tables[name] = read_threshold_data(file_path)
+        else:
+            tables[name] = read_copay_data(file_path)
+    return tables
+
+def hash_file(file_path):
+    """Returns the SHA-256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def iso_date(value):
+    """Convert a date, datetime or ISO string to a YYYY-MM-DD string."""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+def hash_reference_files(data_dir='data_files'):
+    """
+    SHA-256 of every reference table CSV in a data directory.
+    Returns:
+        Dictionary of table name -> hex digest
+    """
+    return {name: hash_file(os.path.join(data_dir, relative_path))
+            for name, relative_path in REFERENCE_TABLE_FILES.items()}
+
+def combine_table_hashes(file_hashes):
+    """
+    Combine per-table hashes into one content hash identifying a full set of reference tables.
+    """
+    digest = hashlib.sha256()
+    for name in sorted(file_hashes):
+        digest.update(f"{name}={file_hashes[name]};".encode())
+    return digest.hexdigest()
+
+def reference_tables_hash(data_dir='data_files'):
+    """
+    Content hash of the reference tables in a data directory. Unlike the JSON metadata
+    version, it changes as soon as any CSV is edited.
+    """
+    return combine_table_hashes(hash_reference_files(data_dir))
+
 def read_plans_from_csv(file_path):
     """
     Read plan data from a CSV file and return a list of Plan objects.
@@ -0,0 +1,215 @@
+"""
+On-disk cache of priced plan designs, shared by every process on a machine.
+
+Nightly jobs, notebooks and the quote tool reprice the same designs against the same tables,
+and an in-process cache does not help across processes. DesignCache keeps the indices, base
+BRF, copay BRF and plan BRF of each design in a SQLite file, keyed by the normalized design
+tuple (quote_store.design_key) and the reference table content hash
+(load_reference_tables()['tables_hash']), so editing a table never serves stale results.
+
+The database runs in WAL mode, so any number of processes read while one writes, and writers
+wait on a busy timeout instead of failing. The cache is bounded to max_entries designs: when a
+write takes it over the bound, the least recently used designs are evicted down to
+EVICT_TO_FRACTION of the bound. Hits only update the recency in memory and are written with the
+next write (or flush()), so reads never take the write lock.
+
+Plan.calculate_plan_brf and batch_pricing.price_plan_columns consult the cache before any
+computation when they are given one (cache=..., tables_hash=...).
+"""
+import sqlite3
+import threading
+import time
+
+from quote_store import design_key
+
+DEFAULT_CACHE_PATH = 'design_cache.db'
+DEFAULT_MAX_ENTRIES = 1000000
+DEFAULT_BUSY_TIMEOUT = 30.0
+EVICT_TO_FRACTION = 0.9
+
+#rows are looked up in batches of at most this many keys (SQLite bound parameter limit)
+LOOKUP_BATCH_SIZE = 500
+
+RESULT_FIELDS = ('deductible_index', 'moop_index', 'coinsurance_index', 'base_plan_index',
+                 'base_brf', 'copay_brf', 'plan_brf')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS designs (
+    tables_hash TEXT NOT NULL,
+    design_key TEXT NOT NULL,
+    deductible_index INTEGER,
+    moop_index INTEGER,
+    coinsurance_index INTEGER,
+    base_plan_index INTEGER,
+    base_brf REAL NOT NULL,
+    copay_brf REAL NOT NULL,
+    plan_brf REAL NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (tables_hash, design_key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_designs_last_used ON designs (last_used);
+"""
+
+
+class DesignCache:
+    def __init__(self, db_path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES, busy_timeout=DEFAULT_BUSY_TIMEOUT):
+        """
+        Open (or create) a design cache. Each process (and each DesignCache) has its own connection;
+        one DesignCache can be shared by the threads of a process.
+        Args:
+            db_path: Path of the SQLite cache file
+            max_entries: Maximum number of cached designs (over all table hashes)
+            busy_timeout: Seconds a writer waits for another process's write to finish
+        """
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._touched = {}
+        self._stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+        self._connection = sqlite3.connect(db_path, timeout=busy_timeout, isolation_level=None,
+                                           check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+
+    def get(self, design, tables_hash):
+        """
+        Returns the cached results of one design tuple (deductible, coinsurance, moop, pcp, spc, er)
+        as a dictionary of RESULT_FIELDS (indices are None when out of band), or None on a miss.
+        """
+        return self.get_many([design], tables_hash)[0]
+
+    def get_many(self, designs, tables_hash):
+        """
+        Returns the cached results of many design tuples, one dictionary (or None on a miss) per design.
+        """
+        keys = [design_key(design) for design in designs]
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            for start in range(0, len(unique_keys), LOOKUP_BATCH_SIZE):
+                batch = unique_keys[start:start + LOOKUP_BATCH_SIZE]
+                rows = self._connection.execute(
+                    f"SELECT design_key, {', '.join(RESULT_FIELDS)} FROM designs "
+                    f"WHERE tables_hash = ? AND design_key IN ({', '.join('?' * len(batch))})",
+                    [tables_hash] + batch)
+                for row in rows:
+                    found[row[0]] = dict(zip(RESULT_FIELDS, row[1:]))
+            now = time.time()
+            for key in found:
+                self._touched[(tables_hash, key)] = now
+            results = [found.get(key) for key in keys]
+            hits = sum(result is not None for result in results)
+            self._stats['hits'] += hits
+            self._stats['misses'] += len(results) - hits
+        return results
+
+    def put(self, design, tables_hash, results):
+        """
+        Cache the results of one design (a dictionary with the RESULT_FIELDS).
+        """
+        self.put_many([design], tables_hash, [results])
+
+    def put_many(self, designs, tables_hash, results):
+        """
+        Cache the results of many designs in one transaction, then evict down to the size bound if needed.
+        Args:
+            designs: List of design tuples
+            tables_hash: Content hash of the tables the designs were priced on
+            results: List of dictionaries with the RESULT_FIELDS (missing indices as None), one per design
+        """
+        now = time.time()
+        rows = [(tables_hash, design_key(design)) + tuple(_field(result, field) for field in RESULT_FIELDS) + (now,)
+                for design, result in zip(designs, results)]
+        with self._lock, self._write_transaction():
+            self._connection.executemany(
+                f"INSERT OR REPLACE INTO designs (tables_hash, design_key, {', '.join(RESULT_FIELDS)}, last_used) "
+                f"VALUES ({', '.join('?' * (len(RESULT_FIELDS) + 3))})", rows)
+            self._stats['writes'] += len(rows)
+            self._flush_touched()
+            self._evict()
+
+    def flush(self):
+        """Write the recency of cache hits since the last write."""
+        with self._lock:
+            if self._touched:
+                with self._write_transaction():
+                    self._flush_touched()
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM designs").fetchone()[0]
+
+    def stats(self):
+        """Returns the hits, misses, writes and evictions of this DesignCache, and the number of cached designs."""
+        return dict(self._stats, entries=len(self))
+
+    def clear(self, tables_hash=None):
+        """Remove every cached design (or only those priced on one table hash)."""
+        with self._lock, self._write_transaction():
+            if tables_hash is None:
+                self._connection.execute("DELETE FROM designs")
+            else:
+                self._connection.execute("DELETE FROM designs WHERE tables_hash = ?", (tables_hash,))
+
+    def close(self):
+        """Flush the hit recency and close the database connection."""
+        self.flush()
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    #private helper methods
+    def _write_transaction(self):
+        """
+        Context manager for a write transaction. BEGIN IMMEDIATE takes the write lock up front,
+        so a concurrent writer waits on the busy timeout instead of failing mid-transaction.
+        """
+        return _Transaction(self._connection)
+
+    def _flush_touched(self):
+        """Write the pending hit times (the caller holds the lock and the transaction)."""
+        if self._touched:
+            self._connection.executemany(
+                "UPDATE designs SET last_used = MAX(last_used, ?) WHERE tables_hash = ? AND design_key = ?",
+                [(last_used, tables_hash, key) for (tables_hash, key), last_used in self._touched.items()])
+            self._touched = {}
+
+    def _evict(self):
+        """Evict the least recently used designs once the cache is over max_entries (inside the transaction)."""
+        entries = self._connection.execute("SELECT COUNT(*) FROM designs").fetchone()[0]
+        if entries <= self.max_entries:
+            return
+        n_evict = entries - int(self.max_entries * EVICT_TO_FRACTION)
+        self._connection.execute(
+            "DELETE FROM designs WHERE (tables_hash, design_key) IN "
+            "(SELECT tables_hash, design_key FROM designs ORDER BY last_used LIMIT ?)", (n_evict,))
+        self._stats['evictions'] += n_evict
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT (ROLLBACK on error) on an autocommit connection."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+        return self.connection
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.connection.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+def _field(result, field):
+    """Returns a result field as a plain int / float (None for missing indices)."""
+    value = result[field]
+    if value is None:
+        return None
+    return float(value) if field.endswith('brf') else int(value)
@@ -0,0 +1,163 @@
+"""
+Design deduplication before pricing.
+
+A book holds thousands of plan rows but only a handful of distinct plan designs
+(deductible, coinsurance, moop, pcp, spc, er), and the BRF depends on nothing else. This
+stage factorizes the designs, prices each unique design once and scatters the results back
+to every row through the inverse index, so the pricing work scales with the number of
+distinct designs rather than with the number of plans.
+
+Unique designs are priced through Plan.calculate_plan_brf() (the reference path), or through
+batch_pricing.price_plan_columns when a compiled DistributionEngine or a RateBook is given.
+"""
+import numpy as np
+import pandas as pd
+
+from Plan import Plan
+from batch_pricing import (MISSING_INDEX, PLAN_DESIGN_COLUMNS, aggregate_group_brfs, price_plan_columns,
+                           plans_to_columns, weighted_group_brf)
+from rate_book import RateBook
+
+RESULT_COLUMNS = ('deductible_index', 'moop_index', 'coinsurance_index', 'base_plan_index',
+                  'base_brf', 'copay_brf', 'plan_brf')
+COPAY_COLUMNS = ('pcp', 'spc', 'er')
+
+
+def factorize_designs(columns):
+    """
+    Find the unique plan designs in columns of plans.
+    Missing copays (NaN and 0) price the same, so they are treated as one value (NaN).
+    Args:
+        columns: Dictionary (or DataFrame) with deductible, coinsurance, moop, pcp, spc and er arrays
+    Returns:
+        (unique, inverse): dictionary of design arrays for the unique designs, and the int64 array
+        mapping each row to its unique design (so unique[name][inverse] == columns[name])
+    """
+    designs = np.column_stack([np.asarray(columns[name], dtype=float) for name in PLAN_DESIGN_COLUMNS])
+    n_rows = designs.shape[0]
+    if n_rows == 0:
+        return {name: np.empty(0) for name in PLAN_DESIGN_COLUMNS}, np.empty(0, dtype=np.int64)
+
+    #missing copays are factorized as 0 and restored as NaN afterwards
+    copays = designs[:, len(PLAN_DESIGN_COLUMNS) - len(COPAY_COLUMNS):]
+    copays[np.isnan(copays)] = 0.0
+
+    #hash-factorize column by column (linear time, no sort of the rows)
+    #the combined code is re-factorized after every column, so it stays below n_rows and cannot overflow
+    inverse = np.zeros(n_rows, dtype=np.int64)
+    for position in range(designs.shape[1]):
+        codes, uniques = pd.factorize(designs[:, position])
+        inverse, _ = pd.factorize(inverse * len(uniques) + codes)
+    first_row = np.empty(inverse.max() + 1, dtype=np.int64)
+    first_row[inverse] = np.arange(n_rows)
+
+    unique = {name: designs[first_row, position] for position, name in enumerate(PLAN_DESIGN_COLUMNS)}
+    for name in COPAY_COLUMNS:
+        unique[name][unique[name] == 0] = np.nan
+    return unique, inverse.astype(np.int64)
+
+
+def price_unique_designs(unique, claims_probability_distribution, deductible_threshold_data=None,
+                         coinsurance_threshold_data=None, moop_threshold_data=None,
+                         pcp_copay_data=None, spc_copay_data=None, er_copay_data=None, engine=None):
+    """
+    Price design columns, one Plan.calculate_plan_brf() per design (or price_plan_columns with an
+    engine or a RateBook, passed in place of the seven tables).
+    Returns:
+        Dictionary of arrays, as price_plan_columns
+    """
+    if engine is not None or isinstance(claims_probability_distribution, RateBook):
+        return price_plan_columns(unique, claims_probability_distribution, deductible_threshold_data,
+                                  coinsurance_threshold_data, moop_threshold_data,
+                                  pcp_copay_data, spc_copay_data, er_copay_data, engine=engine)
+
+    n_designs = len(unique['deductible'])
+    results = {name: np.full(n_designs, MISSING_INDEX, dtype=np.int64) for name in RESULT_COLUMNS[:4]}
+    results.update({name: np.empty(n_designs) for name in RESULT_COLUMNS[4:]})
+    for position in range(n_designs):
+        plan = Plan(position, None, float(unique['deductible'][position]), float(unique['coinsurance'][position]),
+                    float(unique['moop'][position]), *(_copay(unique[name][position]) for name in COPAY_COLUMNS))
+        plan.calculate_plan_brf(claims_probability_distribution, deductible_threshold_data,
+                                coinsurance_threshold_data, moop_threshold_data,
+                                pcp_copay_data, spc_copay_data, er_copay_data)
+
+        indices = (plan.deductible_index, plan.moop_index, plan.coinsurance_index)
+        for name, index in zip(RESULT_COLUMNS[:3], indices):
+            if index is not None:
+                results[name][position] = index
+        if None not in indices:
+            results['base_plan_index'][position] = plan.get_base_plan_index()
+        results['base_brf'][position] = plan.base_brf
+        results['copay_brf'][position] = plan.copay_brf
+        results['plan_brf'][position] = plan.plan_brf
+    return results
+
+
+def price_plan_columns_dedup(columns, claims_probability_distribution, deductible_threshold_data=None,
+                             coinsurance_threshold_data=None, moop_threshold_data=None,
+                             pcp_copay_data=None, spc_copay_data=None, er_copay_data=None, engine=None):
+    """
+    Same results as price_plan_columns, pricing each unique design once.
+    Args:
+        columns: Dictionary (or DataFrame) with deductible, coinsurance, moop, pcp, spc and er arrays
+        claims_probability_distribution ... er_copay_data: Reference tables, or a RateBook in place of all seven
+        engine: Optional compiled DistributionEngine (unique designs are priced through Plan objects
+                without one or a RateBook)
+    Returns:
+        (results, report): dictionary of result arrays for every row, and a dictionary with
+        n_plans, n_unique_designs and dedup_ratio (plans per unique design)
+    """
+    unique, inverse = factorize_designs(columns)
+    unique_results = price_unique_designs(unique, claims_probability_distribution, deductible_threshold_data,
+                                          coinsurance_threshold_data, moop_threshold_data,
+                                          pcp_copay_data, spc_copay_data, er_copay_data, engine=engine)
+    results = {name: np.asarray(unique_results[name])[inverse] for name in RESULT_COLUMNS}
+    return results, _dedup_report(len(inverse), len(unique['deductible']))
+
+
+def calculate_group_brfs_dedup(groups, claims_probability_distribution, deductible_threshold_data=None,
+                               coinsurance_threshold_data=None, moop_threshold_data=None,
+                               pcp_copay_data=None, spc_copay_data=None, er_copay_data=None, engine=None, zero_enrollment='raise'):
+    """
+    Calculate the group BRF of many groups, deduplicating designs across the whole book.
+    The Plan objects are not modified.
+    Args:
+        groups: Dictionary of group_id -> list of Plan objects
+        claims_probability_distribution ... er_copay_data: Reference tables, or a RateBook in place of all seven
+        engine: Optional compiled DistributionEngine (see price_plan_columns_dedup)
+        zero_enrollment: Policy for groups with zero total enrollment (see batch_pricing.aggregate_group_brfs)
+    Returns:
+        (group_brfs, report): dictionary of group_id -> group BRF, and the dedup report
+    """
+    group_ids = list(groups)
+    all_plans = [plan for group_id in group_ids for plan in groups[group_id]]
+    columns = plans_to_columns(all_plans)
+    results, report = price_plan_columns_dedup(columns, claims_probability_distribution, deductible_threshold_data,
+                                               coinsurance_threshold_data, moop_threshold_data,
+                                               pcp_copay_data, spc_copay_data, er_copay_data, engine=engine)
+
+    group_codes = np.repeat(np.arange(len(group_ids)), [len(groups[group_id]) for group_id in group_ids])
+    aggregated = aggregate_group_brfs(group_codes, results['plan_brf'], columns['total_enrollment'],
+                                      zero_enrollment=zero_enrollment)
+    group_brfs = dict(zip((group_ids[code] for code in aggregated['group_key'].tolist()),
+                          aggregated['group_brf'].tolist()))
+    #groups without plans never reach the reduction
+    for group_id in group_ids:
+        if group_id not in group_brfs:
+            group_brfs[group_id] = weighted_group_brf([], [], zero_enrollment=zero_enrollment)
+    return {group_id: group_brfs[group_id] for group_id in group_ids}, report
+
+
+#private helper methods
+def _copay(value):
+    """Missing copays (NaN) become None, as read_plans_from_csv stores them on a Plan."""
+    return None if np.isnan(value) else float(value)
+
+
+def _dedup_report(n_plans, n_unique_designs):
+    """Returns the dedup report of a pricing stage."""
+    return {
+        'n_plans': n_plans,
+        'n_unique_designs': n_unique_designs,
+        'dedup_ratio': n_plans / n_unique_designs if n_unique_designs else 1.0
+    }
@@ -0,0 +1,336 @@
+"""
+Coordinator / worker mode for repricing a whole book across machines.
+
+The coordinator splits the group census files into shards and serves them over TCP
+(multiprocessing.connection, authenticated with a shared key). Each worker loads the
+reference tables once, then repeatedly pulls a shard, prices every group in it with
+calculate_group_brf and sends the group BRFs back. Workers pull work as they finish, so
+faster machines take more shards and throughput grows with the number of workers.
+
+Census files are sent as CSV text, so workers do not need access to the coordinator's
+disk. If a worker disconnects (or does not answer within shard_timeout), its shard goes
+back on the queue for another worker.
+
+Every message is pickled, so the shared key is what keeps other machines from sending
+the coordinator or the workers arbitrary objects. There is no default key: set it in the
+BRF_REPRICE_AUTHKEY environment variable on the coordinator and every worker. The
+coordinator listens on localhost unless it is given another address.
+
+Usage:
+    BRF_REPRICE_AUTHKEY=<secret> python distributed.py coordinator <census_dir> [host:port]
+    BRF_REPRICE_AUTHKEY=<secret> python distributed.py worker <host:port> [data_dir]
+"""
+import glob
+import io
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import Listener, Client
+
+from brf_calculation import calculate_group_brf
+from data_processing import load_reference_tables, read_plans_from_csv
+from rate_book import RateBook
+
+DEFAULT_HOST = 'localhost'
+DEFAULT_PORT = 6100
+AUTHKEY_ENVIRONMENT_VARIABLE = 'BRF_REPRICE_AUTHKEY'
+DEFAULT_SHARD_SIZE = 10
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+class Coordinator:
+    def __init__(self, file_paths, authkey, address=(DEFAULT_HOST, DEFAULT_PORT), shard_size=DEFAULT_SHARD_SIZE, max_attempts=DEFAULT_MAX_ATTEMPTS, shard_timeout=None,
+                 on_result=None):
+        """
+        Create a coordinator and start listening.
+        Args:
+            file_paths: Group census CSV files (the group id is the file name without extension)
+            authkey: Shared secret key (bytes) workers must present
+            address: (host, port) to listen on (port 0 picks a free port, see self.address)
+            shard_size: Number of census files per shard
+            max_attempts: Number of times a shard is tried before it is reported as failed
+            shard_timeout: Seconds to wait for a worker's answer before treating it as lost (None waits forever)
+            on_result: Optional callback(group_id, group_brf, worker_id) called as results arrive
+        """
+        _validate_authkey(authkey)
+        file_paths = sorted(file_paths)
+        self.shards = [file_paths[start:start + shard_size] for start in range(0, len(file_paths), shard_size)]
+        self.max_attempts = max_attempts
+        self.shard_timeout = shard_timeout
+        self.on_result = on_result
+
+        self.results = {}
+        self.failed = {}
+        self.worker_shards = {}
+        self.requeued = 0
+
+        self._pending = deque(range(len(self.shards)))
+        self._attempts = [0] * len(self.shards)
+        self._finished = 0
+        self._condition = threading.Condition()
+        self._closing = False
+        self._handlers = []
+
+        self._listener = Listener(address, authkey=authkey)
+        self.address = self._listener.address
+        self._authkey = authkey
+
+    def run(self, timeout=None):
+        """
+        Serve shards until every shard has been priced (or has failed max_attempts times).
+        Args:
+            timeout: Optional number of seconds to wait before giving up
+        Returns:
+            Dictionary of group_id -> group BRF (failed shards are listed in self.failed)
+        """
+        accept_thread = threading.Thread(target=self._accept_loop, daemon=True)
+        accept_thread.start()
+        try:
+            with self._condition:
+                finished = self._condition.wait_for(lambda: self._finished == len(self.shards), timeout)
+            if not finished:
+                raise TimeoutError(f"Repricing did not finish within {timeout} seconds "
+                                   f"({self._finished} of {len(self.shards)} shards done)")
+        finally:
+            self.close()
+            accept_thread.join()
+            for handler in list(self._handlers):
+                handler.join(1)
+        return self.results
+
+    def close(self):
+        """Stop accepting workers and close the listener."""
+        with self._condition:
+            if self._closing:
+                return
+            self._closing = True
+            self._condition.notify_all()
+        #accept() does not return when the listener is closed from another thread, so wake it with a connection
+        try:
+            Client(self.address, authkey=self._authkey).close()
+        except OSError:
+            pass
+
+    #private helper methods
+    def _accept_loop(self):
+        """
+        Accept worker connections, one handler thread per worker.
+        """
+        try:
+            while True:
+                try:
+                    connection = self._listener.accept()
+                except (OSError, EOFError):
+                    #a failed handshake (e.g. a wrong authkey) only drops that connection
+                    if self._closing:
+                        return
+                    continue
+                if self._closing:
+                    connection.close()
+                    return
+                handler = threading.Thread(target=self._handle_worker, args=(connection,), daemon=True)
+                self._handlers.append(handler)
+                handler.start()
+        finally:
+            self._listener.close()
+
+    def _handle_worker(self, connection):
+        """
+        Hand shards to one worker until the work runs out, requeuing its shard if it is lost.
+        """
+        shard_id = None
+        try:
+            if not connection.poll(self.shard_timeout):
+                return
+            _, worker_id = connection.recv()
+            while True:
+                shard_id = self._next_shard(worker_id)
+                if shard_id is None:
+                    connection.send(('stop',))
+                    return
+                connection.send(('shard', shard_id, [(_group_id(path), _read_text(path))
+                                                     for path in self.shards[shard_id]]))
+                if not connection.poll(self.shard_timeout):
+                    raise TimeoutError(f"Worker {worker_id} did not answer within {self.shard_timeout} seconds")
+                reply = connection.recv()
+                if reply[0] == 'result':
+                    self._complete(shard_id, worker_id, reply[2])
+                else:
+                    self._retry(shard_id, reply[2])
+                shard_id = None
+        except (EOFError, OSError, TimeoutError):
+            #the worker is gone: its shard goes back on the queue for another worker
+            if shard_id is not None:
+                self._retry(shard_id, "worker lost", requeue=True)
+        finally:
+            connection.close()
+
+    def _next_shard(self, worker_id):
+        """
+        Returns the next pending shard id, waiting while shards are in flight elsewhere
+        (they may come back if that worker is lost). Returns None when all work is done.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._pending or self._closing or
+                                     self._finished == len(self.shards))
+            if not self._pending or self._closing:
+                return None
+            shard_id = self._pending.popleft()
+            self._attempts[shard_id] += 1
+            self.worker_shards.setdefault(worker_id, 0)
+            return shard_id
+
+    def _complete(self, shard_id, worker_id, results):
+        """
+        Record a priced shard and stream its results to the callback.
+        """
+        with self._condition:
+            self.results.update(results)
+            self.worker_shards[worker_id] = self.worker_shards.get(worker_id, 0) + 1
+            self._finished += 1
+            self._condition.notify_all()
+        if self.on_result is not None:
+            for group_id, group_brf in results:
+                self.on_result(group_id, group_brf, worker_id)
+
+    def _retry(self, shard_id, error, requeue=False):
+        """
+        Put a shard back on the queue, or mark it failed once it has used up its attempts.
+        A lost worker also uses up an attempt, so a shard that crashes workers cannot loop forever.
+        """
+        with self._condition:
+            if requeue:
+                self.requeued += 1
+            if self._attempts[shard_id] < self.max_attempts:
+                self._pending.append(shard_id)
+            else:
+                self.failed[shard_id] = {'files': self.shards[shard_id], 'error': error}
+                self._finished += 1
+            self._condition.notify_all()
+
+
+def run_worker(address, authkey, data_dir='data_files', worker_id=None, tables=None):
+    """
+    Connect to a coordinator and price shards until told to stop.
+    Args:
+        address: (host, port) of the coordinator
+        authkey: Shared key of the coordinator
+        data_dir: Directory with the reference tables (loaded once, before connecting)
+        worker_id: Name reported to the coordinator (defaults to host-pid)
+        tables: Optional already-loaded tables from load_reference_tables (skips loading)
+    Returns:
+        Number of shards priced
+    """
+    _validate_authkey(authkey)
+    if tables is None:
+        tables = load_reference_tables(data_dir)
+    rate_book = RateBook.from_reference_tables(tables)
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+
+    shards_priced = 0
+    connection = Client(tuple(address), authkey=authkey)
+    try:
+        connection.send(('hello', worker_id))
+        while True:
+            message = connection.recv()
+            if message[0] == 'stop':
+                return shards_priced
+            _, shard_id, census_files = message
+            try:
+                results = [(group_id, calculate_group_brf(read_plans_from_csv(io.StringIO(text)), rate_book))
+                           for group_id, text in census_files]
+            except Exception as e:
+                connection.send(('error', shard_id, f"{type(e).__name__}: {e}"))
+                continue
+            connection.send(('result', shard_id, results))
+            shards_priced += 1
+    except EOFError:
+        #the coordinator went away
+        return shards_priced
+    finally:
+        connection.close()
+
+
+def reprice_book_local(file_paths, n_workers, data_dir='data_files', shard_size=DEFAULT_SHARD_SIZE,
+                       on_result=None, timeout=None):
+    """
+    Reprice a book with a coordinator and n_workers worker processes on this machine,
+    using a random key for this run only.
+    Returns:
+        The finished Coordinator (results, failed, worker_shards)
+    """
+    authkey = os.urandom(32)
+    coordinator = Coordinator(file_paths, authkey, address=('localhost', 0),
+                              shard_size=shard_size, on_result=on_result)
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=run_worker, args=(coordinator.address, authkey, data_dir, f"local-{i}"))
+               for i in range(n_workers)]
+    for worker in workers:
+        worker.start()
+    try:
+        coordinator.run(timeout=timeout)
+    finally:
+        for worker in workers:
+            worker.join(5)
+            if worker.is_alive():
+                worker.terminate()
+    return coordinator
+
+
+def authkey_from_environment():
+    """
+    Returns the shared key from the BRF_REPRICE_AUTHKEY environment variable.
+    """
+    authkey = os.environ.get(AUTHKEY_ENVIRONMENT_VARIABLE)
+    if not authkey:
+        raise ValueError(f"Set the shared key in the {AUTHKEY_ENVIRONMENT_VARIABLE} environment variable")
+    return authkey.encode()
+
+
+#private helper methods
+def _validate_authkey(authkey):
+    """Raise a ValueError unless the key is non-empty bytes."""
+    if not isinstance(authkey, bytes) or not authkey:
+        raise ValueError("authkey must be a non-empty bytes key shared by the coordinator and its workers")
+
+
+def _parse_address(text):
+    """Parse 'host:port' (or just 'port') into a (host, port) tuple."""
+    host, _, port = text.rpartition(':')
+    return (host or DEFAULT_HOST, int(port))
+
+
+def _group_id(file_path):
+    """Group id of a census file: the file name without extension."""
+    return os.path.splitext(os.path.basename(file_path))[0]
+
+
+def _read_text(file_path):
+    """Read a census file as text."""
+    with open(file_path, 'r') as f:
+        return f.read()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == 'coordinator':
+        address = _parse_address(sys.argv[3]) if len(sys.argv) > 3 else (DEFAULT_HOST, DEFAULT_PORT)
+        coordinator = Coordinator(glob.glob(os.path.join(sys.argv[2], '*.csv')), authkey_from_environment(),
+                                  address=address)
+        print(f"Serving {len(coordinator.shards)} shards on {coordinator.address[0]}:{coordinator.address[1]}")
+        start = time.perf_counter()
+        results = coordinator.run()
+        seconds = time.perf_counter() - start
+        print(f"Priced {len(results)} groups in {seconds:.1f}s; shards per worker: {coordinator.worker_shards}; "
+              f"requeued {coordinator.requeued}; failed {len(coordinator.failed)}")
+        for group_id in sorted(results):
+            print(f"{group_id},{results[group_id]:.6f}")
+    elif len(sys.argv) >= 3 and sys.argv[1] == 'worker':
+        data_dir = sys.argv[3] if len(sys.argv) > 3 else 'data_files'
+        print(f"Priced {run_worker(_parse_address(sys.argv[2]), authkey_from_environment(), data_dir)} shards")
+    else:
+        print(__doc__)
+        sys.exit(1)
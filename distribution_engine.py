@@ -0,0 +1,161 @@
+"""
+Distribution engine for pricing base BRF against large claims probability distributions.
+
+Plan.calculate_base_brf() walks the distribution row by row with DataFrame.apply, which is
+fine for ~100 bins but not for 100k+ bins or per-member empirical distributions. The engine
+sorts the distribution once and keeps prefix sums of the frequency and frequency × claims in
+contiguous arrays. Each plan is then priced with two binary searches, so the cost per plan
+is O(log bins) and memory does not grow with plans × bins.
+"""
+import numpy as np
+import pandas as pd
+
+from data_processing import BASE_RATE
+
+DEFAULT_CHUNK_SIZE = 65536
+
+
+class DistributionEngine:
+    def __init__(self, claims, frequencies, dtype=np.float64):
+        """
+        Build the engine from expected base rate claims and annual frequencies.
+        Args:
+            claims: Array of expected base rate claims (one per bin)
+            frequencies: Array of annual frequencies (one per bin)
+            dtype: np.float64 (default) or np.float32 to halve memory at ~1e-6 relative accuracy
+        """
+        claims = np.asarray(claims, dtype=np.float64)
+        frequencies = np.asarray(frequencies, dtype=np.float64)
+        if claims.shape != frequencies.shape or claims.ndim != 1:
+            raise ValueError("claims and frequencies must be 1D arrays of the same length.")
+
+        #sort once so every plan can be priced with binary searches
+        order = np.argsort(claims, kind='stable')
+        claims = claims[order]
+        frequencies = frequencies[order]
+
+        #prefix sums are accumulated in float64 and only then stored in the requested dtype
+        self.dtype = np.dtype(dtype)
+        self.claims = np.ascontiguousarray(claims, dtype=self.dtype)
+        self.frequencies = np.ascontiguousarray(frequencies, dtype=self.dtype)
+        self.cumulative_frequency = np.ascontiguousarray(
+            np.concatenate(([0.0], np.cumsum(frequencies))), dtype=self.dtype)
+        self.cumulative_claims = np.ascontiguousarray(
+            np.concatenate(([0.0], np.cumsum(frequencies * claims))), dtype=self.dtype)
+
+    #constructors
+    @classmethod
+    def from_claims_probability(cls, claims_probability_distribution, dtype=np.float64):
+        """
+        Build the engine from the DataFrame returned by read_claims_probability().
+        """
+        return cls(claims_probability_distribution['expected base rate claims'].to_numpy(dtype=np.float64),
+                   claims_probability_distribution['annual frequency'].to_numpy(dtype=np.float64),
+                   dtype=dtype)
+
+    @classmethod
+    def from_csv(cls, file_path, dtype=np.float64):
+        """
+        Build the engine straight from a claims probability CSV, reading only the two needed columns.
+        Applies the same starting point scaling as read_claims_probability().
+        """
+        df = pd.read_csv(file_path, usecols=lambda col: col.strip() in ('annual frequency', 'total annual claims'))
+        df.columns = df.columns.str.strip()
+        frequencies = df['annual frequency'].to_numpy(dtype=np.float64)
+        total_claims = df['total annual claims'].to_numpy(dtype=np.float64)
+        del df
+        return cls(_scale_to_base_rate(total_claims, frequencies), frequencies, dtype=dtype)
+
+    @classmethod
+    def from_member_claims(cls, annual_claims, weights=None, dtype=np.float64):
+        """
+        Build the engine from an empirical distribution of member annual claims.
+        Each member is one bin with frequency weight / sum(weights) (equal weights by default).
+        """
+        annual_claims = np.asarray(annual_claims, dtype=np.float64)
+        if weights is None:
+            weights = np.ones_like(annual_claims)
+        weights = np.asarray(weights, dtype=np.float64)
+        frequencies = weights / weights.sum()
+        return cls(_scale_to_base_rate(annual_claims, frequencies), frequencies, dtype=dtype)
+
+    @property
+    def n_bins(self):
+        """Returns the number of bins in the distribution."""
+        return len(self.claims)
+
+    @property
+    def nbytes(self):
+        """Returns the memory held by the engine arrays."""
+        return (self.claims.nbytes + self.frequencies.nbytes +
+                self.cumulative_frequency.nbytes + self.cumulative_claims.nbytes)
+
+    #pricing methods
+    def base_brf(self, deductibles, coinsurances, moops, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Calculate the base BRF for many plan designs at once.
+        Gives the same result as Plan.calculate_base_brf() up to floating point rounding.
+        Args:
+            deductibles: Array of plan deductibles
+            coinsurances: Array of plan coinsurances (0.0 to 1.0)
+            moops: Array of plan MOOPs
+            chunk_size: Number of plans priced per step (bounds temporary memory)
+        Returns:
+            float64 array of base BRF values, one per plan
+        """
+        deductibles = np.atleast_1d(np.asarray(deductibles, dtype=np.float64))
+        coinsurances = np.atleast_1d(np.asarray(coinsurances, dtype=np.float64))
+        moops = np.atleast_1d(np.asarray(moops, dtype=np.float64))
+
+        result = np.empty(len(deductibles))
+        for start in range(0, len(deductibles), chunk_size):
+            stop = start + chunk_size
+            result[start:stop] = self._expected_paid_claims(deductibles[start:stop],
+                                                            coinsurances[start:stop],
+                                                            moops[start:stop])
+        return result / 12 / BASE_RATE
+
+    def base_brf_for_plans(self, plans, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Calculate the base BRF for a list of Plan objects (the plans are not modified).
+        """
+        return self.base_brf([plan.deductible for plan in plans],
+                             [plan.coinsurance for plan in plans],
+                             [plan.moop for plan in plans],
+                             chunk_size=chunk_size)
+
+    #private helper methods
+    def _expected_paid_claims(self, deductibles, coinsurances, moops):
+        """
+        Expected annual plan-paid claims, Σ(value × freq), for a chunk of plans.
+        """
+        #the coinsurance corridor runs from the deductible to where the moop is reached;
+        #with zero coinsurance there is no moop and the corridor never ends
+        corridor_end = np.full_like(deductibles, np.inf)
+        np.divide(moops - deductibles, coinsurances, out=corridor_end, where=coinsurances != 0)
+        corridor_end += deductibles
+
+        #bins with claims < value come before searchsorted(..., 'left'), matching the `<` tests
+        deductible_pos = np.searchsorted(self.claims, deductibles, side='left')
+        corridor_pos = np.maximum(np.searchsorted(self.claims, corridor_end, side='left'), deductible_pos)
+
+        #gather the prefix sums at the cut points (always combined in float64)
+        freq_at_deductible = self.cumulative_frequency[deductible_pos].astype(np.float64)
+        freq_at_corridor = self.cumulative_frequency[corridor_pos].astype(np.float64)
+        claims_at_deductible = self.cumulative_claims[deductible_pos].astype(np.float64)
+        claims_at_corridor = self.cumulative_claims[corridor_pos].astype(np.float64)
+        total_freq = float(self.cumulative_frequency[-1])
+        total_claims = float(self.cumulative_claims[-1])
+
+        corridor = (1 - coinsurances) * ((claims_at_corridor - claims_at_deductible) -
+                                         deductibles * (freq_at_corridor - freq_at_deductible))
+        tail = (total_claims - claims_at_corridor) - moops * (total_freq - freq_at_corridor)
+        return corridor + tail
+
+
+def _scale_to_base_rate(total_claims, frequencies):
+    """
+    Scale total annual claims to expected base rate claims, as read_claims_probability() does.
+    """
+    starting_point = (frequencies * total_claims).sum() / 12
+    return total_claims * BASE_RATE / starting_point
@@ -0,0 +1,162 @@
+"""
+Registry of named claims probability distributions (e.g. one per rating region or product).
+
+constants.py loads a single distribution at import time. The registry instead maps names to
+CSV files and loads each distribution the first time it is asked for. The loaded
+DataFrame, its starting point and its compiled DistributionEngine are cached, so a batch of
+groups from different regions is priced without reading any table twice.
+"""
+import os
+import threading
+
+from data_processing import read_claims_probability
+from distribution_engine import DistributionEngine
+from batch_pricing import calculate_group_brf_batch
+from rate_book import RateBook
+
+DEFAULT_DISTRIBUTION = 'default'
+
+
+class DistributionRegistry:
+    def __init__(self, sources=None):
+        """
+        Create a registry.
+        Args:
+            sources: Optional dictionary of distribution name -> CSV file path
+        """
+        self._sources = {}
+        self._loaded = {}
+        self._lock = threading.Lock()
+        for name, file_path in (sources or {}).items():
+            self.register(name, file_path)
+
+    def register(self, name, file_path):
+        """
+        Register a distribution CSV under a name. The file is not read until it is used.
+        Re-registering a name drops anything cached for it.
+        """
+        with self._lock:
+            self._sources[name] = file_path
+            self._loaded.pop(name, None)
+
+    def register_directory(self, directory):
+        """
+        Register every CSV file in a directory, using the file name without extension as the name.
+        Returns:
+            List of registered names
+        """
+        names = []
+        for file_name in sorted(os.listdir(directory)):
+            if file_name.lower().endswith('.csv'):
+                name = os.path.splitext(file_name)[0]
+                self.register(name, os.path.join(directory, file_name))
+                names.append(name)
+        return names
+
+    def add(self, name, claims_probability_distribution, starting_point, file_path=None):
+        """
+        Add an already-loaded distribution (e.g. the one in constants.py) to the cache.
+        If file_path is given, the distribution can be reloaded from it after clear().
+        """
+        entry = self._compile(name, file_path, claims_probability_distribution, starting_point)
+        with self._lock:
+            if file_path is not None or name not in self._sources:
+                self._sources[name] = file_path
+            self._loaded[name] = entry
+
+    def names(self):
+        """Returns the registered distribution names."""
+        return list(self._sources)
+
+    def is_loaded(self, name):
+        """Returns True if the named distribution has already been loaded and compiled."""
+        return name in self._loaded
+
+    def get(self, name=DEFAULT_DISTRIBUTION):
+        """
+        Returns the cached entry for a distribution, loading it on first use.
+        The entry is a dictionary with name, file_path, claims_probability_distribution,
+        starting_point and engine.
+        """
+        entry = self._loaded.get(name)
+        if entry is not None:
+            return entry
+
+        with self._lock:
+            #another thread may have loaded it while we waited for the lock
+            if name in self._loaded:
+                return self._loaded[name]
+            if name not in self._sources or self._sources[name] is None:
+                raise KeyError(f"Unknown claims probability distribution: {name}")
+
+            file_path = self._sources[name]
+            df, starting_point = read_claims_probability(file_path)
+            entry = self._compile(name, file_path, df, starting_point)
+            self._loaded[name] = entry
+            return entry
+
+    def get_distribution(self, name=DEFAULT_DISTRIBUTION):
+        """Returns the claims probability DataFrame (with expected base rate claims)."""
+        return self.get(name)['claims_probability_distribution']
+
+    def get_starting_point(self, name=DEFAULT_DISTRIBUTION):
+        """Returns the starting point of the distribution."""
+        return self.get(name)['starting_point']
+
+    def get_engine(self, name=DEFAULT_DISTRIBUTION):
+        """Returns the compiled DistributionEngine for the distribution."""
+        return self.get(name)['engine']
+
+    def clear(self):
+        """Drop all cached distributions (registrations are kept)."""
+        with self._lock:
+            self._loaded.clear()
+
+    #private helper methods
+    def _compile(self, name, file_path, claims_probability_distribution, starting_point):
+        """
+        Build the cache entry for a loaded distribution.
+        """
+        return {
+            'name': name,
+            'file_path': file_path,
+            'claims_probability_distribution': claims_probability_distribution,
+            'starting_point': starting_point,
+            'engine': DistributionEngine.from_claims_probability(claims_probability_distribution)
+        }
+
+
+def calculate_group_brfs_by_distribution(groups, registry, deductible_threshold_data, coinsurance_threshold_data=None,
+                                         moop_threshold_data=None, pcp_copay_data=None, spc_copay_data=None,
+                                         er_copay_data=None):
+    """
+    Calculate the group BRF for a batch of groups, each priced on its own distribution
+    with the registry's compiled engine (the Plan objects are not modified).
+
+    Args:
+        groups: Iterable of (group_id, distribution_name, plans) tuples
+        registry: DistributionRegistry holding the distributions
+        deductible_threshold_data: Dictionary with deductible threshold ranges, or a RateBook in place of
+                                   the six threshold and copay tables (its distribution is not used)
+        coinsurance_threshold_data: Dictionary with coinsurance threshold ranges
+        moop_threshold_data: Dictionary with MOOP threshold ranges
+        pcp_copay_data: 2D dictionary with PCP copay relativity data
+        spc_copay_data: 2D dictionary with SPC copay relativity data
+        er_copay_data: 2D dictionary with ER copay relativity data
+
+    Returns:
+        Dictionary of group_id -> group BRF
+    """
+    if isinstance(deductible_threshold_data, RateBook):
+        tables = deductible_threshold_data.table_arguments[1:]
+    else:
+        tables = (deductible_threshold_data, coinsurance_threshold_data, moop_threshold_data,
+                  pcp_copay_data, spc_copay_data, er_copay_data)
+    results = {}
+    for group_id, distribution_name, plans in groups:
+        entry = registry.get(distribution_name)
+        results[group_id] = calculate_group_brf_batch(plans,
+                                                      entry['claims_probability_distribution'],
+                                                      *tables,
+                                                      engine=entry['engine'])
+    return results
@@ -0,0 +1,410 @@
+"""
+Randomized equivalence and stress harness for the BRF engines.
+
+Generates random plan designs and census files that deliberately hit the edge cases
+(values on threshold band edges where low <= value < high, coinsurance == 0, MOOP equal to
+the deductible, copay amounts missing from the copay tables) and compares every fast engine
+against the reference Plan.calculate_plan_brf() path. Designs outside every threshold band
+are checked one by one: the engines must agree on the value, or all raise a ValueError
+(out-of-band designs with copays cannot be priced).
+
+The row-wise reference is far too slow for millions of designs, so it is run on a random
+sample of the designs. All designs are also checked against a "direct" engine that applies
+the plan logic to every bin (no prefix sums), which is exact but memory-bound.
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from Plan import Plan
+from brf_calculation import calculate_group_brf
+from data_processing import BASE_RATE, read_plans_from_csv
+from distribution_engine import DistributionEngine
+from batch_pricing import (price_plan_columns, calculate_indices_array, finish_plan_pricing,
+                           calculate_group_brf_batch, MISSING_INDEX)
+from numba_kernels import NUMBA_AVAILABLE, price_plan_columns_numba
+
+DEFAULT_TOLERANCE = 1e-9
+RESULT_COLUMNS = ('base_plan_index', 'base_brf', 'copay_brf', 'plan_brf')
+
+
+#random design and census generation
+def generate_plan_designs(n_designs, claims_probability_distribution, deductible_threshold_data,
+                          coinsurance_threshold_data, moop_threshold_data,
+                          pcp_copay_data, spc_copay_data, er_copay_data, seed=None):
+    """
+    Generate random plan designs that fall inside the threshold bands, biased towards edge cases.
+    Returns:
+        DataFrame with deductible, coinsurance, moop, pcp, spc and er columns (missing copays are NaN)
+    """
+    rng = np.random.default_rng(seed)
+    claims = claims_probability_distribution['expected base rate claims'].to_numpy(dtype=float)
+
+    deductible = _sample_in_bands(n_designs, deductible_threshold_data, claims, rng)
+    coinsurance = _sample_in_bands(n_designs, coinsurance_threshold_data, [0.0], rng)
+    moop = _sample_in_bands(n_designs, moop_threshold_data, claims, rng)
+
+    #coinsurance == 0 and moop == deductible get their own share of the designs
+    coinsurance[rng.random(n_designs) < 0.15] = 0.0
+    equal_moop = (rng.random(n_designs) < 0.15) & _in_any_band(deductible, moop_threshold_data)
+    moop[equal_moop] = deductible[equal_moop]
+
+    return pd.DataFrame({
+        'deductible': deductible,
+        'coinsurance': coinsurance,
+        'moop': moop,
+        'pcp': _sample_copays(n_designs, pcp_copay_data, rng),
+        'spc': _sample_copays(n_designs, spc_copay_data, rng),
+        'er': _sample_copays(n_designs, er_copay_data, rng)
+    })
+
+
+def generate_out_of_band_designs(n_designs, claims_probability_distribution, deductible_threshold_data,
+                                 coinsurance_threshold_data, moop_threshold_data,
+                                 pcp_copay_data, spc_copay_data, er_copay_data, seed=None):
+    """
+    Generate designs where the deductible, coinsurance or moop falls outside every threshold band
+    (below the lowest band, on the top band's exclusive high edge or far above it). Half of the
+    designs have no copays, the others keep their random copays.
+    Returns:
+        DataFrame with the same columns as generate_plan_designs
+    """
+    rng = np.random.default_rng(seed)
+    designs = generate_plan_designs(n_designs, claims_probability_distribution, deductible_threshold_data,
+                                    coinsurance_threshold_data, moop_threshold_data,
+                                    pcp_copay_data, spc_copay_data, er_copay_data, seed=rng.integers(2 ** 32))
+
+    fields = (('deductible', deductible_threshold_data), ('coinsurance', coinsurance_threshold_data),
+              ('moop', moop_threshold_data))
+    field = rng.integers(0, len(fields), size=n_designs)
+    for i, (column, threshold_data) in enumerate(fields):
+        rows = field == i
+        designs.loc[rows, column] = rng.choice(_out_of_band_values(threshold_data), size=int(rows.sum()))
+
+    no_copays = rng.random(n_designs) < 0.5
+    designs.loc[no_copays, ['pcp', 'spc', 'er']] = np.nan
+    return designs
+
+
+def generate_census(designs, n_groups, seed=None):
+    """
+    Assign random designs to random groups with random enrollment, in the read_plans_from_csv layout.
+    Returns:
+        DataFrame with group_id, plan_name, design columns and ee, es, ec, ef enrollment columns
+    """
+    rng = np.random.default_rng(seed)
+    plans_per_group = rng.integers(1, 6, size=n_groups)
+    group_ids = np.repeat(np.arange(n_groups), plans_per_group)
+    rows = designs.iloc[rng.integers(0, len(designs), size=len(group_ids))].reset_index(drop=True)
+
+    #census files carry dollars to the cent and coinsurance to 4 decimals; rounding down keeps
+    #values inside their band (pandas does not parse 17-digit floats back exactly)
+    rows[['deductible', 'moop']] = np.floor(rows[['deductible', 'moop']] * 100) / 100
+    rows['coinsurance'] = np.floor(rows['coinsurance'] * 10000) / 10000
+
+    census = pd.DataFrame({'group_id': group_ids,
+                           'plan_name': [f"plan_{i + 1}" for n in plans_per_group for i in range(n)]})
+    census = pd.concat([census, rows], axis=1)
+    for column in ('ee', 'es', 'ec', 'ef'):
+        census[column] = rng.poisson(rng.choice([0.5, 5, 40], size=len(census)))
+
+    #every group needs some enrollment, otherwise calculate_group_brf divides by zero
+    first_rows = census.groupby('group_id').head(1).index
+    census.loc[first_rows, 'ee'] += 1
+    return census
+
+
+def write_census_files(census, directory):
+    """
+    Write one CSV per group in the read_plans_from_csv layout.
+    Returns:
+        List of file paths
+    """
+    paths = []
+    for group_id, group in census.groupby('group_id'):
+        path = os.path.join(directory, f"group_{group_id}.csv")
+        group.drop(columns='group_id').rename(columns={'plan_name': ''}).to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+
+#engines
+def price_reference(designs, tables):
+    """
+    Reference engine: one Plan per design priced with Plan.calculate_plan_brf().
+    """
+    results = {column: np.empty(len(designs)) for column in RESULT_COLUMNS}
+    for i, row in enumerate(designs.itertuples(index=False)):
+        plan = Plan(i + 1, f"plan_{i + 1}", row.deductible, row.coinsurance, row.moop,
+                    pcp_copay=_optional(row.pcp), spc_copay=_optional(row.spc), er_copay=_optional(row.er))
+        plan.calculate_plan_brf(*tables)
+        in_band = None not in (plan.deductible_index, plan.moop_index, plan.coinsurance_index)
+        results['base_plan_index'][i] = plan.get_base_plan_index() if in_band else MISSING_INDEX
+        results['base_brf'][i] = plan.base_brf
+        results['copay_brf'][i] = plan.copay_brf
+        results['plan_brf'][i] = plan.plan_brf
+    return results
+
+
+def price_direct(designs, tables, chunk_size=2048):
+    """
+    Exact engine that evaluates the plan logic on every bin (plans × bins per chunk).
+    """
+    claims_probability_distribution, deductible_data, coinsurance_data, moop_data, pcp_data, spc_data, er_data = tables
+    claims = claims_probability_distribution['expected base rate claims'].to_numpy(dtype=float)
+    freq = claims_probability_distribution['annual frequency'].to_numpy(dtype=float)
+
+    deductible = designs['deductible'].to_numpy(dtype=float)
+    coinsurance = designs['coinsurance'].to_numpy(dtype=float)
+    moop = designs['moop'].to_numpy(dtype=float)
+
+    base_brf = np.empty(len(designs))
+    for start in range(0, len(designs), chunk_size):
+        stop = min(start + chunk_size, len(designs))
+        d = deductible[start:stop, None]
+        c = coinsurance[start:stop, None]
+        m = moop[start:stop, None]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corridor_end = np.where(c == 0, np.inf, d + (m - d) / c)
+        paid = np.where(claims < d, 0.0, np.where(claims < corridor_end, (1 - c) * (claims - d), claims - m))
+        base_brf[start:stop] = paid @ freq
+    base_brf = base_brf / 12 / BASE_RATE
+
+    return finish_plan_pricing(designs, calculate_indices_array(deductible, deductible_data),
+                               calculate_indices_array(moop, moop_data),
+                               calculate_indices_array(coinsurance, coinsurance_data),
+                               base_brf, pcp_data, spc_data, er_data)
+
+
+def price_vectorized(designs, tables):
+    """
+    Fast engine: batch_pricing with a DistributionEngine compiled once per run.
+    """
+    return price_plan_columns(designs, *tables, engine=DistributionEngine.from_claims_probability(tables[0]))
+
+
+def price_numba(designs, tables):
+    """
+    Fast engine: fused Numba kernel for indices and base BRF (only listed when numba is installed).
+    """
+    return price_plan_columns_numba(designs, *tables, engine=DistributionEngine.from_claims_probability(tables[0]))
+
+
+FAST_ENGINES = {
+    'vectorized': price_vectorized
+}
+if NUMBA_AVAILABLE:
+    FAST_ENGINES['numba'] = price_numba
+
+
+#comparison
+def compare_results(expected, actual, designs):
+    """
+    Compare two engines' results.
+    Returns:
+        Dictionary with the worst absolute difference per result column, the overall worst
+        difference and the design where it happened
+    """
+    report = {'max_abs_diff': {}, 'worst_case': None, 'worst_abs_diff': 0.0}
+    for column in RESULT_COLUMNS:
+        diff = np.abs(np.asarray(actual[column], dtype=float) - np.asarray(expected[column], dtype=float))
+        worst = int(np.argmax(diff)) if len(diff) else 0
+        report['max_abs_diff'][column] = float(diff[worst]) if len(diff) else 0.0
+        if len(diff) and diff[worst] > report['worst_abs_diff']:
+            report['worst_abs_diff'] = float(diff[worst])
+            report['worst_case'] = {'column': column, **designs.iloc[worst].to_dict()}
+    return report
+
+
+def check_out_of_band(designs, tables, tolerance=DEFAULT_TOLERANCE, engines=None):
+    """
+    Price designs one at a time with the reference, direct and fast engines and check that they
+    agree on every design: the same results within tolerance, or all raising a ValueError.
+    Returns:
+        Dictionary with n_designs, n_raised, disagreements (list of designs with each engine's
+        outcome) and passed
+    """
+    all_engines = {'reference': price_reference, 'direct': price_direct, **(engines or FAST_ENGINES)}
+    n_raised = 0
+    disagreements = []
+    for i in range(len(designs)):
+        design = designs.iloc[i:i + 1].reset_index(drop=True)
+        outcomes = {}
+        for name, engine in all_engines.items():
+            try:
+                results = engine(design, tables)
+                outcomes[name] = tuple(float(results[column][0]) for column in RESULT_COLUMNS)
+            except ValueError:
+                outcomes[name] = 'ValueError'
+
+        expected = outcomes['reference']
+        n_raised += expected == 'ValueError'
+        for outcome in outcomes.values():
+            same = (outcome == expected if isinstance(expected, str) or isinstance(outcome, str) else
+                    max(abs(actual - value) for actual, value in zip(outcome, expected)) <= tolerance)
+            if not same:
+                disagreements.append({**design.iloc[0].to_dict(), 'outcomes': outcomes})
+                break
+    return {'n_designs': len(designs), 'n_raised': n_raised, 'disagreements': disagreements,
+            'passed': not disagreements}
+
+
+def run_equivalence(n_designs, tables, reference_sample=2000, n_census_files=20, seed=None,
+                    tolerance=DEFAULT_TOLERANCE, engines=None, n_out_of_band=200):
+    """
+    Run the randomized equivalence and stress check.
+    Args:
+        n_designs: Number of random plan designs priced by the fast engines
+        tables: Tuple of the seven table arguments taken by calculate_group_brf
+        reference_sample: Number of designs also priced with the row-wise reference
+        n_census_files: Number of random census files written to disk and priced as groups
+        seed: Seed for the random designs
+        tolerance: Maximum allowed absolute difference
+        engines: Optional dictionary of name -> engine function (defaults to FAST_ENGINES)
+        n_out_of_band: Number of out-of-band designs checked one by one (see check_out_of_band)
+    Returns:
+        Report dictionary with per-engine throughput, worst-case divergence from the
+        reference (sample) and direct (all designs) engines, group-level divergence,
+        the out-of-band check and passed
+    """
+    engines = engines or FAST_ENGINES
+    rng = np.random.default_rng(seed)
+    designs = generate_plan_designs(n_designs, *tables, seed=rng.integers(2 ** 32))
+    sample = designs.iloc[np.sort(rng.choice(n_designs, size=min(reference_sample, n_designs), replace=False))]
+    sample = sample.reset_index(drop=True)
+
+    report = {'n_designs': n_designs, 'reference_sample': len(sample), 'engines': {}}
+
+    reference, reference_seconds = _timed(price_reference, sample, tables)
+    direct, direct_seconds = _timed(price_direct, designs, tables)
+    report['engines']['reference'] = _throughput(len(sample), reference_seconds)
+    report['engines']['direct'] = _throughput(n_designs, direct_seconds)
+    report['engines']['direct'].update(compare_results(reference, price_direct(sample, tables), sample))
+
+    passed = report['engines']['direct']['worst_abs_diff'] <= tolerance
+    for name, engine in engines.items():
+        results, seconds = _timed(engine, designs, tables)
+        engine_report = _throughput(n_designs, seconds)
+        engine_report['vs_reference'] = compare_results(reference, engine(sample, tables), sample)
+        engine_report['vs_direct'] = compare_results(direct, results, designs)
+        passed = (passed and engine_report['vs_reference']['worst_abs_diff'] <= tolerance and
+                  engine_report['vs_direct']['worst_abs_diff'] <= tolerance)
+        report['engines'][name] = engine_report
+
+    #group-level check on census files written to disk and read back with read_plans_from_csv
+    worst_group_diff = 0.0
+    with tempfile.TemporaryDirectory() as directory:
+        census = generate_census(designs, n_census_files, seed=rng.integers(2 ** 32))
+        for path in write_census_files(census, directory):
+            expected = calculate_group_brf(read_plans_from_csv(path), *tables)
+            actual = calculate_group_brf_batch(read_plans_from_csv(path), *tables)
+            worst_group_diff = max(worst_group_diff, abs(actual - expected))
+    report['groups'] = {'n_census_files': n_census_files, 'worst_abs_diff': float(worst_group_diff)}
+
+    out_of_band = generate_out_of_band_designs(n_out_of_band, *tables, seed=rng.integers(2 ** 32))
+    report['out_of_band'] = check_out_of_band(out_of_band, tables, tolerance, engines)
+
+    report['passed'] = bool(passed and worst_group_diff <= tolerance and report['out_of_band']['passed'])
+    return report
+
+
+#private helper methods
+def _sample_in_bands(n, threshold_data, special_values, rng):
+    """
+    Sample values inside the threshold bands: a third on band edges (low, just below high),
+    a third from special_values that fall in a band, and a third uniform over all bands.
+    """
+    bands = list(threshold_data.values())
+    edges = [low for low, _ in bands] + [np.nextafter(high, -np.inf) for _, high in bands]
+    edges += [high for _, high in bands]
+    candidates = np.array([value for value in list(edges) + list(special_values)], dtype=float)
+    candidates = candidates[_in_any_band(candidates, threshold_data)]
+
+    lows = np.array([low for low, _ in bands], dtype=float)
+    highs = np.array([high for _, high in bands], dtype=float)
+    band = rng.integers(0, len(bands), size=n)
+    values = lows[band] + rng.random(n) * (highs[band] - lows[band])
+
+    strategy = rng.integers(0, 3, size=n)
+    picked = strategy < 2
+    values[picked] = rng.choice(candidates, size=int(picked.sum()))
+    return values
+
+
+def _in_any_band(values, threshold_data):
+    """Returns a boolean array: True where the value falls in at least one band."""
+    values = np.asarray(values, dtype=float)
+    found = np.zeros(values.shape, dtype=bool)
+    for low, high in threshold_data.values():
+        found |= (low <= values) & (values < high)
+    return found
+
+
+def _out_of_band_values(threshold_data):
+    """
+    Values outside every band: below the lowest low, the exclusive high edge of the top band
+    and far above it.
+    """
+    lows = [low for low, _ in threshold_data.values()]
+    highs = [high for _, high in threshold_data.values()]
+    candidates = np.array([min(lows) - 1, max(highs), max(highs) * 10 + 1], dtype=float)
+    return candidates[~_in_any_band(candidates, threshold_data)]
+
+
+def _sample_copays(n, copay_data, rng):
+    """
+    Sample copay amounts: mostly amounts in the table, some missing (NaN), some not in the table.
+    """
+    amounts = sorted({amount for column in copay_data.values() for amount in column})
+    not_in_table = [amount + 1 for amount in amounts if amount + 1 not in amounts][:5]
+    values = rng.choice(np.array(amounts, dtype=float), size=n)
+    draw = rng.random(n)
+    values[draw < 0.2] = np.nan
+    off_table = (draw >= 0.2) & (draw < 0.3)
+    values[off_table] = rng.choice(np.array(not_in_table, dtype=float), size=int(off_table.sum()))
+    return values
+
+
+def _optional(value):
+    """Convert NaN to None and whole floats to int, like read_plans_from_csv does for copays."""
+    return None if pd.isna(value) else int(value)
+
+
+def _timed(function, *args):
+    """Returns (result, seconds) for a function call."""
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def _throughput(n, seconds):
+    """Returns a throughput report dictionary."""
+    return {'seconds': seconds, 'plans_per_second': n / seconds if seconds > 0 else float('inf')}
+
+
+if __name__ == "__main__":
+    #usage: python equivalence_harness.py [n_designs] [reference_sample]
+    from constants import (CLAIMS_PROBABILITY_DISTRIBUTION, DEDUCTIBLE_THRESHOLD_DATA, COINSURANCE_THRESHOLD_DATA,
+                           MOOP_THRESHOLD_DATA, PCP_COPAY_DATA, SPC_COPAY_DATA, ER_COPAY_DATA)
+
+    n_designs = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    reference_sample = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    tables = (CLAIMS_PROBABILITY_DISTRIBUTION, DEDUCTIBLE_THRESHOLD_DATA, COINSURANCE_THRESHOLD_DATA,
+              MOOP_THRESHOLD_DATA, PCP_COPAY_DATA, SPC_COPAY_DATA, ER_COPAY_DATA)
+    report = run_equivalence(n_designs, tables, reference_sample=reference_sample, seed=0)
+
+    for name, engine_report in report['engines'].items():
+        print(f"{name:>12}: {engine_report['plans_per_second']:>14,.0f} plans/s")
+        for key in ('vs_reference', 'vs_direct'):
+            if key in engine_report:
+                print(f"{'':>14}{key}: worst abs diff {engine_report[key]['worst_abs_diff']:.3e} "
+                      f"at {engine_report[key]['worst_case']}")
+    print(f"{'groups':>12}: worst abs diff {report['groups']['worst_abs_diff']:.3e}")
+    print(f"{'out of band':>12}: {report['out_of_band']['n_designs']} designs, "
+          f"{report['out_of_band']['n_raised']} raised, {len(report['out_of_band']['disagreements'])} disagreements")
+    print("PASSED" if report['passed'] else "FAILED")
+    sys.exit(0 if report['passed'] else 1)
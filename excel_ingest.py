@@ -0,0 +1,392 @@
+"""
+Census ingest straight from the Excel quoting models (.xlsm / .xlsx).
+
+Groups arrive as workbooks like those in data_files/excel_models/, and their plan table used to
+be hand-exported to the data_files/tests/*.csv layout before pricing. The readers here take the
+plan designs and census from the workbook's Inputs sheet directly and map them to the
+read_plans_from_csv fields (deductible, coinsurance, moop, pcp, spc, er, ee, es, ec, ef) with
+the same defaulting rules.
+
+Workbooks are opened with openpyxl in read-only streaming mode (cached cell values only, no
+formulas, links or styles) and streaming stops at the "Plan Count" row, so only the top of the
+Inputs sheet is parsed. Extracted values are cached as JSON files keyed by the SHA-256 of the
+workbook, so re-quoting an unchanged workbook never parses it again, and extract_workbooks
+parses the uncached workbooks of a batch in parallel worker processes.
+
+The Excel model's own plan and composite relativities are extracted too when present
+(excel_regression checks the pricing engines against them).
+
+Requires openpyxl.
+
+Usage:
+    python excel_ingest.py <output_dir> <workbook> [<workbook> ...]
+    (writes one census CSV per workbook in the data_files/tests layout)
+"""
+import csv
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from Plan import Plan
+from columnar_ingest import COPAY_COLUMNS, DESIGN_COLUMNS, ENROLLMENT_COLUMNS, apply_census_defaults
+from data_processing import hash_file, read_plans_from_csv
+
+DEFAULT_CACHE_DIR = '.excel_cache'
+WORKBOOK_EXTENSIONS = ('.xlsm', '.xlsx')
+
+#bump when the extracted values change shape, so older cache entries are parsed again
+EXTRACT_FORMAT_VERSION = 3
+
+INPUTS_SHEET = 'Inputs'
+#column B holds the general input labels and column C their values
+GENERAL_LABEL_COLUMN = 2
+#column H holds the plan row labels, columns I to M hold plans 1 to 5
+LABEL_COLUMN = 8
+FIRST_PLAN_COLUMN = 9
+LAST_PLAN_COLUMN = 13
+
+GROUP_NAME_LABEL = 'Group Name'
+PLAN_NAME_LABEL = 'Current Plan Name'
+#row label -> Plan field
+DESIGN_LABELS = {
+    'Deductible': 'deductible',
+    'Coinsurance': 'coinsurance',
+    'Maximum-Out-of-Pocket': 'moop',
+    'PCP Copay': 'pcp',
+    'SPC Copay': 'spc',
+    'ER Copay': 'er'
+}
+#rows under the "Current Enrollment" header -> census field
+ENROLLMENT_LABELS = {
+    'Employee Only': 'ee',
+    'Employee & Spouse': 'es',
+    'Employee & Child(ren)': 'ec',
+    'Employee & Family': 'ef'
+}
+ENROLLMENT_HEADER = 'Current Enrollment'
+PLAN_RELATIVITY_LABEL = 'Approximate Relativity'
+GROUP_RELATIVITY_LABEL = 'Composite'
+PLAN_COUNT_LABEL = 'Plan Count'
+#census field -> row label, for error messages
+FIELD_LABELS = {field: label for label, field in list(DESIGN_LABELS.items()) + list(ENROLLMENT_LABELS.items())}
+
+CSV_COLUMNS = DESIGN_COLUMNS + COPAY_COLUMNS + ENROLLMENT_COLUMNS
+
+
+#workbook extraction
+def extract_workbook_values(file_path):
+    """
+    Read the group name, plan designs, census and (when present) the model's expected BRFs
+    from the Inputs sheet of an Excel model, streaming only up to the "Plan Count" row.
+    Blank cells are None; a design or enrollment cell holding text that is not a number (e.g.
+    '#N/A', '$1,500' or '20%') raises a ValueError naming the workbook, row label and plan column.
+    Args:
+        file_path: Path to the .xlsm/.xlsx workbook
+    Returns:
+        Dictionary with workbook (file name), group_name (None if not filled in), plans (list of
+        dictionaries with plan_name, design, enrollment and expected_plan_brf) and expected_group_brf
+        (expected values are None when the workbook has no relativity rows)
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        rows = {}
+        group_name = None
+        in_enrollment = False
+        sheet = workbook[INPUTS_SHEET]
+        for row in sheet.iter_rows(min_col=GENERAL_LABEL_COLUMN, max_col=LAST_PLAN_COLUMN, values_only=True):
+            general_label = _label(row[0])
+            label = _label(row[LABEL_COLUMN - GENERAL_LABEL_COLUMN])
+            values = list(row[FIRST_PLAN_COLUMN - GENERAL_LABEL_COLUMN:])
+
+            if general_label == GROUP_NAME_LABEL and group_name is None:
+                group_name = _text(row[1])
+            if label == ENROLLMENT_HEADER:
+                in_enrollment = True
+            elif in_enrollment and label in ENROLLMENT_LABELS:
+                rows[ENROLLMENT_LABELS[label]] = values
+            elif label in DESIGN_LABELS and DESIGN_LABELS[label] not in rows:
+                rows[DESIGN_LABELS[label]] = values
+            elif label == PLAN_NAME_LABEL and 'plan_name' not in rows:
+                rows['plan_name'] = values
+            elif label == PLAN_RELATIVITY_LABEL:
+                in_enrollment = False
+                rows['expected_plan_brf'] = values
+            elif label == GROUP_RELATIVITY_LABEL and 'expected_group_brf' not in rows:
+                rows['expected_group_brf'] = values[0]
+            elif label == PLAN_COUNT_LABEL:
+                rows['plan_count'] = values
+                #everything needed is above this row, so stop streaming here
+                break
+    finally:
+        workbook.close()
+
+    missing = [field for field in list(DESIGN_LABELS.values()) + list(ENROLLMENT_LABELS.values()) + ['plan_count']
+               if field not in rows]
+    if missing:
+        raise ValueError(f"{file_path}: could not find rows for {missing}")
+
+    plans = []
+    for column, count in enumerate(rows['plan_count']):
+        if not count:
+            continue
+        plan_name = _text(rows['plan_name'][column]) if 'plan_name' in rows else None
+        expected_plan_brfs = rows.get('expected_plan_brf')
+        plans.append({
+            'plan_name': plan_name or f"plan_{len(plans) + 1}",
+            'design': {field: _plan_number(file_path, rows, field, column) for field in DESIGN_LABELS.values()},
+            'enrollment': {field: _plan_number(file_path, rows, field, column) for field in ENROLLMENT_LABELS.values()},
+            'expected_plan_brf': _number(expected_plan_brfs[column], strict=False) if expected_plan_brfs else None
+        })
+
+    return {
+        'workbook': os.path.basename(file_path),
+        'group_name': group_name,
+        'plans': plans,
+        'expected_group_brf': _number(rows.get('expected_group_brf'), strict=False)
+    }
+
+
+def extract_workbook_values_cached(file_path, cache_dir=DEFAULT_CACHE_DIR, file_hash=None):
+    """
+    Same as extract_workbook_values, but cached on disk by the workbook's SHA-256
+    (cache_dir=None parses without caching).
+    Args:
+        file_path: Path to the workbook
+        cache_dir: Directory of the JSON cache files
+        file_hash: Optional already computed SHA-256 of the workbook
+    """
+    if cache_dir is None:
+        return extract_workbook_values(file_path)
+    if file_hash is None:
+        file_hash = hash_file(file_path)
+    values = _read_cache(cache_dir, file_hash)
+    if values is not None:
+        values['workbook'] = os.path.basename(file_path)
+        return values
+
+    values = extract_workbook_values(file_path)
+    values['sha256'] = file_hash
+    values['format_version'] = EXTRACT_FORMAT_VERSION
+
+    #write to a temporary file first so parallel runs never see a half-written cache entry
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = os.path.join(cache_dir, f"{file_hash}.json")
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(values, f, indent=2)
+    os.replace(temp_path, cache_path)
+    return values
+
+
+def extract_workbooks(file_paths, cache_dir=DEFAULT_CACHE_DIR, max_workers=None):
+    """
+    Extract many workbooks: cached workbooks are read from the cache, the others are parsed
+    in parallel (one worker process per workbook, up to max_workers).
+    Returns:
+        List of extracted values, in the same order as file_paths
+    """
+    file_paths = list(file_paths)
+    results = [None] * len(file_paths)
+    pending = []
+    for position, file_path in enumerate(file_paths):
+        file_hash = hash_file(file_path) if cache_dir is not None else None
+        values = _read_cache(cache_dir, file_hash) if cache_dir is not None else None
+        if values is None:
+            pending.append((position, file_path, file_hash))
+            continue
+        values['workbook'] = os.path.basename(file_path)
+        results[position] = values
+
+    if len(pending) <= 1 or max_workers == 1:
+        for position, file_path, file_hash in pending:
+            results[position] = extract_workbook_values_cached(file_path, cache_dir, file_hash)
+        return results
+    #spawn rather than fork: forking after a thread pool (e.g. numba's) has started can deadlock the children
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        parsed = executor.map(extract_workbook_values_cached, [file_path for _, file_path, _ in pending],
+                              [cache_dir] * len(pending), [file_hash for _, _, file_hash in pending])
+        for (position, _, _), values in zip(pending, parsed):
+            results[position] = values
+    return results
+
+
+#census readers
+def build_plans(extracted):
+    """
+    Build Plan objects from extracted workbook values, using read_plans_from_csv defaults.
+    """
+    plans = []
+    for plan_values in extracted['plans']:
+        design = plan_values['design']
+        enrollment = plan_values['enrollment']
+        plans.append(Plan(
+            plan_id=len(plans) + 1,
+            plan_name=plan_values['plan_name'],
+            deductible=design['deductible'] or 0,
+            coinsurance=design['coinsurance'] or 0,
+            moop=design['moop'] or 0,
+            pcp_copay=_optional_int(design['pcp']),
+            spc_copay=_optional_int(design['spc']),
+            er_copay=_optional_int(design['er']),
+            ee_enrollment=_optional_int(enrollment['ee']) or 0,
+            spouse_enrollment=_optional_int(enrollment['es']) or 0,
+            children_enrollment=_optional_int(enrollment['ec']) or 0,
+            family_enrollment=_optional_int(enrollment['ef']) or 0
+        ))
+    return plans
+
+
+def build_plan_columns(extracted, defaults=True):
+    """
+    Census columns of extracted workbook values, for batch pricing and census validation.
+    Args:
+        extracted: Values returned by extract_workbook_values
+        defaults: If True, apply the read_plans_from_csv defaulting rules (columnar_ingest.apply_census_defaults);
+                  if False, return the raw values (blanks as None), e.g. for census_validation.validate_census
+    Returns:
+        Dictionary of plan_name and the census columns (see columnar_ingest.read_plan_columns)
+    """
+    raw = {'plan_name': [plan_values['plan_name'] for plan_values in extracted['plans']]}
+    for column in DESIGN_COLUMNS + COPAY_COLUMNS:
+        raw[column] = [plan_values['design'][column] for plan_values in extracted['plans']]
+    for column in ENROLLMENT_COLUMNS:
+        raw[column] = [plan_values['enrollment'][column] for plan_values in extracted['plans']]
+    return apply_census_defaults(raw) if defaults else raw
+
+
+def read_plans_from_workbook(file_path, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Read the plans of an Excel model and return a list of Plan objects, like read_plans_from_csv.
+    Args:
+        file_path: Path to the .xlsm/.xlsx workbook
+        cache_dir: Directory of the extraction cache (None parses without caching)
+    Returns:
+        List of Plan objects
+    """
+    return build_plans(extract_workbook_values_cached(file_path, cache_dir))
+
+
+def read_workbook_columns(file_path, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Read the census of an Excel model into arrays, like columnar_ingest.read_plan_columns.
+    """
+    return build_plan_columns(extract_workbook_values_cached(file_path, cache_dir))
+
+
+def read_census_plans(file_path, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Read a group census from a CSV file or an Excel model, by extension.
+    Returns:
+        List of Plan objects
+    """
+    if os.path.splitext(file_path)[1].lower() in WORKBOOK_EXTENSIONS:
+        return read_plans_from_workbook(file_path, cache_dir)
+    return read_plans_from_csv(file_path)
+
+
+def write_census_csv(extracted, file_path):
+    """
+    Write extracted workbook values as a census CSV in the data_files/tests layout
+    (plan name in an unnamed first column, blanks for missing values).
+    """
+    raw = build_plan_columns(extracted, defaults=False)
+    with open(file_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([''] + list(CSV_COLUMNS))
+        for row in range(len(raw['plan_name'])):
+            writer.writerow([raw['plan_name'][row]] + [_csv_value(raw[column][row]) for column in CSV_COLUMNS])
+
+
+#private helper methods
+def _read_cache(cache_dir, file_hash):
+    """Cached extracted values of a workbook hash, or None if missing, unreadable or in an older format."""
+    cache_path = os.path.join(cache_dir, f"{file_hash}.json")
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, 'r') as f:
+            values = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if values.get('format_version') != EXTRACT_FORMAT_VERSION:
+        return None
+    return values
+
+
+def _label(value):
+    """A cell used as a row label, stripped."""
+    return value.strip() if isinstance(value, str) else value
+
+
+def _text(value):
+    """
+    A name cell as text, None when blank or still the template's "[Enter ... here]" placeholder.
+    """
+    if value is None:
+        return None
+    text = str(value).strip()
+    if not text or (text.startswith('[') and text.endswith(']')):
+        return None
+    return text
+
+
+def _number(value, strict=True):
+    """
+    Convert a cell value to a float, None when blank. Numeric text is parsed; other text (e.g. an
+    Excel error such as '#N/A', '$1,500' or '20%') raises a ValueError, or is None if not strict.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        if not value.strip():
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            if not strict:
+                return None
+            raise ValueError(f"not a number: {value!r}") from None
+    return float(value)
+
+
+def _plan_number(file_path, rows, field, column):
+    """
+    A design or enrollment cell of one plan as a number (see _number), with the workbook, row label
+    and plan column in the error.
+    """
+    try:
+        return _number(rows[field][column])
+    except ValueError as e:
+        letter = chr(ord('A') + FIRST_PLAN_COLUMN - 1 + column)
+        raise ValueError(f"{os.path.basename(file_path)}: '{FIELD_LABELS[field]}' row, plan {column + 1} "
+                         f"(column {letter}): {e}") from None
+
+
+def _optional_int(value):
+    """
+    Convert an optional number to int (None stays None), like read_plans_from_csv does for copays.
+    """
+    return None if value is None else int(value)
+
+
+def _csv_value(value):
+    """A census value for the CSV layout: whole numbers without a decimal point, blanks for None."""
+    if value is None:
+        return ''
+    return int(value) if float(value).is_integer() else value
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+    output_dir = sys.argv[1]
+    os.makedirs(output_dir, exist_ok=True)
+    for workbook_values in extract_workbooks(sys.argv[2:]):
+        census_path = os.path.join(output_dir, os.path.splitext(workbook_values['workbook'])[0] + '.csv')
+        write_census_csv(workbook_values, census_path)
+        print(f"{workbook_values['workbook']}: {len(workbook_values['plans'])} plan(s) -> {census_path}")
@@ -0,0 +1,124 @@
+"""
+Regression harness against the Excel models in data_files/excel_models/.
+
+Instead of hand-transcribing expected BRFs into Test.py, the harness reads the plan designs,
+the census and the expected plan-level ("Approximate Relativity") and group-level
+("Composite") values straight from each workbook and checks every pricing engine against them.
+
+Workbooks are read with the production census ingest (excel_ingest): parsed in read-only
+streaming mode, in parallel, and cached in JSON files keyed by the SHA-256 of the workbook, so
+unchanged workbooks are only parsed once.
+"""
+import glob
+import os
+import sys
+
+from brf_calculation import calculate_group_brf
+from batch_pricing import calculate_group_brf_batch, price_plan_columns, plans_to_columns
+#extraction lives in the production ingest (extract_workbook_values* are re-exported for existing callers)
+from excel_ingest import (DEFAULT_CACHE_DIR, build_plans, extract_workbook_values, extract_workbook_values_cached,
+                          extract_workbooks)
+from rate_book import RateBook, as_rate_book
+
+EXCEL_MODELS_DIR = 'data_files/excel_models'
+DEFAULT_TOLERANCE = 1e-5
+
+
+#engines
+def _price_row_wise(plans, rate_book, registry):
+    """Reference engine: Plan.calculate_plan_brf via calculate_group_brf."""
+    group_brf = calculate_group_brf(plans, rate_book)
+    return [plan.plan_brf for plan in plans], group_brf
+
+
+def _price_vectorized(plans, rate_book, registry):
+    """Vectorized engine with a freshly compiled distribution engine."""
+    tables = rate_book.table_arguments
+    results = price_plan_columns(plans_to_columns(plans), *tables)
+    return list(results['plan_brf']), calculate_group_brf_batch(plans, *tables)
+
+
+def _price_cached(plans, rate_book, registry):
+    """Vectorized engine using the registry's cached, precompiled distribution engine."""
+    engine = registry.get_engine()
+    tables = rate_book.table_arguments
+    results = price_plan_columns(plans_to_columns(plans), *tables, engine=engine)
+    return list(results['plan_brf']), calculate_group_brf_batch(plans, *tables, engine=engine)
+
+
+def _price_rate_book(plans, rate_book, registry):
+    """Vectorized engine on the RateBook's precomputed band edges, base plan indices and arrays."""
+    results = rate_book.price_plan_columns(plans_to_columns(plans))
+    return list(results['plan_brf']), rate_book.calculate_group_brf(plans)
+
+
+ENGINES = {
+    'row-wise': _price_row_wise,
+    'vectorized': _price_vectorized,
+    'cached': _price_cached,
+    'rate-book': _price_rate_book
+}
+
+
+def check_workbook(extracted, tables, registry, tolerance=DEFAULT_TOLERANCE, engines=None):
+    """
+    Price the workbook census with every engine and compare to the workbook's expected values.
+    Args:
+        extracted: Values returned by extract_workbook_values
+        tables: RateBook (or a tuple of the seven table arguments taken by calculate_group_brf)
+        registry: DistributionRegistry used by the cached engine
+        tolerance: Maximum allowed absolute difference
+        engines: Optional list of engine names (defaults to all)
+    Returns:
+        List of result dictionaries (one per engine)
+    """
+    expected_plan_brfs = [plan['expected_plan_brf'] for plan in extracted['plans']]
+    if extracted['expected_group_brf'] is None or None in expected_plan_brfs:
+        raise ValueError(f"{extracted['workbook']}: the workbook has no expected plan and composite relativities")
+    rate_book = as_rate_book(tables)
+    results = []
+    for name in engines or ENGINES:
+        plan_brfs, group_brf = ENGINES[name](build_plans(extracted), rate_book, registry)
+        plan_error = max(abs(actual - expected) for actual, expected in zip(plan_brfs, expected_plan_brfs))
+        group_error = abs(group_brf - extracted['expected_group_brf'])
+        results.append({
+            'workbook': extracted['workbook'],
+            'engine': name,
+            'group_brf': float(group_brf),
+            'expected_group_brf': extracted['expected_group_brf'],
+            'max_plan_error': float(plan_error),
+            'group_error': float(group_error),
+            'passed': bool(plan_error <= tolerance and group_error <= tolerance)
+        })
+    return results
+
+
+def run_regression(file_paths=None, tolerance=DEFAULT_TOLERANCE, cache_dir=DEFAULT_CACHE_DIR,
+                   max_workers=None, engines=None):
+    """
+    Extract every workbook and check every engine against it.
+    Args:
+        file_paths: Workbooks to check (defaults to every .xlsm in data_files/excel_models/)
+    Returns:
+        List of result dictionaries (see check_workbook)
+    """
+    from constants import DISTRIBUTION_REGISTRY
+
+    if file_paths is None:
+        file_paths = sorted(glob.glob(os.path.join(EXCEL_MODELS_DIR, '*.xlsm')))
+    tables = RateBook.from_constants()
+
+    results = []
+    for extracted in extract_workbooks(file_paths, cache_dir=cache_dir, max_workers=max_workers):
+        results.extend(check_workbook(extracted, tables, DISTRIBUTION_REGISTRY, tolerance, engines))
+    return results
+
+
+if __name__ == "__main__":
+    #run the regression on the given workbooks (or every Excel model) and print a report
+    report = run_regression(sys.argv[1:] or None)
+    for result in report:
+        status = 'PASS' if result['passed'] else 'FAIL'
+        print(f"{status} {result['workbook']} [{result['engine']}] group BRF {result['group_brf']:.6f} "
+              f"(expected {result['expected_group_brf']:.6f}, max plan error {result['max_plan_error']:.2e})")
+    sys.exit(0 if all(result['passed'] for result in report) else 1)
@@ -24,6 +24,41 @@ CREATED_BY = "Amy Zhou"
 CURATIVE_SOURCE = "Curative Inc"
 MILLIMAN_SOURCE = "Milliman"
 
+#reference table name -> JSON mirror holding its metadata
+TABLE_JSON_FILES = {
+    'claims_probability_distribution': 'json_files/claims_probability_distribution.json',
+    'deductible_thresholds': 'json_files/thresholds/threshold_match_deductible.json',
+    'coinsurance_thresholds': 'json_files/thresholds/threshold_match_coinsurance.json',
+    'moop_thresholds': 'json_files/thresholds/threshold_match_moop.json',
+    'pcp_copays': 'json_files/copays/pcp_copays.json',
+    'spc_copays': 'json_files/copays/spc_copays.json',
+    'er_copays': 'json_files/copays/er_copays.json'
+}
+
+def get_table_versions():
+    """
+    Read the version of every reference table from its JSON metadata.
+    Returns:
+        Dictionary of table name -> version string (None if the JSON file is missing)
+    """
+    versions = {}
+    for name, json_path in TABLE_JSON_FILES.items():
+        metadata = read_json_metadata(json_path)
+        versions[name] = metadata.get('version') if metadata else None
+    return versions
+
+def get_table_version_key(table_versions=None):
+    """
+    Combine the reference table versions into one string, e.g. for storing next to a quote.
+    Args:
+        table_versions: Dictionary of table name -> version (defaults to get_table_versions())
+    Returns:
+        String like 'claims_probability_distribution=1.0;coinsurance_thresholds=1.2;...'
+    """
+    if table_versions is None:
+        table_versions = get_table_versions()
+    return ';'.join(f"{name}={table_versions[name]}" for name in sorted(table_versions))
+
 def get_file_modification_time(file_path):
     """Get the modification time of a file, or None if it doesn't exist."""
     if os.path.exists(file_path):
@@ -0,0 +1,183 @@
+"""
+Optional Numba-compiled pricing kernels.
+
+batch_pricing prices a chunk of plans with several NumPy passes (one per threshold band,
+one per searchsorted, one per prefix-sum gather), each allocating temporary arrays. The
+kernel below fuses the threshold lookups of Plan._calculate_index and the deductible /
+corridor / MOOP branches of Plan._base_brf_compute_helper into one compiled loop over plans,
+run in parallel with prange. It uses the sorted prefix sums of a DistributionEngine, so each
+plan costs two binary searches and nothing is allocated per plan.
+
+Compiled kernels are cached on disk (numba's cache=True), so only the first run after a
+change pays the JIT warmup. Copay relativities and the final plan BRF come from
+batch_pricing.finish_plan_pricing, shared with the vectorized engine. On one core the kernel
+is only modestly faster than the NumPy steps it replaces; the gain comes with more cores.
+
+If numba is not installed, NUMBA_AVAILABLE is False and price_plan_columns_numba falls back
+to batch_pricing.price_plan_columns, which gives the same results.
+"""
+import numpy as np
+
+from data_processing import BASE_RATE
+from distribution_engine import DistributionEngine
+from batch_pricing import MISSING_INDEX, price_plan_columns, finish_plan_pricing
+from rate_book import CompiledThresholds, RateBook
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        """Stand-in for numba.njit: returns the function unchanged, so the kernels still run as Python."""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda function: function
+
+
+#kernels
+@njit(cache=True)
+def _band_index(value, lows, highs, indices):
+    """
+    Index of the first band (in table order) with low <= value < high, or MISSING_INDEX.
+    """
+    for i in range(len(lows)):
+        if lows[i] <= value < highs[i]:
+            return indices[i]
+    return MISSING_INDEX
+
+
+@njit(cache=True)
+def _search_left(sorted_values, value):
+    """
+    Same as np.searchsorted(sorted_values, value, side='left') for one value.
+    """
+    low = 0
+    high = len(sorted_values)
+    while low < high:
+        middle = (low + high) // 2
+        if sorted_values[middle] < value:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+@njit(cache=True, parallel=True)
+def _price_kernel(claims, cumulative_frequency, cumulative_claims,
+                  deductibles, coinsurances, moops,
+                  deductible_lows, deductible_highs, deductible_indices,
+                  coinsurance_lows, coinsurance_highs, coinsurance_indices,
+                  moop_lows, moop_highs, moop_indices,
+                  base_brf, deductible_index, coinsurance_index, moop_index):
+    """
+    Threshold indices and base BRF for every plan, written into the output arrays.
+    """
+    total_freq = cumulative_frequency[-1]
+    total_claims = cumulative_claims[-1]
+    for i in prange(len(deductibles)):
+        d = deductibles[i]
+        c = coinsurances[i]
+        m = moops[i]
+
+        deductible_index[i] = _band_index(d, deductible_lows, deductible_highs, deductible_indices)
+        coinsurance_index[i] = _band_index(c, coinsurance_lows, coinsurance_highs, coinsurance_indices)
+        moop_index[i] = _band_index(m, moop_lows, moop_highs, moop_indices)
+
+        #bins below the deductible pay nothing, bins in the corridor pay (1 - c) of the excess,
+        #and bins past the corridor pay everything above the moop (no corridor end when c is 0)
+        deductible_pos = _search_left(claims, d)
+        if c == 0:
+            corridor_pos = len(claims)
+        else:
+            corridor_pos = max(_search_left(claims, d + (m - d) / c), deductible_pos)
+
+        corridor = (1 - c) * ((cumulative_claims[corridor_pos] - cumulative_claims[deductible_pos]) -
+                              d * (cumulative_frequency[corridor_pos] - cumulative_frequency[deductible_pos]))
+        tail = (total_claims - cumulative_claims[corridor_pos]) - m * (total_freq - cumulative_frequency[corridor_pos])
+        base_brf[i] = (corridor + tail) / 12 / BASE_RATE
+
+
+#pricing
+def threshold_arrays(threshold_data):
+    """
+    Convert a threshold dictionary (or CompiledThresholds) to (lows, highs, indices) arrays in table order.
+    """
+    if isinstance(threshold_data, CompiledThresholds):
+        return threshold_data.lows, threshold_data.highs, threshold_data.indices
+    lows = np.array([low for low, _ in threshold_data.values()], dtype=np.float64)
+    highs = np.array([high for _, high in threshold_data.values()], dtype=np.float64)
+    indices = np.array(list(threshold_data), dtype=np.int64)
+    return lows, highs, indices
+
+
+def price_indices_and_base_brf(engine, deductibles, coinsurances, moops,
+                               deductible_threshold_data, coinsurance_threshold_data, moop_threshold_data):
+    """
+    Run the fused kernel for columns of plan designs.
+    Args:
+        engine: DistributionEngine (float64) for the claims distribution
+        deductibles, coinsurances, moops: Arrays of plan designs
+        deductible_threshold_data, coinsurance_threshold_data, moop_threshold_data: Threshold dictionaries
+    Returns:
+        Tuple of (deductible_index, moop_index, coinsurance_index, base_brf) arrays,
+        with MISSING_INDEX where no band matches
+    """
+    deductibles = np.ascontiguousarray(deductibles, dtype=np.float64)
+    coinsurances = np.ascontiguousarray(coinsurances, dtype=np.float64)
+    moops = np.ascontiguousarray(moops, dtype=np.float64)
+
+    n_plans = len(deductibles)
+    base_brf = np.empty(n_plans)
+    deductible_index = np.empty(n_plans, dtype=np.int64)
+    coinsurance_index = np.empty(n_plans, dtype=np.int64)
+    moop_index = np.empty(n_plans, dtype=np.int64)
+
+    _price_kernel(np.ascontiguousarray(engine.claims, dtype=np.float64),
+                  np.ascontiguousarray(engine.cumulative_frequency, dtype=np.float64),
+                  np.ascontiguousarray(engine.cumulative_claims, dtype=np.float64),
+                  deductibles, coinsurances, moops,
+                  *threshold_arrays(deductible_threshold_data),
+                  *threshold_arrays(coinsurance_threshold_data),
+                  *threshold_arrays(moop_threshold_data),
+                  base_brf, deductible_index, coinsurance_index, moop_index)
+    return deductible_index, moop_index, coinsurance_index, base_brf
+
+
+def price_plan_columns_numba(columns, claims_probability_distribution, deductible_threshold_data=None,
+                             coinsurance_threshold_data=None, moop_threshold_data=None,
+                             pcp_copay_data=None, spc_copay_data=None, er_copay_data=None, engine=None):
+    """
+    Same as batch_pricing.price_plan_columns, with indices and base BRF from the compiled kernel.
+    Falls back to batch_pricing.price_plan_columns when numba is not installed.
+    A RateBook may be passed in place of the seven tables; its compiled engine, threshold
+    arrays and copay tables are used as they are.
+
+    Returns:
+        Dictionary of arrays: deductible_index, moop_index, coinsurance_index, base_plan_index,
+        base_brf, copay_brf and plan_brf
+    """
+    if not NUMBA_AVAILABLE:
+        return price_plan_columns(columns, claims_probability_distribution, deductible_threshold_data,
+                                  coinsurance_threshold_data, moop_threshold_data,
+                                  pcp_copay_data, spc_copay_data, er_copay_data, engine=engine)
+
+    if isinstance(claims_probability_distribution, RateBook):
+        rate_book = claims_probability_distribution
+        engine = rate_book.engine if engine is None else engine
+        deductible_threshold_data, coinsurance_threshold_data, moop_threshold_data = (
+            rate_book.thresholds[name] for name in ('deductible', 'coinsurance', 'moop'))
+        pcp_copay_data, spc_copay_data, er_copay_data = rate_book.compiled_copays
+    elif engine is None:
+        engine = DistributionEngine.from_claims_probability(claims_probability_distribution)
+
+    #step 1 and 2: indices and base brf in one compiled pass
+    deductible_index, moop_index, coinsurance_index, base_brf = price_indices_and_base_brf(
+        engine, columns['deductible'], columns['coinsurance'], columns['moop'],
+        deductible_threshold_data, coinsurance_threshold_data, moop_threshold_data)
+
+    #steps 3 and 4: copay brf and final plan brf
+    return finish_plan_pricing(columns, deductible_index, moop_index, coinsurance_index, base_brf,
+                               pcp_copay_data, spc_copay_data, er_copay_data)
@@ -0,0 +1,97 @@
+"""
+Reentrant, thread-safe pricing.
+
+Plan.calculate_plan_brf() stores every intermediate result on the Plan, and calculate_group_brf
+reads them back, so the same plans cannot be priced from several threads at once. The functions
+here never write to a Plan: they read the plan designs, price them against a compiled, read-only
+rate_book.RateBook, and return immutable PlanPrice / GroupPrice tuples.
+
+The RateBook is built once and shared by every thread (nothing in it can be modified after it is
+built), so a thread pool prices groups without copying or pickling the tables. numpy releases
+the GIL in the heavy array operations, and on a free-threaded CPython build the whole path runs
+in parallel.
+"""
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from batch_pricing import plans_to_columns, weighted_group_brf
+from rate_book import RateBook, as_rate_book
+
+PlanPrice = namedtuple('PlanPrice', ['plan_id', 'deductible_index', 'moop_index', 'coinsurance_index',
+                                     'base_plan_index', 'base_brf', 'copay_brf', 'plan_brf', 'total_enrollment'])
+PlanPrice.__doc__ = "Immutable result of pricing one plan (indices are MISSING_INDEX when out of band)."
+
+GroupPrice = namedtuple('GroupPrice', ['group_id', 'plans', 'total_enrollment', 'group_brf'])
+GroupPrice.__doc__ = "Immutable result of pricing one group: its PlanPrice tuple and the weighted group BRF."
+
+
+def compile_pricing_tables(claims_probability_distribution, deductible_threshold_data, coinsurance_threshold_data,
+                           moop_threshold_data, pcp_copay_data, spc_copay_data, er_copay_data, engine=None):
+    """
+    Compile the seven table arguments of calculate_group_brf once for shared, read-only use.
+    Args:
+        engine: Optional already compiled DistributionEngine for the distribution
+    Returns:
+        A RateBook
+    """
+    return RateBook(claims_probability_distribution, deductible_threshold_data, coinsurance_threshold_data,
+                    moop_threshold_data, pcp_copay_data, spc_copay_data, er_copay_data, engine=engine)
+
+
+def price_plans(plans, tables):
+    """
+    Price a list of plans without modifying them.
+    Args:
+        plans: List of Plan objects
+        tables: RateBook (e.g. from compile_pricing_tables), or a tuple of the seven table arguments
+    Returns:
+        Tuple of PlanPrice, one per plan
+    """
+    if not plans:
+        return ()
+    columns = plans_to_columns(plans)
+    results = as_rate_book(tables).price_plan_columns(columns)
+    return tuple(PlanPrice(plan.plan_id, *values, plan.total_enrollment) for plan, values in zip(plans, zip(
+        results['deductible_index'].tolist(), results['moop_index'].tolist(), results['coinsurance_index'].tolist(),
+        results['base_plan_index'].tolist(), results['base_brf'].tolist(), results['copay_brf'].tolist(),
+        results['plan_brf'].tolist())))
+
+
+def price_plan(plan, tables):
+    """
+    Price one plan without modifying it.
+    Returns:
+        A PlanPrice
+    """
+    return price_plans([plan], tables)[0]
+
+
+def price_group(plans, tables, group_id=None):
+    """
+    Pure version of calculate_group_brf: Σ(Plan BRF × Enrollment) / Σ(Enrollment), without
+    modifying the plans.
+    Returns:
+        A GroupPrice
+    """
+    plan_prices = price_plans(plans, tables)
+    enrollment = np.array([price.total_enrollment for price in plan_prices], dtype=float)
+    plan_brf = np.array([price.plan_brf for price in plan_prices])
+    return GroupPrice(group_id, plan_prices, float(enrollment.sum()), weighted_group_brf(plan_brf, enrollment))
+
+
+def price_groups_threaded(groups, tables, max_workers=None):
+    """
+    Price many groups on a thread pool sharing one RateBook.
+    Args:
+        groups: Dictionary of group_id -> list of Plan objects
+        tables: RateBook, or a tuple of the seven table arguments (compiled once for every thread)
+        max_workers: Number of threads (ThreadPoolExecutor default if None)
+    Returns:
+        Dictionary of group_id -> GroupPrice, in input order
+    """
+    tables = as_rate_book(tables)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {group_id: executor.submit(price_group, plans, tables, group_id) for group_id, plans in groups.items()}
+        return {group_id: future.result() for group_id, future in futures.items()}
@@ -0,0 +1,275 @@
+"""
+SQLite store of priced quotes.
+
+Every priced group is saved with its plans, the quote date, the reference table version it
+was priced on and the content hash of those tables (data_processing.reference_tables_hash).
+Quotes can be looked up by group, by date and by plan design, and a plan design that was
+already priced on tables with the same content hash is reused instead of recomputed. Reuse is
+keyed on the hash rather than the version label because the CSVs can be edited without a
+version bump; table_store.find_version maps the hash back to a snapshot for repricing.
+"""
+import sqlite3
+from datetime import date, datetime
+
+from data_processing import iso_date
+
+
+DEFAULT_DB_PATH = 'quote_history.db'
+DEFAULT_BATCH_SIZE = 1000
+
+DESIGN_FIELDS = ('deductible', 'coinsurance', 'moop', 'pcp', 'spc', 'er')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS quotes (
+    quote_id INTEGER PRIMARY KEY,
+    group_id TEXT NOT NULL,
+    quote_date TEXT NOT NULL,
+    table_version TEXT NOT NULL,
+    tables_hash TEXT,
+    group_brf REAL,
+    total_enrollment INTEGER,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS quote_plans (
+    quote_id INTEGER NOT NULL REFERENCES quotes(quote_id),
+    group_id TEXT NOT NULL,
+    table_version TEXT NOT NULL,
+    tables_hash TEXT,
+    design_key TEXT NOT NULL,
+    plan_id INTEGER,
+    plan_name TEXT,
+    deductible REAL,
+    coinsurance REAL,
+    moop REAL,
+    pcp REAL,
+    spc REAL,
+    er REAL,
+    total_enrollment INTEGER,
+    deductible_index INTEGER,
+    moop_index INTEGER,
+    coinsurance_index INTEGER,
+    base_brf REAL,
+    copay_brf REAL,
+    plan_brf REAL
+);
+CREATE INDEX IF NOT EXISTS idx_quotes_group ON quotes (group_id);
+CREATE INDEX IF NOT EXISTS idx_quotes_date ON quotes (quote_date);
+CREATE INDEX IF NOT EXISTS idx_quotes_table_version ON quotes (table_version);
+CREATE INDEX IF NOT EXISTS idx_quote_plans_quote ON quote_plans (quote_id);
+CREATE INDEX IF NOT EXISTS idx_quote_plans_group ON quote_plans (group_id);
+CREATE INDEX IF NOT EXISTS idx_quote_plans_design ON quote_plans (design_key, table_version);
+"""
+
+#databases created before tables_hash was recorded get the column (NULL, so never reused) and its index
+HASH_MIGRATION = ('quotes', 'quote_plans')
+HASH_INDEX = "CREATE INDEX IF NOT EXISTS idx_quote_plans_design_hash ON quote_plans (design_key, tables_hash);"
+
+PLAN_COLUMNS = ('quote_id', 'group_id', 'table_version', 'tables_hash', 'design_key', 'plan_id', 'plan_name',
+                'deductible', 'coinsurance', 'moop', 'pcp', 'spc', 'er', 'total_enrollment',
+                'deductible_index', 'moop_index', 'coinsurance_index', 'base_brf', 'copay_brf', 'plan_brf')
+
+
+def design_key(design):
+    """
+    Normalized text key for a plan design tuple (deductible, coinsurance, moop, pcp, spc, er).
+    Missing copays (None, NaN or 0) are all stored as blank, since they price the same.
+    """
+    deductible, coinsurance, moop, pcp, spc, er = design
+    parts = [repr(float(value)) for value in (deductible, coinsurance, moop)]
+    for copay in (pcp, spc, er):
+        parts.append('' if copay is None or copay != copay or copay == 0 else repr(float(copay)))
+    return '|'.join(parts)
+
+
+def plan_design(plan):
+    """Returns the design tuple of a Plan."""
+    return (plan.deductible, plan.coinsurance, plan.moop, plan.pcp_copay, plan.spc_copay, plan.er_copay)
+
+
+class QuoteStore:
+    def __init__(self, db_path=DEFAULT_DB_PATH, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Open (or create) a quote store.
+        Args:
+            db_path: Path of the SQLite database file (':memory:' for a temporary store)
+            batch_size: Number of groups saved per transaction by save_groups()
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self._connection = sqlite3.connect(db_path)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL" if db_path != ':memory:' else "PRAGMA journal_mode=MEMORY")
+        self._connection.executescript(SCHEMA)
+        for table in HASH_MIGRATION:
+            columns = [row['name'] for row in self._connection.execute(f"PRAGMA table_info({table})")]
+            if 'tables_hash' not in columns:
+                self._connection.execute(f"ALTER TABLE {table} ADD COLUMN tables_hash TEXT")
+        self._connection.execute(HASH_INDEX)
+
+    #saving quotes
+    def save_group(self, group_id, plans, group_brf, table_version, quote_date=None, tables_hash=None):
+        """
+        Save one priced group (the plans must already be priced).
+        Args:
+            tables_hash: Content hash of the tables the group was priced on (load_reference_tables()['tables_hash']).
+                         Plans saved without it are never reused by price_plan.
+        Returns:
+            The new quote_id
+        """
+        with self._connection:
+            return self._insert_group(group_id, plans, group_brf, table_version, quote_date, tables_hash)
+
+    def save_groups(self, quotes):
+        """
+        Bulk-save priced groups in batched transactions.
+        Args:
+            quotes: Iterable of (group_id, plans, group_brf, table_version, quote_date[, tables_hash]) tuples
+        Returns:
+            List of the new quote_ids
+        """
+        quote_ids = []
+        batch = []
+        for quote in quotes:
+            batch.append(quote)
+            if len(batch) >= self.batch_size:
+                quote_ids.extend(self._save_batch(batch))
+                batch = []
+        if batch:
+            quote_ids.extend(self._save_batch(batch))
+        return quote_ids
+
+    #queries
+    def find_quotes_by_group(self, group_id):
+        """Returns every quote for a group (newest first) as dictionaries."""
+        return self._query("SELECT * FROM quotes WHERE group_id = ? ORDER BY quote_date DESC, quote_id DESC",
+                           (str(group_id),))
+
+    def find_quotes_by_date(self, start_date, end_date=None):
+        """Returns the quotes with start_date <= quote_date <= end_date (end defaults to start)."""
+        end_date = start_date if end_date is None else end_date
+        return self._query("SELECT * FROM quotes WHERE quote_date BETWEEN ? AND ? ORDER BY quote_date, quote_id",
+                           (iso_date(start_date), iso_date(end_date)))
+
+    def find_plans_by_design(self, design, table_version=None):
+        """Returns every stored plan with the given design tuple (optionally on one table version)."""
+        if table_version is None:
+            return self._query("SELECT * FROM quote_plans WHERE design_key = ?", (design_key(design),))
+        return self._query("SELECT * FROM quote_plans WHERE design_key = ? AND table_version = ?",
+                           (design_key(design), table_version))
+
+    def get_quote_plans(self, quote_id):
+        """Returns the plans of one quote."""
+        return self._query("SELECT * FROM quote_plans WHERE quote_id = ? ORDER BY plan_id", (quote_id,))
+
+    def lookup_design(self, design, tables_hash):
+        """
+        Returns the stored indices and BRFs for a design priced on tables with this content hash, or None.
+        """
+        rows = self._query("SELECT deductible_index, moop_index, coinsurance_index, base_brf, copay_brf, plan_brf "
+                           "FROM quote_plans WHERE design_key = ? AND tables_hash = ? LIMIT 1",
+                           (design_key(design), tables_hash))
+        return rows[0] if rows else None
+
+    #pricing with reuse
+    def price_plan(self, plan, tables_hash, claims_probability_distribution, deductible_threshold_data=None,
+                   coinsurance_threshold_data=None, moop_threshold_data=None, pcp_copay_data=None,
+                   spc_copay_data=None, er_copay_data=None):
+        """
+        Price a plan, reusing the stored result if the same design was priced on tables with the same content hash.
+        The Plan's indices and BRF attributes are set either way.
+        Args:
+            tables_hash: Content hash of the given tables (load_reference_tables()['tables_hash'])
+            claims_probability_distribution ... er_copay_data: Reference tables, or a RateBook in place of all seven
+        Returns:
+            The plan BRF
+        """
+        stored = self.lookup_design(plan_design(plan), tables_hash)
+        if stored is None:
+            return plan.calculate_plan_brf(claims_probability_distribution, deductible_threshold_data,
+                                           coinsurance_threshold_data, moop_threshold_data,
+                                           pcp_copay_data, spc_copay_data, er_copay_data)
+
+        plan.deductible_index = stored['deductible_index']
+        plan.moop_index = stored['moop_index']
+        plan.coinsurance_index = stored['coinsurance_index']
+        plan.base_brf = stored['base_brf']
+        plan.copay_brf = stored['copay_brf']
+        plan.plan_brf = stored['plan_brf']
+        return plan.plan_brf
+
+    def calculate_group_brf(self, plans, tables_hash, claims_probability_distribution, deductible_threshold_data=None,
+                            coinsurance_threshold_data=None, moop_threshold_data=None,
+                            pcp_copay_data=None, spc_copay_data=None, er_copay_data=None):
+        """
+        Same as brf_calculation.calculate_group_brf, but reusing stored plan results where possible.
+        """
+        total_group_enrollment = 0
+        weighted_group_brf = 0
+        for plan in plans:
+            self.price_plan(plan, tables_hash, claims_probability_distribution, deductible_threshold_data,
+                            coinsurance_threshold_data, moop_threshold_data,
+                            pcp_copay_data, spc_copay_data, er_copay_data)
+            weighted_group_brf += plan.plan_brf * plan.total_enrollment
+            total_group_enrollment += plan.total_enrollment
+        if total_group_enrollment == 0:
+            raise ValueError("Cannot calculate a group BRF: the group has zero total enrollment.")
+        return weighted_group_brf / total_group_enrollment
+
+    def close(self):
+        """Close the database connection."""
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    #private helper methods
+    def _save_batch(self, batch):
+        """
+        Save a batch of groups in one transaction.
+        """
+        with self._connection:
+            return [self._insert_group(*quote) for quote in batch]
+
+    def _insert_group(self, group_id, plans, group_brf, table_version, quote_date=None, tables_hash=None):
+        """
+        Insert one group and its plans (the caller handles the transaction).
+        """
+        cursor = self._connection.execute(
+            "INSERT INTO quotes (group_id, quote_date, table_version, tables_hash, group_brf, total_enrollment, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (str(group_id), iso_date(quote_date or date.today()), table_version, tables_hash, _float(group_brf),
+             int(sum(plan.total_enrollment for plan in plans)), datetime.now().isoformat() + "Z"))
+        quote_id = cursor.lastrowid
+
+        rows = []
+        for plan in plans:
+            if plan.plan_brf is None:
+                raise ValueError(f"Plan {plan.plan_id} must be priced before it is saved.")
+            rows.append((quote_id, str(group_id), table_version, tables_hash, design_key(plan_design(plan)),
+                         plan.plan_id, plan.plan_name,
+                         _float(plan.deductible), _float(plan.coinsurance), _float(plan.moop),
+                         _float(plan.pcp_copay), _float(plan.spc_copay), _float(plan.er_copay),
+                         int(plan.total_enrollment),
+                         _int(plan.deductible_index), _int(plan.moop_index), _int(plan.coinsurance_index),
+                         _float(plan.base_brf), _float(plan.copay_brf), _float(plan.plan_brf)))
+        self._connection.executemany(
+            f"INSERT INTO quote_plans ({', '.join(PLAN_COLUMNS)}) VALUES ({', '.join('?' * len(PLAN_COLUMNS))})",
+            rows)
+        return quote_id
+
+    def _query(self, sql, parameters):
+        """Run a query and return the rows as dictionaries."""
+        return [dict(row) for row in self._connection.execute(sql, parameters)]
+
+
+def _float(value):
+    """Convert to a plain float for SQLite (None and NaN stay NULL)."""
+    return None if value is None or value != value else float(value)
+
+
+def _int(value):
+    """Convert to a plain int for SQLite (None stays NULL)."""
+    return None if value is None else int(value)
@@ -0,0 +1,268 @@
+"""
+RateBook: the seven reference tables compiled once into an immutable pricing object.
+
+Plan.calculate_plan_brf, calculate_group_brf and the batch engines take seven positional table
+arguments and re-derive the same things on every call: the band edges of the threshold tables,
+the base plan index of every band combination, the sorted distribution arrays and the flattened
+copay tables. A RateBook computes all of them once:
+
+    thresholds       CompiledThresholds per threshold table (band edges -> first matching band)
+    base_plan_index  3D array of base plan indices by (deductible, moop, coinsurance) band position
+    engine           DistributionEngine (sorted claims and prefix sums)
+    compiled_copays  CompiledCopayTable for the PCP, SPC and ER tables
+
+Every pricing API accepts a RateBook in place of the seven tables (pass it as the first table
+argument and leave the others out), and table_arguments gives the seven tables back for code
+that still needs them. A RateBook cannot be modified after it is built (its arrays are read-only
+and its dictionaries are read-only views), and it pickles to its plain tables and arrays, so it is
+cheap to send to worker processes.
+"""
+from types import MappingProxyType
+
+import numpy as np
+
+from batch_pricing import (MISSING_INDEX, CompiledCopayTable, calculate_group_brf_batch, combine_base_plan_index,
+                           finish_plan_pricing, price_plan_columns)
+from data_processing import REFERENCE_TABLE_FILES, load_reference_tables
+from distribution_engine import DistributionEngine
+
+THRESHOLD_TABLES = ('deductible', 'moop', 'coinsurance')
+
+
+class CompiledThresholds:
+    """
+    A threshold table (threshold_data[index] = (low, high)) compiled to sorted band edges.
+    Between two consecutive edges the matching bands cannot change, so the first matching band
+    (in table order, as in Plan._calculate_index) is stored once per interval and every value is
+    looked up with one binary search, even when bands overlap.
+    """
+    __slots__ = ('indices', 'lows', 'highs', 'edges', 'interval_positions')
+
+    def __init__(self, threshold_data):
+        """
+        Args:
+            threshold_data: Dictionary with threshold match as key and (low, high) tuple as value
+        """
+        self.indices = np.array(list(threshold_data), dtype=np.int64)
+        self.lows = np.array([low for low, _ in threshold_data.values()], dtype=np.float64)
+        self.highs = np.array([high for _, high in threshold_data.values()], dtype=np.float64)
+        self.edges = np.unique(np.concatenate((self.lows, self.highs)))
+
+        #position (in table order) of the first band covering [edges[i], edges[i + 1]), -1 if none
+        left = self.edges[:-1, None]
+        covers = (self.lows[None, :] <= left) & (left < self.highs[None, :])
+        self.interval_positions = np.where(covers.any(axis=1), covers.argmax(axis=1), -1).astype(np.int64)
+        for array in (self.indices, self.lows, self.highs, self.edges, self.interval_positions):
+            array.flags.writeable = False
+
+    def positions(self, values):
+        """
+        Position (in table order) of the first band where low <= value < high, -1 where none matches.
+        """
+        values = np.asarray(values, dtype=float)
+        if not len(self.interval_positions):
+            return np.full(values.shape, -1, dtype=np.int64)
+        interval = np.searchsorted(self.edges, values, side='right') - 1
+        inside = (interval >= 0) & (interval < len(self.interval_positions))
+        return np.where(inside, self.interval_positions[np.clip(interval, 0, len(self.interval_positions) - 1)], -1)
+
+    def indices_at(self, positions):
+        """
+        Band indices at band positions, MISSING_INDEX where the position is -1.
+        """
+        found = positions >= 0
+        result = np.full(positions.shape, MISSING_INDEX, dtype=np.int64)
+        result[found] = self.indices[positions[found]]
+        return result
+
+    def lookup(self, values):
+        """
+        Same as batch_pricing.calculate_indices_array: the matching band index, MISSING_INDEX where none matches.
+        """
+        return self.indices_at(self.positions(values))
+
+
+class RateBook:
+    __slots__ = ('claims_probability_distribution', 'deductible_threshold_data', 'coinsurance_threshold_data',
+                 'moop_threshold_data', 'pcp_copay_data', 'spc_copay_data', 'er_copay_data',
+                 'tables_hash', 'engine', 'thresholds', 'base_plan_index', 'compiled_copays')
+
+    def __init__(self, claims_probability_distribution, deductible_threshold_data, coinsurance_threshold_data,
+                 moop_threshold_data, pcp_copay_data, spc_copay_data, er_copay_data, tables_hash=None, engine=None):
+        """
+        Compile the seven table arguments of calculate_group_brf.
+        Args:
+            claims_probability_distribution ... er_copay_data: Reference tables (see Plan.calculate_plan_brf)
+            tables_hash: Optional content hash of the tables (load_reference_tables()['tables_hash']),
+                         used as the design cache key
+            engine: Optional already compiled DistributionEngine for the distribution
+        """
+        if engine is None:
+            engine = DistributionEngine.from_claims_probability(claims_probability_distribution)
+        thresholds = {
+            'deductible': CompiledThresholds(deductible_threshold_data),
+            'moop': CompiledThresholds(moop_threshold_data),
+            'coinsurance': CompiledThresholds(coinsurance_threshold_data)
+        }
+        base_plan_index = combine_base_plan_index(thresholds['deductible'].indices[:, None, None],
+                                                  thresholds['moop'].indices[None, :, None],
+                                                  thresholds['coinsurance'].indices[None, None, :])
+        compiled_copays = tuple(CompiledCopayTable(copay_data)
+                                for copay_data in (pcp_copay_data, spc_copay_data, er_copay_data))
+        for array in [base_plan_index] + [getattr(table, name) for table in compiled_copays
+                                          for name in CompiledCopayTable.__slots__]:
+            array.flags.writeable = False
+
+        self._set(claims_probability_distribution=claims_probability_distribution,
+                  deductible_threshold_data=_read_only(deductible_threshold_data),
+                  coinsurance_threshold_data=_read_only(coinsurance_threshold_data),
+                  moop_threshold_data=_read_only(moop_threshold_data),
+                  pcp_copay_data=_read_only(pcp_copay_data),
+                  spc_copay_data=_read_only(spc_copay_data),
+                  er_copay_data=_read_only(er_copay_data),
+                  tables_hash=tables_hash, engine=engine, thresholds=MappingProxyType(thresholds),
+                  base_plan_index=base_plan_index, compiled_copays=compiled_copays)
+
+    #constructors
+    @classmethod
+    def from_reference_tables(cls, tables):
+        """
+        Build a RateBook from the dictionary returned by load_reference_tables (or a table set of
+        table_store / table_reloader, reusing its compiled engine).
+        """
+        return cls(*(tables[name] for name in REFERENCE_TABLE_FILES), tables_hash=tables.get('tables_hash'),
+                   engine=tables.get('engine'))
+
+    @classmethod
+    def from_data_dir(cls, data_dir='data_files'):
+        """
+        Build a RateBook from the reference CSVs of a data directory laid out like data_files/.
+        """
+        return cls.from_reference_tables(load_reference_tables(data_dir))
+
+    @classmethod
+    def from_constants(cls):
+        """
+        Build a RateBook from the tables loaded by constants (read from data_files/).
+        """
+        from constants import (CLAIMS_PROBABILITY_DISTRIBUTION, DEDUCTIBLE_THRESHOLD_DATA, COINSURANCE_THRESHOLD_DATA,
+                               MOOP_THRESHOLD_DATA, PCP_COPAY_DATA, SPC_COPAY_DATA, ER_COPAY_DATA)
+        from data_processing import reference_tables_hash
+
+        return cls(CLAIMS_PROBABILITY_DISTRIBUTION, DEDUCTIBLE_THRESHOLD_DATA, COINSURANCE_THRESHOLD_DATA,
+                   MOOP_THRESHOLD_DATA, PCP_COPAY_DATA, SPC_COPAY_DATA, ER_COPAY_DATA,
+                   tables_hash=reference_tables_hash('data_files'))
+
+    @property
+    def table_arguments(self):
+        """
+        Returns the seven table arguments of calculate_group_brf (in order), for the old signatures.
+        """
+        return (self.claims_probability_distribution, self.deductible_threshold_data, self.coinsurance_threshold_data,
+                self.moop_threshold_data, self.pcp_copay_data, self.spc_copay_data, self.er_copay_data)
+
+    #pricing methods
+    def calculate_indices(self, deductibles, coinsurances, moops):
+        """
+        Index arrays of many designs from the precomputed band edges.
+        Returns:
+            (deductible_index, moop_index, coinsurance_index, base_plan_index), with MISSING_INDEX where
+            no band matches (base_plan_index is MISSING_INDEX when any index is)
+        """
+        positions = {name: self.thresholds[name].positions(values)
+                     for name, values in zip(THRESHOLD_TABLES, (deductibles, moops, coinsurances))}
+        indices = [self.thresholds[name].indices_at(positions[name]) for name in THRESHOLD_TABLES]
+        found = (positions['deductible'] >= 0) & (positions['moop'] >= 0) & (positions['coinsurance'] >= 0)
+        base_plan_index = np.full(len(found), MISSING_INDEX, dtype=np.int64)
+        base_plan_index[found] = self.base_plan_index[positions['deductible'][found], positions['moop'][found],
+                                                      positions['coinsurance'][found]]
+        return indices[0], indices[1], indices[2], base_plan_index
+
+    def price_plan_columns(self, columns, cache=None):
+        """
+        Same as batch_pricing.price_plan_columns, using the precomputed indexes and arrays.
+        Args:
+            columns: Dictionary (or DataFrame) with deductible, coinsurance, moop, pcp, spc and er arrays
+            cache: Optional design_cache.DesignCache (keyed by this RateBook's tables_hash)
+        Returns:
+            Dictionary of arrays: deductible_index, moop_index, coinsurance_index, base_plan_index,
+            base_brf, copay_brf and plan_brf
+        """
+        if cache is not None:
+            return price_plan_columns(columns, self, cache=cache)
+        deductible = np.asarray(columns['deductible'], dtype=float)
+        coinsurance = np.asarray(columns['coinsurance'], dtype=float)
+        moop = np.asarray(columns['moop'], dtype=float)
+        deductible_index, moop_index, coinsurance_index, base_plan_index = self.calculate_indices(
+            deductible, coinsurance, moop)
+        base_brf = self.engine.base_brf(deductible, coinsurance, moop)
+        return finish_plan_pricing(columns, deductible_index, moop_index, coinsurance_index, base_brf,
+                                   *self.compiled_copays, base_plan_index=base_plan_index)
+
+    def calculate_group_brf(self, plans):
+        """
+        Vectorized group BRF (see batch_pricing.calculate_group_brf_batch). The Plan objects are not modified.
+        """
+        return calculate_group_brf_batch(plans, self)
+
+    #immutability and pickling
+    def __setattr__(self, name, value):
+        raise AttributeError("RateBook is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("RateBook is immutable")
+
+    def __reduce__(self):
+        #pickle the plain tables and the compiled engine arrays; the small indexes are rebuilt on load
+        return (_rebuild_rate_book, (tuple(_plain(table) for table in self.table_arguments), self.tables_hash,
+                                     self.engine))
+
+    def __repr__(self):
+        return (f"RateBook(tables_hash={self.tables_hash!r}, bins={self.engine.n_bins}, "
+                f"base_plan_indices={self.base_plan_index.size})")
+
+    #private helper methods
+    def _set(self, **values):
+        """Set the attributes once, at construction."""
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+
+def as_rate_book(tables):
+    """
+    Adapter for APIs that take either a RateBook or a tuple of the seven table arguments.
+    Returns:
+        The RateBook itself, or a RateBook compiled from the seven tables
+    """
+    if isinstance(tables, RateBook):
+        return tables
+    return RateBook(*tables)
+
+
+def table_arguments(claims_probability_distribution, *tables):
+    """
+    Adapter for code on the seven-table signatures: returns the seven tables of a RateBook passed
+    as the first argument, or the seven arguments unchanged.
+    """
+    if isinstance(claims_probability_distribution, RateBook):
+        return claims_probability_distribution.table_arguments
+    return (claims_probability_distribution,) + tables
+
+
+#private helper methods
+def _read_only(table):
+    """A read-only view of a threshold or (nested) copay dictionary."""
+    return MappingProxyType({key: MappingProxyType(dict(value)) if hasattr(value, 'items') else value
+                             for key, value in table.items()})
+
+
+def _plain(table):
+    """A read-only table view back as plain dictionaries (the distribution DataFrame is kept as is)."""
+    if not isinstance(table, MappingProxyType):
+        return table
+    return {key: dict(value) if isinstance(value, MappingProxyType) else value for key, value in table.items()}
+
+
+def _rebuild_rate_book(tables, tables_hash, engine):
+    """Unpickle a RateBook without recompiling its distribution engine."""
+    return RateBook(*tables, tables_hash=tables_hash, engine=engine)
@@ -0,0 +1,299 @@
+"""
+Streaming writers for priced plan and group results.
+
+Results are appended to an in-memory buffer and written out in blocks (one CSV append,
+one block of JSON lines or one Parquet row group per flush), so a book of millions of
+plans can be exported without holding every result in memory. Each row also records the
+reference table versions used to price it.
+
+CSV and JSON lines use the standard library; Parquet requires pyarrow.
+"""
+import csv
+import json
+import os
+
+import numpy as np
+
+from batch_pricing import MISSING_INDEX
+
+PLAN_RESULT_FIELDS = (
+    'group_id', 'plan_id', 'plan_name',
+    'deductible', 'coinsurance', 'moop', 'pcp', 'spc', 'er', 'total_enrollment',
+    'deductible_index', 'moop_index', 'coinsurance_index', 'base_plan_index',
+    'base_brf', 'copay_brf', 'plan_brf'
+)
+GROUP_RESULT_FIELDS = ('group_id', 'n_plans', 'total_enrollment', 'group_brf')
+
+#file extension -> format name
+FILE_FORMATS = {
+    '.csv': 'csv',
+    '.jsonl': 'jsonl',
+    '.parquet': 'parquet'
+}
+FILE_EXTENSIONS = {file_format: extension for extension, file_format in FILE_FORMATS.items()}
+
+DEFAULT_BUFFER_ROWS = 65536
+
+
+class ResultsWriter:
+    def __init__(self, file_path, fields, file_format=None, table_versions=None, buffer_rows=DEFAULT_BUFFER_ROWS):
+        """
+        Open a streaming results file. Existing files are overwritten.
+        Args:
+            file_path: Path of the output file
+            fields: Names of the result columns, in output order
+            file_format: 'csv', 'jsonl' or 'parquet' (guessed from the extension if None)
+            table_versions: Optional dictionary of table name -> version, added to every row
+                            as <table name>_version columns
+            buffer_rows: Number of rows buffered before they are written out
+        """
+        if file_format is None:
+            file_format = FILE_FORMATS.get(os.path.splitext(file_path)[1].lower())
+        if file_format not in FILE_EXTENSIONS:
+            raise ValueError(f"Unsupported results file format for {file_path}: {file_format}")
+
+        self.file_path = file_path
+        self.file_format = file_format
+        self.fields = list(fields)
+        self.buffer_rows = buffer_rows
+        self.rows_written = 0
+
+        #table versions are the same for every row, so they are stored once and repeated on write
+        self._version_fields = [f"{name}_version" for name in (table_versions or {})]
+        self._version_values = [None if version is None else str(version) for version in (table_versions or {}).values()]
+        self._buffer = []
+        self._buffered_rows = 0
+        self._file = None
+        self._parquet_writer = None
+        self._open()
+
+    @property
+    def columns(self):
+        """Returns every output column name (result fields, then table version fields)."""
+        return self.fields + self._version_fields
+
+    def write_columns(self, columns):
+        """
+        Append a block of rows given as a dictionary of equal-length arrays (missing fields are blank).
+        """
+        n_rows = len(next(iter(columns.values()))) if columns else 0
+        if n_rows == 0:
+            return
+        self._buffer.append({field: _to_list(columns.get(field), n_rows) for field in self.fields})
+        self._buffered_rows += n_rows
+        if self._buffered_rows >= self.buffer_rows:
+            self.flush()
+
+    def write_row(self, row):
+        """
+        Append a single row given as a dictionary (missing fields are blank).
+        """
+        self.write_columns({field: [row.get(field)] for field in self.fields})
+
+    def flush(self):
+        """Write the buffered rows to the file."""
+        if not self._buffer:
+            return
+        block = {field: [value for chunk in self._buffer for value in chunk[field]] for field in self.fields}
+        n_rows = self._buffered_rows
+        for field, value in zip(self._version_fields, self._version_values):
+            block[field] = [value] * n_rows
+
+        if self.file_format == 'csv':
+            csv.writer(self._file).writerows(zip(*(block[field] for field in self.columns)))
+        elif self.file_format == 'jsonl':
+            names = self.columns
+            self._file.writelines(json.dumps(dict(zip(names, values))) + '\n'
+                                  for values in zip(*(block[field] for field in names)))
+        else:
+            self._write_parquet_block(block)
+
+        self.rows_written += n_rows
+        self._buffer = []
+        self._buffered_rows = 0
+
+    def close(self):
+        """Flush any buffered rows and close the file."""
+        try:
+            self.flush()
+        finally:
+            if self._parquet_writer is not None:
+                self._parquet_writer.close()
+                self._parquet_writer = None
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    #private helper methods
+    def _open(self):
+        """
+        Create the output file (and its directory) and write the CSV header.
+        """
+        directory = os.path.dirname(self.file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if self.file_format == 'parquet':
+            #the parquet writer is created with the first block, once column types are known
+            return
+        self._file = open(self.file_path, 'w', newline='', buffering=1 << 20)
+        if self.file_format == 'csv':
+            csv.writer(self._file).writerow(self.columns)
+
+    def _write_parquet_block(self, block):
+        """
+        Write one block as a Parquet row group.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("pyarrow is required to write Parquet results (pip install pyarrow)")
+
+        if self._parquet_writer is None:
+            #fixed column types, so a block where a column is all blank still matches the schema
+            self._schema = pa.schema([(field, _parquet_type(pa, field, block[field])) for field in self.columns])
+            self._parquet_writer = pq.ParquetWriter(self.file_path, self._schema)
+
+        arrays = {}
+        for field in self.columns:
+            values = block[field]
+            if pa.types.is_string(self._schema.field(field).type):
+                values = [None if value is None else str(value) for value in values]
+            arrays[field] = values
+        self._parquet_writer.write_table(pa.table(arrays, schema=self._schema))
+
+
+class BookResultsWriter:
+    def __init__(self, output_dir, file_format='csv', table_versions=None, buffer_rows=DEFAULT_BUFFER_ROWS):
+        """
+        Write per-plan and per-group results to plan_results.<ext> and group_results.<ext>.
+        Args:
+            output_dir: Directory for the two results files
+            file_format: 'csv', 'jsonl' or 'parquet'
+            table_versions: Dictionary of table name -> version (e.g. json_conversions.get_table_versions())
+            buffer_rows: Number of rows buffered before they are written out
+        """
+        extension = FILE_EXTENSIONS.get(file_format)
+        if extension is None:
+            raise ValueError(f"Unsupported results file format: {file_format}")
+        self.plans = ResultsWriter(os.path.join(output_dir, f"plan_results{extension}"), PLAN_RESULT_FIELDS,
+                                   file_format, table_versions, buffer_rows)
+        self.groups = ResultsWriter(os.path.join(output_dir, f"group_results{extension}"), GROUP_RESULT_FIELDS,
+                                    file_format, table_versions, buffer_rows)
+
+    def write_group(self, group_id, group_brf, plans=None, columns=None, results=None):
+        """
+        Write one priced group: its plan rows and its group row.
+        Args:
+            group_id: Identifier of the group
+            group_brf: The group BRF
+            plans: Priced Plan objects (after calculate_group_brf), or
+            columns: Census columns (e.g. from columnar_ingest.read_plan_columns) together with
+            results: Results from batch_pricing.price_plan_columns
+        """
+        if plans is not None:
+            plan_columns = plan_result_columns_from_plans(plans)
+        else:
+            plan_columns = plan_result_columns_from_batch(columns, results)
+        n_plans = len(plan_columns['plan_brf'])
+        plan_columns['group_id'] = [group_id] * n_plans
+
+        self.plans.write_columns(plan_columns)
+        self.groups.write_row({
+            'group_id': group_id,
+            'n_plans': n_plans,
+            'total_enrollment': int(np.sum(plan_columns['total_enrollment'])),
+            'group_brf': float(group_brf)
+        })
+
+    def close(self):
+        """Flush and close both results files."""
+        try:
+            self.plans.close()
+        finally:
+            self.groups.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def plan_result_columns_from_plans(plans):
+    """
+    Collect the result attributes of priced Plan objects into columns.
+    Out-of-band indices are written as MISSING_INDEX, as in batch pricing results.
+    """
+    indices = [(plan.deductible_index, plan.moop_index, plan.coinsurance_index) for plan in plans]
+    return {
+        'plan_id': [plan.plan_id for plan in plans],
+        'plan_name': [plan.plan_name for plan in plans],
+        'deductible': [plan.deductible for plan in plans],
+        'coinsurance': [plan.coinsurance for plan in plans],
+        'moop': [plan.moop for plan in plans],
+        'pcp': [plan.pcp_copay for plan in plans],
+        'spc': [plan.spc_copay for plan in plans],
+        'er': [plan.er_copay for plan in plans],
+        'total_enrollment': [plan.total_enrollment for plan in plans],
+        'deductible_index': [_index(plan_indices[0]) for plan_indices in indices],
+        'moop_index': [_index(plan_indices[1]) for plan_indices in indices],
+        'coinsurance_index': [_index(plan_indices[2]) for plan_indices in indices],
+        'base_plan_index': [MISSING_INDEX if None in plan_indices else plan.get_base_plan_index()
+                            for plan, plan_indices in zip(plans, indices)],
+        'base_brf': [plan.base_brf for plan in plans],
+        'copay_brf': [plan.copay_brf for plan in plans],
+        'plan_brf': [plan.plan_brf for plan in plans]
+    }
+
+
+def plan_result_columns_from_batch(columns, results):
+    """
+    Combine census columns and batch pricing results into plan result columns.
+    """
+    n_plans = len(results['plan_brf'])
+    plan_columns = {field: columns[field] for field in PLAN_RESULT_FIELDS if field in columns}
+    plan_columns.update({field: results[field] for field in PLAN_RESULT_FIELDS if field in results})
+    plan_columns.setdefault('plan_id', np.arange(1, n_plans + 1))
+    return plan_columns
+
+
+#private helper methods
+def _to_list(values, n_rows):
+    """
+    Convert a column to a list of plain Python values (NaN becomes None).
+    """
+    if values is None:
+        return [None] * n_rows
+    values = values.tolist() if isinstance(values, np.ndarray) else list(values)
+    return [None if isinstance(value, float) and value != value else _plain(value) for value in values]
+
+
+def _parquet_type(pa, field, values):
+    """
+    Parquet column type for a results field: ids and names are strings, indices and
+    counts are integers, everything else is a float.
+    """
+    if field in ('group_id', 'plan_name') or field.endswith('_version'):
+        return pa.string()
+    if field in ('plan_id', 'n_plans', 'total_enrollment') or field.endswith('_index'):
+        return pa.int64()
+    if field in PLAN_RESULT_FIELDS or field in GROUP_RESULT_FIELDS:
+        return pa.float64()
+    return pa.array(values).type
+
+
+def _plain(value):
+    """Convert numpy scalars to plain Python values."""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _index(index):
+    """A Plan index, MISSING_INDEX when it is out of band (None)."""
+    return MISSING_INDEX if index is None else index
@@ -0,0 +1,132 @@
+"""
+Scenario pricing: the same plans priced under many (trend, base rate) scenarios at once.
+
+read_claims_probability() scales the claims distribution to BASE_RATE once, so repricing under
+another base rate or a claims trend used to mean editing data_processing.BASE_RATE and reloading.
+Here a scenario is applied to the claims instead of the module:
+
+    expected claims under a scenario = expected base rate claims × trend × base_rate / BASE_RATE
+    base BRF under a scenario        = Σ(plan-paid claims × freq) / 12 / base_rate
+
+Scaling every bin by the same positive factor k keeps the bins in order, and plan-paid claims
+are homogeneous (paid(k × claims; d, c, m) = k × paid(claims; d / k, c, m / k)), so every
+(scenario, plan) pair is priced on the one compiled DistributionEngine with the deductible and
+MOOP divided by k. The scenario × plan × bin computation therefore needs no per-scenario copy of
+the distribution, and it is chunked over (scenario, plan) pairs to stay within a memory budget.
+Indices and copay relativities do not depend on the scenario and are computed once.
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from batch_pricing import calculate_indices_array, finish_plan_pricing, plans_to_columns
+from data_processing import BASE_RATE
+from distribution_engine import DistributionEngine
+from rate_book import RateBook
+
+#working memory per (scenario, plan) pair: the scaled inputs and the engine's temporaries (float64)
+BYTES_PER_PAIR = 20 * 8
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+
+Scenario = namedtuple('Scenario', ['trend', 'base_rate'])
+Scenario.__new__.__defaults__ = (BASE_RATE,)
+Scenario.__doc__ = "A pricing scenario: a claims trend factor and a base rate (BASE_RATE by default)."
+
+
+def price_scenarios(columns, scenarios, claims_probability_distribution, deductible_threshold_data=None,
+                    coinsurance_threshold_data=None, moop_threshold_data=None,
+                    pcp_copay_data=None, spc_copay_data=None, er_copay_data=None, engine=None,
+                    memory_budget=DEFAULT_MEMORY_BUDGET):
+    """
+    Price columns of plan designs under every scenario.
+    Args:
+        columns: Dictionary (or DataFrame) with deductible, coinsurance, moop, pcp, spc and er arrays
+                 (plan_id and total_enrollment are carried into the result when present)
+        scenarios: List of (trend, base_rate) pairs or Scenario tuples; (1.0, BASE_RATE) is the baseline
+        claims_probability_distribution ... er_copay_data: Reference tables (see price_plan_columns), or a
+                                                           RateBook in place of all seven
+        engine: Optional precompiled DistributionEngine for the baseline distribution (built if not given,
+                a RateBook's own engine is used by default)
+        memory_budget: Bytes of working memory per chunk of (scenario, plan) pairs
+    Returns:
+        Tidy DataFrame with one row per scenario and plan: scenario (position in scenarios), trend,
+        base_rate, plan (row in columns), [plan_id], base_plan_index, base_brf, copay_brf, plan_brf,
+        [total_enrollment]
+    """
+    scenarios = [Scenario(*scenario) for scenario in scenarios]
+    trends = np.array([scenario.trend for scenario in scenarios], dtype=float)
+    base_rates = np.array([scenario.base_rate for scenario in scenarios], dtype=float)
+    factors = np.concatenate((trends, base_rates))
+    if not (np.isfinite(factors) & (factors > 0)).all():
+        raise ValueError("Every scenario needs a positive, finite trend and base rate.")
+    if memory_budget < BYTES_PER_PAIR:
+        raise ValueError(f"memory_budget must be at least {BYTES_PER_PAIR} bytes")
+
+    deductible = np.asarray(columns['deductible'], dtype=float)
+    coinsurance = np.asarray(columns['coinsurance'], dtype=float)
+    moop = np.asarray(columns['moop'], dtype=float)
+    n_scenarios = len(scenarios)
+    n_plans = len(deductible)
+
+    #indices and copay relativities are the same in every scenario
+    if isinstance(claims_probability_distribution, RateBook):
+        rate_book = claims_probability_distribution
+        deductible_index, moop_index, coinsurance_index, base_plan_index = rate_book.calculate_indices(
+            deductible, coinsurance, moop)
+        baseline = finish_plan_pricing(columns, deductible_index, moop_index, coinsurance_index, np.ones(n_plans),
+                                       *rate_book.compiled_copays, base_plan_index=base_plan_index)
+        if engine is None:
+            engine = rate_book.engine
+    else:
+        baseline = finish_plan_pricing(columns,
+                                       calculate_indices_array(deductible, deductible_threshold_data),
+                                       calculate_indices_array(moop, moop_threshold_data),
+                                       calculate_indices_array(coinsurance, coinsurance_threshold_data),
+                                       np.ones(n_plans), pcp_copay_data, spc_copay_data, er_copay_data)
+
+    if engine is None:
+        engine = DistributionEngine.from_claims_probability(claims_probability_distribution)
+    claims_scale = trends * base_rates / BASE_RATE
+
+    #pairs are laid out scenario-major: pair = scenario * n_plans + plan
+    base_brf = np.empty(n_scenarios * n_plans)
+    chunk_size = max(1, memory_budget // BYTES_PER_PAIR)
+    for start in range(0, len(base_brf), chunk_size):
+        pairs = np.arange(start, min(start + chunk_size, len(base_brf)))
+        scenario, plan = np.divmod(pairs, n_plans)
+        scale = claims_scale[scenario]
+        #engine.base_brf prices against BASE_RATE; paid claims scale by k and the BRF divides by base_rate
+        chunk_brf = engine.base_brf(deductible[plan] / scale, coinsurance[plan], moop[plan] / scale,
+                                    chunk_size=len(pairs))
+        base_brf[start:start + len(pairs)] = chunk_brf * trends[scenario]
+
+    copay_brf = np.tile(baseline['copay_brf'], n_scenarios)
+    result = {
+        'scenario': np.repeat(np.arange(n_scenarios), n_plans),
+        'trend': np.repeat(trends, n_plans),
+        'base_rate': np.repeat(base_rates, n_plans),
+        'plan': np.tile(np.arange(n_plans), n_scenarios)
+    }
+    if 'plan_id' in columns:
+        result['plan_id'] = np.tile(np.asarray(columns['plan_id']), n_scenarios)
+    result['base_plan_index'] = np.tile(baseline['base_plan_index'], n_scenarios)
+    result['base_brf'] = base_brf
+    result['copay_brf'] = copay_brf
+    result['plan_brf'] = base_brf * copay_brf
+    if 'total_enrollment' in columns:
+        result['total_enrollment'] = np.tile(np.asarray(columns['total_enrollment'], dtype=float), n_scenarios)
+    return pd.DataFrame(result)
+
+
+def price_plan_scenarios(plans, scenarios, claims_probability_distribution, deductible_threshold_data=None,
+                         coinsurance_threshold_data=None, moop_threshold_data=None,
+                         pcp_copay_data=None, spc_copay_data=None, er_copay_data=None, engine=None,
+                         memory_budget=DEFAULT_MEMORY_BUDGET):
+    """
+    Same as price_scenarios for a list of Plan objects (the plans are not modified).
+    """
+    return price_scenarios(plans_to_columns(plans), scenarios, claims_probability_distribution,
+                           deductible_threshold_data, coinsurance_threshold_data, moop_threshold_data,
+                           pcp_copay_data, spc_copay_data, er_copay_data, engine=engine,
+                           memory_budget=memory_budget)
@@ -0,0 +1,146 @@
+"""
+Monte Carlo simulation of plan-paid claims.
+
+calculate_base_brf() only gives the expected value over the claims probability
+distribution. These functions sample member claim amounts from the same distribution
+(weighted by annual frequency) so the spread of the BRF can be measured, e.g. for small groups.
+"""
+import numpy as np
+
+from data_processing import BASE_RATE
+
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def plan_paid_claims(claims, deductible, coinsurance, moop):
+    """
+    Vectorized version of Plan._base_brf_compute_helper (without the frequency weight).
+    Args:
+        claims: Array of annual claim amounts (in expected base rate claims units)
+        deductible: Plan deductible
+        coinsurance: Plan coinsurance (0.0 to 1.0)
+        moop: Plan maximum out-of-pocket
+    Returns:
+        Array with the plan-paid amount for each claim amount
+    """
+    claims = np.asarray(claims, dtype=float)
+
+    if coinsurance == 0:
+        return np.where(claims < deductible, 0.0, claims - deductible)
+
+    #claims above this point are past the moop and the plan pays everything over it
+    corridor_end = deductible + (moop - deductible) / coinsurance
+    return np.where(claims < deductible, 0.0,
+                    np.where(claims < corridor_end,
+                             (1 - coinsurance) * (claims - deductible),
+                             claims - moop))
+
+
+def create_random_stream(seed=None, stream_index=0):
+    """
+    Create an independent random number generator for one shard of a simulation.
+    The same (seed, stream_index) pair always gives the same stream, and different
+    stream indexes never overlap, so a run can be split across processes.
+    Args:
+        seed: Root seed for the whole simulation run
+        stream_index: Index of the shard (0, 1, 2, ...)
+    Returns:
+        numpy Generator for the shard
+    """
+    seed_sequence = np.random.SeedSequence(entropy=seed, spawn_key=(stream_index,))
+    return np.random.default_rng(seed_sequence)
+
+
+def sample_group_brfs(plans, claims_probability_distribution, n_groups, group_size=1,
+                      seed=None, stream_index=0, chunk_size=1_000_000):
+    """
+    Simulate the base BRF of n_groups groups of group_size members for every plan.
+    All plans are priced against the same simulated members (common random numbers),
+    so differences between plans are not hidden by sampling noise.
+    Args:
+        plans: List of Plan objects
+        claims_probability_distribution: DataFrame with claims probability data
+        n_groups: Number of simulated groups
+        group_size: Number of members in each simulated group
+        seed: Root seed for the simulation run
+        stream_index: Index of the random stream (use a different one per process)
+        chunk_size: Maximum number of simulated members held in memory at once
+    Returns:
+        Array of shape (len(plans), n_groups) with the simulated base BRF of each group
+    """
+    if n_groups <= 0 or group_size <= 0:
+        raise ValueError("n_groups and group_size must be positive.")
+
+    claims = claims_probability_distribution["expected base rate claims"].to_numpy(dtype=float)
+    freq = claims_probability_distribution["annual frequency"].to_numpy(dtype=float)
+    total_freq = freq.sum()
+
+    #cumulative probabilities for inverse-cdf sampling of the claim bins
+    cdf = np.cumsum(freq / total_freq)
+    cdf[-1] = 1.0
+
+    #scale that turns a member's annual plan-paid claims into a base BRF
+    brf_scale = total_freq / 12 / BASE_RATE
+
+    rng = create_random_stream(seed, stream_index)
+    groups_per_chunk = max(1, chunk_size // group_size)
+    results = np.empty((len(plans), n_groups))
+
+    for start in range(0, n_groups, groups_per_chunk):
+        stop = min(start + groups_per_chunk, n_groups)
+        n_members = (stop - start) * group_size
+        bins = np.searchsorted(cdf, rng.random(n_members), side='right')
+        member_claims = claims[np.minimum(bins, len(claims) - 1)]
+
+        for i, plan in enumerate(plans):
+            paid = plan_paid_claims(member_claims, plan.deductible, plan.coinsurance, plan.moop)
+            results[i, start:stop] = paid.reshape(stop - start, group_size).mean(axis=1) * brf_scale
+
+    return results
+
+
+def summarize_simulation(samples, percentiles=DEFAULT_PERCENTILES):
+    """
+    Summarize simulated BRF values.
+    Args:
+        samples: 1D array of simulated BRF values (shards can be concatenated first)
+        percentiles: Percentiles to report (0 to 100)
+    Returns:
+        Dictionary with n, mean, variance, std and a {percentile: value} dictionary
+    """
+    samples = np.asarray(samples, dtype=float)
+    variance = float(samples.var(ddof=1)) if samples.size > 1 else 0.0
+    return {
+        'n': int(samples.size),
+        'mean': float(samples.mean()),
+        'variance': variance,
+        'std': variance ** 0.5,
+        'percentiles': {p: float(v) for p, v in zip(percentiles, np.percentile(samples, percentiles))}
+    }
+
+
+def simulate_base_brf(plans, claims_probability_distribution, n_groups=1_000_000, group_size=1,
+                      seed=None, stream_index=0, percentiles=DEFAULT_PERCENTILES, chunk_size=1_000_000):
+    """
+    Simulate the base BRF for a list of plans and summarize its spread.
+    Args:
+        plans: List of Plan objects
+        claims_probability_distribution: DataFrame with claims probability data
+        n_groups: Number of simulated groups per plan
+        group_size: Number of members in each simulated group (1 = member-level spread)
+        seed: Root seed for the simulation run
+        stream_index: Index of the random stream (use a different one per process)
+        percentiles: Percentiles to report (0 to 100)
+        chunk_size: Maximum number of simulated members held in memory at once
+    Returns:
+        List with one summary dictionary per plan (see summarize_simulation), plus plan_id
+    """
+    samples = sample_group_brfs(plans, claims_probability_distribution, n_groups, group_size,
+                                seed=seed, stream_index=stream_index, chunk_size=chunk_size)
+
+    summaries = []
+    for plan, plan_samples in zip(plans, samples):
+        summary = summarize_simulation(plan_samples, percentiles)
+        summary['plan_id'] = plan.plan_id
+        summaries.append(summary)
+    return summaries
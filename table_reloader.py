@@ -0,0 +1,218 @@
+"""
+Hot reload of the reference tables in long-running processes.
+
+constants.py reads the tables once at import, so a long-running pricer keeps pricing on the
+tables it started with. TableReloader watches the reference CSVs of a data directory instead:
+a background thread polls their size and modification time (and, if inotify_simple is
+installed and use_inotify is set, wakes up on inotify events instead of sleeping). When a
+file changes, the tables are re-read and recompiled in that thread and swapped in with one
+reference assignment.
+
+Pricing calls take the current table set once, at the start of the call, and use it to the
+end, so in-flight calls finish on the old tables while new calls get the new ones. A reload
+that fails (e.g. a CSV caught half-written) keeps the old tables and is retried on the next
+change of the files. Reload count, time and version are reported by metrics().
+"""
+import os
+import threading
+import time
+from datetime import datetime
+
+from batch_pricing import calculate_group_brf_batch
+from data_processing import REFERENCE_TABLE_FILES, load_reference_tables
+from rate_book import RateBook
+
+DEFAULT_POLL_INTERVAL = 2.0
+
+
+class TableReloader:
+    def __init__(self, data_dir='data_files', poll_interval=DEFAULT_POLL_INTERVAL, use_inotify=False):
+        """
+        Load the tables of a data directory and prepare to watch it (call start() to watch).
+        Args:
+            data_dir: Directory laid out like data_files/
+            poll_interval: Seconds between checks of the source files
+            use_inotify: Wake up on inotify events as well as polling (needs inotify_simple, Linux only)
+        """
+        self.data_dir = data_dir
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+
+        self.reloads = 0
+        self.failed_reloads = 0
+        self.last_reload_seconds = None
+        self.last_error = None
+
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._signature = self._file_signature()
+        self._failed_signature = None
+        self._tables = self._build(version=1)
+
+    def current(self):
+        """
+        Returns the current table set. Hold on to it for the whole pricing call.
+        Returns:
+            Dictionary from load_reference_tables, plus rate_book (compiled RateBook), engine
+            (its DistributionEngine), compiled_copays (its three CompiledCopayTable), version
+            (1 for the tables loaded at start, incremented by every reload) and loaded_at
+        """
+        return self._tables
+
+    def tables(self, tables=None):
+        """
+        Returns the seven table arguments of calculate_group_brf (in order) of a table set
+        (the current one by default).
+        """
+        tables = self._tables if tables is None else tables
+        return tables['rate_book'].table_arguments
+
+    def calculate_group_brf(self, plans):
+        """
+        Calculate a group BRF with the compiled current tables. The Plan objects are not modified.
+        """
+        return calculate_group_brf_batch(plans, self._tables['rate_book'])
+
+    #watching
+    def check(self):
+        """
+        Reload the tables if a source file changed since the last successful load.
+        Returns:
+            True if new tables were swapped in
+        """
+        with self._reload_lock:
+            signature = self._file_signature()
+            if signature == self._signature or signature == self._failed_signature:
+                return False
+            return self._reload(signature)
+
+    def reload(self):
+        """
+        Reload the tables now, whether or not the files changed.
+        Returns:
+            True if new tables were swapped in
+        """
+        with self._reload_lock:
+            return self._reload(self._file_signature())
+
+    def start(self):
+        """Start watching the source files in a background thread."""
+        if self._thread is not None:
+            return
+        if self.use_inotify:
+            self._inotify = _open_inotify(self.data_dir)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background watcher."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        if self.use_inotify:
+            self._inotify.close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def metrics(self):
+        """
+        Returns the reload metrics: version, tables_hash, loaded_at, reloads, failed_reloads,
+        last_reload_seconds and last_error.
+        """
+        tables = self._tables
+        return {
+            'version': tables['version'],
+            'tables_hash': tables['tables_hash'],
+            'loaded_at': tables['loaded_at'],
+            'reloads': self.reloads,
+            'failed_reloads': self.failed_reloads,
+            'last_reload_seconds': self.last_reload_seconds,
+            'last_error': self.last_error
+        }
+
+    #private helper methods
+    def _watch(self):
+        """
+        Background loop: wait for the poll interval (or an inotify event), then check the files.
+        """
+        while not self._stop.is_set():
+            if self.use_inotify:
+                self._inotify.read(timeout=int(self.poll_interval * 1000))
+            elif self._stop.wait(self.poll_interval):
+                return
+            self.check()
+
+    def _reload(self, signature):
+        """
+        Build new tables and swap them in, keeping the old tables if the build fails or a
+        file changed while it was being read.
+        """
+        start = time.perf_counter()
+        try:
+            tables = self._build(version=self._tables['version'] + 1)
+        except Exception as e:
+            self.failed_reloads += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            #the same broken files are not rebuilt on every poll, only once they change again
+            self._failed_signature = signature
+            return False
+        if self._file_signature() != signature:
+            #a file is still being written; the next check picks up its final content
+            return False
+
+        self._tables = tables
+        self._signature = signature
+        self.reloads += 1
+        self.last_reload_seconds = time.perf_counter() - start
+        self.last_error = None
+        return True
+
+    def _build(self, version):
+        """
+        Read and compile the tables of the data directory.
+        """
+        tables = load_reference_tables(self.data_dir)
+        tables['rate_book'] = RateBook.from_reference_tables(tables)
+        tables['engine'] = tables['rate_book'].engine
+        tables['compiled_copays'] = tables['rate_book'].compiled_copays
+        tables['version'] = version
+        tables['loaded_at'] = datetime.now().isoformat() + "Z"
+        return tables
+
+    def _file_signature(self):
+        """
+        (size, modification time) of every source file; None for a missing file.
+        """
+        signature = []
+        for relative_path in REFERENCE_TABLE_FILES.values():
+            try:
+                stat = os.stat(os.path.join(self.data_dir, relative_path))
+                signature.append((stat.st_size, stat.st_mtime_ns))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+
+def _open_inotify(data_dir):
+    """
+    Watch the directories of the reference tables with inotify.
+    """
+    try:
+        from inotify_simple import INotify, flags
+    except ImportError:
+        raise ImportError("use_inotify needs the inotify_simple package (pip install inotify_simple); "
+                          "without it the reloader polls the files.")
+    inotify = INotify()
+    watch_flags = flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE | flags.DELETE
+    for directory in sorted({os.path.dirname(os.path.join(data_dir, path)) for path in REFERENCE_TABLE_FILES.values()}):
+        inotify.add_watch(directory, watch_flags)
+    return inotify
@@ -0,0 +1,262 @@
+"""
+Versioned store of reference tables.
+
+auto_sync_json_files bumps the version in the JSON metadata, but the CSVs in data_files/
+are overwritten in place, so only the current tables can be priced. Renewals must be priced
+on the tables in force at the quote date. The store keeps an immutable snapshot of every
+version under <root>/<version>/ (same layout as data_files/) with a manifest holding the
+effective date and the SHA-256 of every file.
+
+Each manifest also records the content hash of the whole table set (reference_tables_hash)
+and the JSON metadata versions of the tables it was taken from, so a result stamped with
+either (quote_store keys reuse on the content hash, results_writer stamps the metadata
+versions) can be mapped back to the snapshot it was priced on with find_version.
+
+Versions are loaded and compiled on first use and kept in a small LRU of resident versions,
+so a batch of groups priced on different versions reads each version's tables once.
+"""
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+
+from data_processing import REFERENCE_TABLE_FILES, load_reference_tables, hash_file, combine_table_hashes, iso_date
+from distribution_engine import DistributionEngine
+from brf_calculation import calculate_group_brf
+from json_conversions import increment_version, get_table_versions
+from rate_book import RateBook
+
+DEFAULT_STORE_DIR = 'table_versions'
+DEFAULT_CAPACITY = 4
+MANIFEST_FILE = 'manifest.json'
+
+#order of the table arguments taken by calculate_plan_brf / calculate_group_brf
+TABLE_ARGUMENTS = tuple(REFERENCE_TABLE_FILES)
+
+
+class VersionedTableStore:
+    def __init__(self, root=DEFAULT_STORE_DIR, capacity=DEFAULT_CAPACITY):
+        """
+        Open (or create) a versioned table store.
+        Args:
+            root: Directory holding one sub-directory per version
+            capacity: Maximum number of versions kept loaded in memory
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.root = root
+        self.capacity = capacity
+        self._resident = OrderedDict()
+        self._lock = threading.Lock()
+        self.loads = 0
+        os.makedirs(root, exist_ok=True)
+
+    #snapshots
+    def snapshot(self, source_dir='data_files', version=None, effective_date=None, description=None, table_versions=None):
+        """
+        Copy the current reference tables into a new immutable version.
+        Args:
+            source_dir: Directory laid out like data_files/ to copy the tables from
+            version: Version identifier (defaults to the next version after the latest one)
+            effective_date: First quote date the version applies to (defaults to today)
+            description: Optional note stored in the manifest
+            table_versions: JSON metadata versions of the source tables (defaults to get_table_versions(),
+                            the metadata of the current data_files/ tables)
+        Returns:
+            The manifest of the new version
+        """
+        if version is None:
+            latest = self.latest_version()
+            version = "1.0" if latest is None else increment_version(latest)
+        version = str(version)
+        version_dir = self._version_dir(version)
+        if os.path.exists(version_dir):
+            raise ValueError(f"Table version {version} already exists; versions are immutable")
+
+        #copy into a temporary directory first so a failed snapshot never leaves a partial version
+        temp_dir = f"{version_dir}.{os.getpid()}.tmp"
+        try:
+            files = {}
+            for name, relative_path in REFERENCE_TABLE_FILES.items():
+                target = os.path.join(temp_dir, relative_path)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copyfile(os.path.join(source_dir, relative_path), target)
+                files[name] = {'path': relative_path, 'sha256': hash_file(target)}
+
+            manifest = {
+                'version': version,
+                'effective_date': iso_date(effective_date or date.today()),
+                'created_date': datetime.now().isoformat() + "Z",
+                'description': description,
+                'tables_hash': combine_table_hashes({name: info['sha256'] for name, info in files.items()}),
+                'table_versions': table_versions if table_versions is not None else get_table_versions(),
+                'files': files
+            }
+            with open(os.path.join(temp_dir, MANIFEST_FILE), 'w') as f:
+                json.dump(manifest, f, indent=2)
+            os.rename(temp_dir, version_dir)
+        finally:
+            if os.path.exists(temp_dir):
+                shutil.rmtree(temp_dir)
+        return manifest
+
+    def versions(self):
+        """Returns the manifests of every stored version, ordered by effective date."""
+        manifests = []
+        for entry in os.listdir(self.root):
+            manifest_path = os.path.join(self.root, entry, MANIFEST_FILE)
+            if not entry.endswith('.tmp') and os.path.exists(manifest_path):
+                with open(manifest_path, 'r') as f:
+                    manifests.append(json.load(f))
+        return sorted(manifests, key=lambda manifest: (manifest['effective_date'], manifest['created_date']))
+
+    def latest_version(self):
+        """Returns the most recently effective version, or None if the store is empty."""
+        manifests = self.versions()
+        return manifests[-1]['version'] if manifests else None
+
+    def version_for_date(self, quote_date):
+        """
+        Returns the version in force at a quote date (the latest one effective on or before it).
+        """
+        quote_date = iso_date(quote_date)
+        in_force = [manifest['version'] for manifest in self.versions() if manifest['effective_date'] <= quote_date]
+        if not in_force:
+            raise ValueError(f"No table version is effective on {quote_date}")
+        return in_force[-1]
+
+    def find_version(self, tables_hash=None, table_versions=None):
+        """
+        Returns the snapshot a stored result was priced on, matched by the content hash of
+        its tables or by their JSON metadata versions. The latest matching snapshot wins.
+        Args:
+            tables_hash: Content hash (reference_tables_hash / load_reference_tables()['tables_hash'])
+            table_versions: Dictionary of table name -> JSON metadata version
+        Returns:
+            The version identifier
+        """
+        if tables_hash is None and table_versions is None:
+            raise ValueError("Give tables_hash or table_versions to find a version")
+        matches = [manifest['version'] for manifest in self.versions()
+                   if (tables_hash is None or manifest.get('tables_hash') == tables_hash)
+                   and (table_versions is None or manifest.get('table_versions') == table_versions)]
+        if not matches:
+            raise ValueError("No stored table version matches the given tables")
+        return matches[-1]
+
+    #loading
+    def get(self, version=None, quote_date=None):
+        """
+        Returns the loaded tables of a version, loading and compiling them on first use.
+        The version is chosen by (in order) version, quote_date or the latest version.
+        Returns:
+            Dictionary keyed by the calculate_plan_brf argument names, plus starting_point,
+            tables_hash, engine (compiled DistributionEngine), rate_book (compiled RateBook), version,
+            effective_date and table_versions
+        """
+        version = self.resolve_version(version, quote_date)
+        with self._lock:
+            if version in self._resident:
+                self._resident.move_to_end(version)
+                return self._resident[version]
+
+        tables = self._load(version)
+        with self._lock:
+            self._resident[version] = tables
+            self._resident.move_to_end(version)
+            while len(self._resident) > self.capacity:
+                self._resident.popitem(last=False)
+        return tables
+
+    def tables(self, version=None, quote_date=None):
+        """
+        Returns the seven table arguments of calculate_group_brf (in order) for a version.
+        """
+        return self.rate_book(version, quote_date).table_arguments
+
+    def rate_book(self, version=None, quote_date=None):
+        """
+        Returns the compiled RateBook of a version (see get() for how the version is chosen).
+        """
+        return self.get(version, quote_date)['rate_book']
+
+    def resolve_version(self, version=None, quote_date=None):
+        """Returns the version to use for an explicit version, a quote date or (neither) the latest."""
+        if version is not None:
+            return str(version)
+        if quote_date is not None:
+            return self.version_for_date(quote_date)
+        latest = self.latest_version()
+        if latest is None:
+            raise ValueError(f"Table store {self.root} has no versions")
+        return latest
+
+    def resident_versions(self):
+        """Returns the versions currently loaded in memory, least recently used first."""
+        return list(self._resident)
+
+    def clear(self):
+        """Unload every resident version."""
+        with self._lock:
+            self._resident.clear()
+
+    #pricing
+    def calculate_group_brf(self, plans, version=None, quote_date=None):
+        """
+        Calculate a group BRF on a pinned table version (or the version in force at quote_date).
+        """
+        return calculate_group_brf(plans, self.rate_book(version, quote_date))
+
+    def calculate_group_brfs(self, groups):
+        """
+        Calculate the group BRF for a batch of groups priced on different table versions.
+        Groups are priced version by version, so each version is loaded at most once
+        however small the LRU is.
+        Args:
+            groups: Iterable of (group_id, version, quote_date, plans) tuples
+                    (version may be None to use the version in force at quote_date)
+        Returns:
+            Dictionary of group_id -> group BRF, in input order
+        """
+        groups = list(groups)
+        by_version = OrderedDict()
+        for group_id, version, quote_date, plans in groups:
+            by_version.setdefault(self.resolve_version(version, quote_date), []).append((group_id, plans))
+
+        results = {}
+        for version, version_groups in by_version.items():
+            rate_book = self.rate_book(version)
+            for group_id, plans in version_groups:
+                results[group_id] = calculate_group_brf(plans, rate_book)
+        return {group_id: results[group_id] for group_id, _, _, _ in groups}
+
+    #private helper methods
+    def _version_dir(self, version):
+        """Returns the directory of a version."""
+        return os.path.join(self.root, str(version))
+
+    def _load(self, version):
+        """
+        Read and compile a version's tables, checking every file against its manifest hash.
+        """
+        version_dir = self._version_dir(version)
+        manifest_path = os.path.join(version_dir, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            raise ValueError(f"Unknown table version: {version}")
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+
+        for name, file_info in manifest['files'].items():
+            if hash_file(os.path.join(version_dir, file_info['path'])) != file_info['sha256']:
+                raise ValueError(f"Table version {version} has been modified: {file_info['path']} does not match its hash")
+
+        tables = load_reference_tables(version_dir)
+        tables['engine'] = DistributionEngine.from_claims_probability(tables['claims_probability_distribution'])
+        tables['version'] = version
+        tables['effective_date'] = manifest['effective_date']
+        tables['table_versions'] = manifest.get('table_versions')
+        tables['rate_book'] = RateBook.from_reference_tables(tables)
+        self.loads += 1
+        return tables